@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import selection_engine as engine
+from rules import get_rules
+from selection_engine import SelectionError, REACTOR_OPERATIONS
+
+# Per-process equipment databases, loaded once by _init_worker
+_databases = {}
+
+
+def load_specs(path):
+    if path.lower().endswith(".json"):
+        with open(path) as f:
+            specs = json.load(f)
+    else:
+        specs = pd.read_csv(path).to_dict(orient="records")
+    for i, spec in enumerate(specs, start=1):
+        spec = {k: v for k, v in spec.items() if not (isinstance(v, float) and pd.isna(v))}
+        spec.setdefault("id", i)
+        specs[i - 1] = spec
+    return specs
+
+
+def _step_volumes(spec):
+    volumes = spec.get("step_volumes", [])
+    if isinstance(volumes, str):
+        volumes = [v for v in volumes.replace(",", ";").split(";") if v.strip()]
+    elif not isinstance(volumes, list):
+        volumes = [volumes]
+    return [float(v) for v in volumes]
+
+
+def _user_input(spec):
+    coupon = spec.get("coupon_material", "")
+    return {
+        "process_type": spec.get("unit_op_type", "reaction"),
+        "ph_condition": spec.get("ph_condition", "neutral"),
+        "corrosion_rate": float(spec.get("corrosion_rate", 0)),
+        "coupon_materials": [str(coupon).upper()],
+        "temperature": float(spec.get("temperature", 0)),
+        "reaction_nature": spec.get("reaction_nature", "none"),
+        "reaction_subtype": spec.get("reaction_subtype"),
+        "mass": float(spec.get("mass", 0)),
+        "bulk_density": float(spec.get("bulk_density", 0)),
+        "volume": float(spec.get("volume", 0)),
+    }
+
+
+def _equipment_ids(df, default_col=None):
+    col = default_col if default_col in df.columns else engine.equipment_id_column(df)
+    return df[col].astype(str).to_numpy() if col else df.index.astype(str).to_numpy()
+
+
+def match_spec(spec, databases):
+    # Matches for one spec as a frame with "equipment id" and "fill fraction"
+    # (required volume over usable capacity) plus type-specific columns
+    unit_op_type = spec.get("unit_op_type", "reaction")
+    user_input = _user_input(spec)
+
+    if unit_op_type in REACTOR_OPERATIONS:
+        if "reactors" not in databases:
+            raise SelectionError("No reactor database supplied.")
+        volumes = _step_volumes(spec)
+        if not volumes:
+            raise SelectionError("No step volumes given for this unit operation.")
+        total_vol = sum(volumes)
+        matched = engine.filter_reactors(databases["reactors"], user_input, volumes[0], total_vol)
+        usable = matched["max volume"].to_numpy(dtype=float) * engine.reactor_volume_limit(unit_op_type)
+        return pd.DataFrame({
+            "equipment id": matched["reactor id"].astype(str).to_numpy(),
+            "fill fraction": total_vol / usable,
+            "preference match": matched["Preference Match"].to_numpy(),
+        })
+
+    if unit_op_type == "filtration":
+        if "filters" not in databases:
+            raise SelectionError("No filter database supplied.")
+        filter_types = engine.filter_types_for(
+            spec.get("filter_property", ""),
+            float(spec.get("filter_property_value", 0)),
+            spec.get("filter_property_unit"),
+        )
+        if not filter_types:
+            raise SelectionError("No filter type matched the selected filter property.")
+        matched = engine.filter_filters(databases["filters"], user_input, filter_types)
+        volume_litres = engine.filter_volume_litres(user_input["mass"], user_input["bulk_density"])
+        capacity_col, kind = "cake capacity", "filter"
+
+    elif unit_op_type == "drying":
+        if "dryers" not in databases:
+            raise SelectionError("No dryer database supplied.")
+        matched = engine.filter_dryers(databases["dryers"], user_input)
+        volume_litres = user_input["volume"]
+        capacity_col, kind = "capacity", "dryer"
+
+    else:
+        raise SelectionError(f"Unknown unit operation type '{unit_op_type}'.")
+
+    matched = engine.add_cake_height(matched, volume_litres)
+    result = pd.DataFrame({
+        "equipment id": _equipment_ids(matched, "equipment id"),
+        "fill fraction": volume_litres / (matched[capacity_col].to_numpy(dtype=float) * get_rules().volume_limit(kind)),
+    })
+    if "Cake Height (cm)" in matched.columns:
+        result["cake height (cm)"] = matched["Cake Height (cm)"].to_numpy()
+    return result
+
+
+def select_for_spec(spec, databases):
+    return match_spec(spec, databases).drop(columns="fill fraction").to_dict(orient="records")
+
+
+def load_databases(reactors=None, filters=None, dryers=None):
+    databases = {}
+    if reactors:
+        databases["reactors"] = engine.ReactorIndex(engine.load_reactor_data(reactors))
+    if filters:
+        databases["filters"] = engine.load_filter_data(filters)
+    if dryers:
+        databases["dryers"] = engine.load_dryer_data(dryers)
+    return databases
+
+
+def _init_worker(reactors, filters, dryers):
+    _databases.update(load_databases(reactors, filters, dryers))
+
+
+def _run_spec(spec):
+    base = {"spec id": spec["id"], "unit_op_type": spec.get("unit_op_type", "reaction")}
+    try:
+        matches = select_for_spec(spec, _databases)
+    except (SelectionError, ValueError, KeyError, TypeError) as e:
+        # A malformed spec fails alone, not the whole batch
+        return [{**base, "status": "error", "message": str(e)}]
+    if not matches:
+        return [{**base, "status": "no match"}]
+    return [{**base, "status": "matched", **m} for m in matches]
+
+
+def run_batch(specs, reactors=None, filters=None, dryers=None, workers=None):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(reactors, filters, dryers)
+        results = map(_run_spec, specs)
+        return [row for rows in results for row in rows]
+
+    chunksize = max(1, len(specs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(reactors, filters, dryers)) as pool:
+        results = pool.map(_run_spec, specs, chunksize=chunksize)
+        return [row for rows in results for row in rows]
+
+
+def write_results(rows, path):
+    df = pd.DataFrame(rows)
+    if path.lower().endswith(".json"):
+        df.to_json(path, orient="records", indent=2)
+    else:
+        df.to_csv(path, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Screen unit-operation specs against equipment databases without the UI.")
+    parser.add_argument("specs", help="CSV or JSON file of unit-operation specs")
+    parser.add_argument("-o", "--output", required=True, help="Output file (.csv or .json)")
+    parser.add_argument("--reactors", help="Reactor database (.xlsx, .csv or .parquet)")
+    parser.add_argument("--filters", help="Filter database (.xlsx, .csv or .parquet)")
+    parser.add_argument("--dryers", help="Dryer database (.xlsx, .csv or .parquet)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    if not (args.reactors or args.filters or args.dryers):
+        parser.error("supply at least one of --reactors, --filters or --dryers")
+
+    start = time.perf_counter()
+    specs = load_specs(args.specs)
+    rows = run_batch(specs, args.reactors, args.filters, args.dryers, args.workers)
+    write_results(rows, args.output)
+    elapsed = time.perf_counter() - start
+    print(f"Screened {len(specs)} unit operations -> {len(rows)} result rows in {elapsed:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,275 @@
+import argparse
+import datetime
+import functools
+import gc
+import json
+import platform
+import statistics
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import selection_engine as engine
+from benchmarks import synthetic
+from flowchart import create_excel_with_flowchart_only, extract_numbered_steps_from_pdf
+from reactor_webapp import export_steps_to_excel
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+QUERIES = 50
+# PDF parsing and export sizes are capped; they scale with procedure length, not fleet size
+MAX_PDF_STEPS = 2_000
+MAX_EXPORT_STEPS = 20_000
+# Rows changed in the re-uploaded reactor table for patch_reactor_index
+REINDEX_EDITS = 10
+# Loaded-frame size reported with each loader, the per-session cost of a cached database
+FRAME_FIXTURES = {"load_reactor_data": "reactors", "load_filter_data": "filters", "load_dryer_data": "dryers"}
+
+
+def _reactor_queries(n, seed=0):
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _ in range(n):
+        first = float(rng.choice([50, 100, 200, 400]))
+        queries.append(({
+            "process_type": str(rng.choice(["reaction", "distillation", "extraction/workup"])),
+            "ph_condition": str(rng.choice(["basic", "acidic", "neutral"])),
+            "corrosion_rate": 0,
+            "coupon_materials": [""],
+            "temperature": float(rng.choice([15, 30, 60, 120])),
+            "reaction_nature": str(rng.choice(["none", "homogeneous", "heterogeneous"])),
+            "reaction_subtype": str(rng.choice(["biphasic", "solid-liquid", "gas-liquid"])),
+        }, first, first * float(rng.uniform(2, 8))))
+    return queries
+
+
+def _vessel_inputs(n, seed=1):
+    rng = np.random.default_rng(seed)
+    return [{
+        "ph_condition": str(rng.choice(["basic", "acidic", "neutral"])),
+        "corrosion_rate": 0,
+        "coupon_materials": [""],
+        "temperature": 25.0,
+        "mass": float(rng.uniform(10, 500)),
+        "bulk_density": float(rng.uniform(300, 900)),
+        "volume": float(rng.uniform(20, 1500)),
+    } for _ in range(n)]
+
+
+def _selections(n_steps, steps_per_op=4):
+    selections = []
+    for op in range(0, n_steps, steps_per_op):
+        steps = [{
+            "operation": "charge", "material": "solvent", "input_volume": 100.0,
+            "actual_volume": 100.0, "accumulated_volume": 100.0 * (k + 1),
+        } for k in range(min(steps_per_op, n_steps - op))]
+        selections.append((steps, f"R-{op:07d}"))
+    return selections
+
+
+def _parsed(loader, data):
+    # A first upload: the workbook is parsed, no snapshot is read or written
+    saved, engine.SNAPSHOT_DIR = engine.SNAPSHOT_DIR, ""
+    try:
+        return loader(data)
+    finally:
+        engine.SNAPSHOT_DIR = saved
+
+
+def measure(fn, repeats):
+    # An untimed warm-up call, wall time without tracing, then one traced
+    # call for the Python-heap peak
+    fn()
+    times = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return times, peak
+
+
+class Fixtures:
+    # Inputs for one fleet size, built on first use so --only skips the rest
+
+    def __init__(self, size):
+        self.size = size
+        self.pdf_steps = min(size, MAX_PDF_STEPS)
+
+    @functools.cached_property
+    def reactor_bytes(self):
+        return synthetic.reactor_workbook(self.size)
+
+    @functools.cached_property
+    def reactors(self):
+        return engine.load_reactor_data(self.reactor_bytes)
+
+    @functools.cached_property
+    def index(self):
+        return engine.ReactorIndex(self.reactors)
+
+    @functools.cached_property
+    def reactor_table(self):
+        return engine.read_reactor_table(self.reactor_bytes)
+
+    @functools.cached_property
+    def hashed_index(self):
+        return engine.build_reactor_index(self.reactor_table)
+
+    @functools.cached_property
+    def edited_table(self):
+        table = self.reactor_table.copy()
+        rows = np.linspace(0, len(table) - 1, REINDEX_EDITS, dtype=int)
+        table.loc[rows, "max volume"] = table.loc[rows, "max volume"] * 2
+        return table
+
+    @functools.cached_property
+    def filter_bytes(self):
+        return synthetic.filter_workbook(self.size)
+
+    @functools.cached_property
+    def filters(self):
+        return engine.load_filter_data(self.filter_bytes)
+
+    @functools.cached_property
+    def dryer_bytes(self):
+        return synthetic.dryer_workbook(self.size)
+
+    @functools.cached_property
+    def dryers(self):
+        return engine.load_dryer_data(self.dryer_bytes)
+
+    @functools.cached_property
+    def pdf_bytes(self):
+        return synthetic.procedure_pdf(self.pdf_steps)
+
+    @functools.cached_property
+    def steps(self):
+        return extract_numbered_steps_from_pdf(self.pdf_bytes)
+
+    @functools.cached_property
+    def selections(self):
+        return _selections(min(self.size, MAX_EXPORT_STEPS))
+
+
+def benchmark_cases(fx):
+    # (name, items processed per call, callable) for one fleet size
+    queries = _reactor_queries(QUERIES)
+    vessel_inputs = _vessel_inputs(QUERIES)
+    filter_types = ["CENTRIFUGE", "ANFD", "RPF"]
+    size = fx.size
+    return [
+        ("load_reactor_data", lambda: size, lambda: _parsed(engine.load_reactor_data, fx.reactor_bytes)),
+        ("load_reactor_snapshot", lambda: size, lambda: engine.load_reactor_data(fx.reactor_bytes)),
+        ("load_filter_data", lambda: size, lambda: _parsed(engine.load_filter_data, fx.filter_bytes)),
+        ("load_dryer_data", lambda: size, lambda: _parsed(engine.load_dryer_data, fx.dryer_bytes)),
+        ("ReactorIndex", lambda: size, lambda: engine.ReactorIndex(fx.reactors)),
+        ("build_reactor_index", lambda: size, lambda: engine.build_reactor_index(fx.edited_table)),
+        ("patch_reactor_index", lambda: size, lambda: engine.build_reactor_index(fx.edited_table, fx.hashed_index)),
+        ("filter_reactors", lambda: size * QUERIES, lambda: [engine.filter_reactors(fx.index, q, f, t) for q, f, t in queries]),
+        ("rank_reactors", lambda: size * QUERIES, lambda: [engine.rank_reactors(fx.index, q, f, t) for q, f, t in queries]),
+        ("filter_filters", lambda: size * QUERIES, lambda: [engine.filter_filters(fx.filters, u, filter_types) for u in vessel_inputs]),
+        ("filter_dryers", lambda: size * QUERIES, lambda: [engine.filter_dryers(fx.dryers, u) for u in vessel_inputs]),
+        ("export_steps_to_excel", lambda: sum(len(s) for s, _ in fx.selections), lambda: export_steps_to_excel(fx.selections)),
+        ("extract_numbered_steps_from_pdf", lambda: fx.pdf_steps, lambda: extract_numbered_steps_from_pdf(fx.pdf_bytes)),
+        ("create_excel_with_flowchart_only", lambda: len(fx.steps), lambda: create_excel_with_flowchart_only(fx.steps)),
+    ]
+
+
+def run(sizes, repeats, only=None):
+    results = []
+    # Snapshots written by the warm-up call of load_reactor_snapshot
+    engine.SNAPSHOT_DIR = tempfile.mkdtemp(prefix="bench-snapshots-")
+    try:
+        for size in sizes:
+            fx = Fixtures(size)
+            for name, count_items, fn in benchmark_cases(fx):
+                if only and name not in only:
+                    continue
+                times, peak = measure(fn, repeats)
+                items = count_items()
+                median = statistics.median(times)
+                result = {
+                    "name": name,
+                    "size": size,
+                    "items": items,
+                    "repeats": repeats,
+                    "median_s": round(median, 6),
+                    "min_s": round(min(times), 6),
+                    "items_per_s": round(items / median, 1) if median else None,
+                    "peak_mib": round(peak / 2**20, 2),
+                }
+                if name in FRAME_FIXTURES:
+                    frame = getattr(fx, FRAME_FIXTURES[name])
+                    result["frame_mib"] = round(frame.memory_usage(deep=True).sum() / 2**20, 2)
+                results.append(result)
+                print(f"{name:>34} n={size:<8} {median * 1e3:10.2f} ms  {result['items_per_s'] or 0:14,.0f} items/s  {result['peak_mib']:8.2f} MiB", file=sys.stderr)
+    finally:
+        shutil.rmtree(engine.SNAPSHOT_DIR, ignore_errors=True)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    # Benchmarks whose median time grew by more than the threshold ratio
+    previous = {(r["name"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        old = previous.get((r["name"], r["size"]))
+        if old and old["median_s"] and r["median_s"] / old["median_s"] > threshold:
+            regressions.append({"name": r["name"], "size": r["size"], "before_s": old["median_s"], "after_s": r["median_s"], "ratio": round(r["median_s"] / old["median_s"], 2)})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time selection, export and PDF parsing on synthetic fleets.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Fleet sizes in rows (up to 1,000,000)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--only", nargs="+", help="Run only these benchmarks")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.repeats, args.only)
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+    status = 0
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        report["regressions"] = regressions
+        for r in regressions:
+            print(f"REGRESSION {r['name']} n={r['size']}: {r['before_s']:.4f}s -> {r['after_s']:.4f}s ({r['ratio']}x)", file=sys.stderr)
+        status = 1 if regressions else 0
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
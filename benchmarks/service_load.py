@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+import selection_service
+from benchmarks import synthetic
+
+
+def _specs(n, distinct, seed=0):
+    # n requests drawn from `distinct` different specs, so some arrive together
+    rng = np.random.default_rng(seed)
+    pool = []
+    for i in range(distinct):
+        first = float(rng.choice([50, 100, 200, 400]))
+        pool.append({
+            "unit_op_type": str(rng.choice(["reaction", "distillation", "extraction/workup"])),
+            "ph_condition": str(rng.choice(["basic", "acidic", "neutral"])),
+            "temperature": float(rng.choice([15, 30, 60, 120])),
+            "reaction_nature": str(rng.choice(["none", "homogeneous", "heterogeneous"])),
+            "reaction_subtype": "biphasic",
+            "step_volumes": f"{first};{first * float(rng.integers(2, 8))}",
+        })
+    return [dict(pool[k], id=i) for i, k in enumerate(rng.integers(0, distinct, n))]
+
+
+async def _client(host, port, specs, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for spec in specs:
+            body = json.dumps(spec).encode()
+            start = time.perf_counter()
+            writer.write(f"POST /select HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+            await writer.drain()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":")[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def _load(host, port, specs, connections):
+    latencies = []
+    share = [specs[i::connections] for i in range(connections)]
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, s, latencies) for s in share))
+    return time.perf_counter() - start, latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput and latency of selection_service on a synthetic fleet.")
+    parser.add_argument("--reactors", type=int, default=10_000, help="Synthetic fleet size")
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--distinct", type=int, default=500, help="Distinct specs among the requests")
+    parser.add_argument("--connections", type=int, default=32)
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "reactors.xlsx")
+        with open(path, "wb") as f:
+            f.write(synthetic.reactor_workbook(args.reactors))
+        service = selection_service.SelectionService(reactors=path, workers=args.workers)
+
+        ready = threading.Event()
+        address = []
+        loop = asyncio.new_event_loop()
+
+        def on_ready(addr):
+            address.extend(addr)
+            ready.set()
+
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        serving = asyncio.run_coroutine_threadsafe(selection_service.serve(service, "127.0.0.1", 0, on_ready), loop)
+        ready.wait()
+
+        elapsed, latencies = asyncio.run(_load(address[0], address[1], _specs(args.requests, args.distinct), args.connections))
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(json.dumps({
+            "requests": len(latencies),
+            "seconds": round(elapsed, 3),
+            "requests_per_s": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(statistics.median(latencies) * 1e3, 2),
+            "p99_ms": round(p99 * 1e3, 2),
+            **service.stats,
+        }, indent=2))
+        serving.cancel()
+        with contextlib.suppress(concurrent.futures.CancelledError):
+            serving.exception()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
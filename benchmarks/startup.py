@@ -0,0 +1,57 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Dependencies that only some features need; none should load before first use
+DEFERRED_MODULES = ["pdfplumber", "openpyxl", "xlsxwriter"]
+
+# Runs in a fresh interpreter, so every import is cold
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import reactor_webapp
+imported = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("reactor_webapp.py", default_timeout=120)
+harness = time.perf_counter()
+at.run()
+rendered = time.perf_counter()
+at.run()
+rerun = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "first_render_s": rendered - harness,
+    "rerun_s": rerun - rendered,
+    "exceptions": len(at.exception),
+    "loaded": [m for m in DEFERRED_MODULES if m in sys.modules],
+}))
+"""
+
+
+def probe():
+    out = subprocess.run(
+        [sys.executable, "-c", f"DEFERRED_MODULES = {DEFERRED_MODULES!r}\n" + PROBE],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold-start time of the Streamlit app: module import, first render and a warm rerun.")
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters to start")
+    args = parser.parse_args(argv)
+
+    runs = [probe() for _ in range(args.repeats)]
+    report = {key: round(statistics.median(r[key] for r in runs), 4) for key in ["import_s", "first_render_s", "rerun_s"]}
+    report["exceptions"] = max(r["exceptions"] for r in runs)
+    report["deferred_modules_loaded"] = sorted({m for r in runs for m in r["loaded"]})
+    print(json.dumps(report, indent=2))
+    return 1 if report["exceptions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
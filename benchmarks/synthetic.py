@@ -0,0 +1,146 @@
+import argparse
+import io
+import os
+import sys
+
+import numpy as np
+import xlsxwriter
+
+# Weighted so the common codes dominate, as on a real site list
+MOC_CHOICES = ["SSR", "GLR", "HAR", "All Glass", "SSR/HAR", "GLR/HAR"]
+MOC_WEIGHTS = [0.38, 0.27, 0.08, 0.07, 0.12, 0.08]
+UTILITY_CHOICES = ["CHB", "CT", "HW", "LPS", "HOT OIL", "CT, HW", "CHB, CT, HW", "LPS, HW", "HOT OIL, LPS", "EJECTION CONDENSATE"]
+UTILITY_WEIGHTS = [0.08, 0.1, 0.1, 0.1, 0.05, 0.2, 0.17, 0.1, 0.05, 0.05]
+AGITATOR_CHOICES = ["Propellor", "PBT", "RCI", "Anchor", "CBRT", "Ruston", "Disc", "PBT + Anchor"]
+AGITATOR_WEIGHTS = [0.12, 0.25, 0.15, 0.18, 0.1, 0.06, 0.04, 0.1]
+VESSEL_MOC_CHOICES = ["SSR", "HAR", "HALAR"]
+VESSEL_MOC_WEIGHTS = [0.55, 0.25, 0.2]
+FILTER_TYPE_CHOICES = ["Centrifuge", "Nutsche", "ANFD", "RPF", "VNF"]
+DRYER_TYPE_CHOICES = ["RCVD", "ANFD", "Tray", "FBD"]
+
+
+def _write_workbook(columns):
+    # constant_memory keeps generation of million-row sheets flat in memory
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    worksheet = workbook.add_worksheet()
+    worksheet.write_row(0, 0, list(columns))
+    for r, row in enumerate(zip(*columns.values()), start=1):
+        worksheet.write_row(r, 0, row)
+    workbook.close()
+    return output.getvalue()
+
+
+def reactor_columns(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    capacity = rng.choice([250, 500, 1000, 1600, 2500, 4000, 6300, 10000, 16000], rows).astype(float)
+    return {
+        "Vessel ID": [f"R-{i:07d}" for i in range(rows)],
+        "Min Sensing Volume": np.round(capacity * rng.uniform(0.03, 0.1, rows), 1).tolist(),
+        "Min Stirring Volume": np.round(capacity * rng.uniform(0.08, 0.25, rows), 1).tolist(),
+        "Capacity": capacity.tolist(),
+        "MOC": rng.choice(MOC_CHOICES, rows, p=MOC_WEIGHTS).tolist(),
+        "Utilities": rng.choice(UTILITY_CHOICES, rows, p=UTILITY_WEIGHTS).tolist(),
+        "Agitator": rng.choice(AGITATOR_CHOICES, rows, p=AGITATOR_WEIGHTS).tolist(),
+    }
+
+
+def filter_columns(rows, seed=1):
+    rng = np.random.default_rng(seed)
+    return {
+        "Filter ID": [f"F-{i:07d}" for i in range(rows)],
+        "MOC": rng.choice(VESSEL_MOC_CHOICES, rows, p=VESSEL_MOC_WEIGHTS).tolist(),
+        "Cake Capacity": rng.choice([50, 100, 250, 500, 1000, 2000], rows).astype(float).tolist(),
+        "Filter Type": rng.choice(FILTER_TYPE_CHOICES, rows).tolist(),
+        "Area": np.round(rng.uniform(0.2, 6.0, rows), 2).tolist(),
+    }
+
+
+def dryer_columns(rows, seed=2):
+    rng = np.random.default_rng(seed)
+    return {
+        "Dryer ID": [f"D-{i:07d}" for i in range(rows)],
+        "MOC": rng.choice(VESSEL_MOC_CHOICES, rows, p=VESSEL_MOC_WEIGHTS).tolist(),
+        "Capacity": rng.choice([50, 100, 250, 500, 1000, 2000], rows).astype(float).tolist(),
+        "Dryer Type": rng.choice(DRYER_TYPE_CHOICES, rows).tolist(),
+        "Area": np.round(rng.uniform(0.2, 6.0, rows), 2).tolist(),
+    }
+
+
+def reactor_workbook(rows, seed=0):
+    return _write_workbook(reactor_columns(rows, seed))
+
+
+def filter_workbook(rows, seed=1):
+    return _write_workbook(filter_columns(rows, seed))
+
+
+def dryer_workbook(rows, seed=2):
+    return _write_workbook(dryer_columns(rows, seed))
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def procedure_pdf(steps, lines_per_page=48, seed=3):
+    # Minimal text-only PDF: a short preamble, a "Procedure" heading and
+    # numbered steps that wrap onto a continuation line, as in real reports
+    rng = np.random.default_rng(seed)
+    verbs = ["Charge", "Add", "Stir", "Heat", "Cool", "Filter", "Wash", "Dry", "Send", "Submit"]
+    lines = ["Familiarization Report", "Product: SYN-001", "", "Procedure"]
+    for i in range(1, steps + 1):
+        verb = verbs[rng.integers(len(verbs))]
+        lines.append(f"{i % 100}. {verb} the batch as per BMR section {rng.integers(1, 40)} and record observations.")
+        if rng.random() < 0.4:
+            lines.append("   Note: maintain temperature between 20 and 30 C throughout.")
+
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)]
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page_lines in pages:
+        stream = "BT /F1 10 Tf 14 TL 40 800 Td " + " ".join(f"({_pdf_escape(line)}) '" for line in page_lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for n, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{n} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic equipment workbooks and procedure PDFs.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--reactors", type=int, default=1000, help="Reactor rows")
+    parser.add_argument("--filters", type=int, default=1000, help="Filter rows")
+    parser.add_argument("--dryers", type=int, default=1000, help="Dryer rows")
+    parser.add_argument("--pdf-steps", type=int, default=300, help="Steps in the procedure PDF")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    files = {
+        "reactors.xlsx": reactor_workbook(args.reactors),
+        "filters.xlsx": filter_workbook(args.filters),
+        "dryers.xlsx": dryer_workbook(args.dryers),
+        "procedure.pdf": procedure_pdf(args.pdf_steps),
+    }
+    for name, data in files.items():
+        with open(os.path.join(args.output_dir, name), "wb") as f:
+            f.write(data)
+        print(f"{name}: {len(data) / 1e6:.1f} MB", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import argparse
+import json
+import sys
+import time
+
+import batch_select
+from selection_engine import SelectionError
+
+OBJECTIVES = ["transfers", "utilisation"]
+
+
+def candidate_domains(specs, databases):
+    # One {(unit_op_type kind, equipment id): headroom} dict per unit operation,
+    # where headroom is the unused fraction of the vessel's usable capacity
+    domains = []
+    for spec in specs:
+        matched = batch_select.match_spec(spec, databases)
+        kind = "reactor" if spec.get("unit_op_type", "reaction") in batch_select.REACTOR_OPERATIONS else spec["unit_op_type"]
+        domain = {}
+        for eid, fill in zip(matched["equipment id"], matched["fill fraction"]):
+            domain[(kind, eid)] = max(0.0, 1.0 - float(fill))
+        domains.append(domain)
+    return domains
+
+
+def _weights(objective, n):
+    # Transfers dominate headroom when minimising transfers (total headroom < n + 1),
+    # and only break ties when optimising utilisation
+    if objective == "transfers":
+        return n + 1, 1.0
+    if objective == "utilisation":
+        return 1e-6, 1.0
+    raise ValueError(f"Unknown objective '{objective}'. Choose from {OBJECTIVES}.")
+
+
+class CampaignSearch:
+    """Branch-and-bound over per-operation candidate sets.
+
+    A transfer is counted whenever two consecutive operations use different
+    equipment; a vessel may serve the route again after it was left.
+    """
+
+    def __init__(self, domains, objective="transfers", max_nodes=1_000_000):
+        self.domains = domains
+        self.n = len(domains)
+        self.w_transfer, self.w_headroom = _weights(objective, self.n)
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        self.best_cost = float("inf")
+        self.best = None
+
+    def _futures(self):
+        # Cost to go for ops i + 1.. given that op i ends in e, for every op i
+        # and candidate e, as a layered shortest path from the last op back
+        futures = [None] * self.n
+        futures[-1] = {e: 0.0 for e in self.domains[-1]}
+        for i in range(self.n - 2, -1, -1):
+            tail = {e: self.w_headroom * h + futures[i + 1][e] for e, h in self.domains[i + 1].items()}
+            tail_min = min(tail.values())
+            futures[i] = {e: min(tail.get(e, float("inf")), self.w_transfer + tail_min) for e in self.domains[i]}
+        return futures
+
+    def _search(self, i, prev, cost, assignment):
+        if self.nodes >= self.max_nodes:
+            return
+        self.nodes += 1
+        if i == self.n:
+            if cost < self.best_cost:
+                self.best_cost = cost
+                self.best = list(assignment)
+            return
+
+        future = self.futures[i]
+        options = []
+        for e, h in self.domains[i].items():
+            transfer = 1 if prev is not None and e != prev else 0
+            step = self.w_transfer * transfer + self.w_headroom * h
+            options.append((cost + step + future[e], step, e))
+        options.sort(key=lambda o: o[0])
+
+        for bound, step, e in options:
+            if bound >= self.best_cost:
+                break
+            assignment.append(e)
+            self._search(i + 1, e, cost + step, assignment)
+            assignment.pop()
+
+    def solve(self):
+        empty = [i for i, d in enumerate(self.domains) if not d]
+        if empty:
+            return None, empty
+        if not self.domains:
+            return [], []
+        self.futures = self._futures()
+        self._search(0, None, 0.0, [])
+        return self.best, []
+
+
+def optimize_campaign(specs, databases, objective="transfers", max_nodes=1_000_000):
+    domains = candidate_domains(specs, databases)
+    search = CampaignSearch(domains, objective, max_nodes)
+    start = time.perf_counter()
+    best, empty = search.solve()
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "objective": objective,
+        "feasible": best is not None,
+        "nodes": search.nodes,
+        "exhaustive": search.nodes < max_nodes,
+        "seconds": round(elapsed, 4),
+        "unstaffable": [specs[i]["id"] for i in empty],
+    }
+    if best is None:
+        return result
+
+    transfers = sum(1 for a, b in zip(best, best[1:]) if a != b)
+    result["transfers"] = transfers
+    result["mean headroom"] = round(sum(domains[i][e] for i, e in enumerate(best)) / len(best), 4)
+    result["assignment"] = [
+        {"spec id": spec["id"], "unit_op_type": spec.get("unit_op_type", "reaction"), "equipment": e[0], "equipment id": e[1], "headroom": round(domains[i][e], 4)}
+        for i, (spec, e) in enumerate(zip(specs, best))
+    ]
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Assign every unit operation of a route to equipment at minimum cost.")
+    parser.add_argument("specs", help="CSV or JSON file of unit-operation specs, in route order")
+    parser.add_argument("--reactors", help="Reactor database (.xlsx, .csv or .parquet)")
+    parser.add_argument("--filters", help="Filter database (.xlsx, .csv or .parquet)")
+    parser.add_argument("--dryers", help="Dryer database (.xlsx, .csv or .parquet)")
+    parser.add_argument("--objective", choices=OBJECTIVES, default="transfers")
+    parser.add_argument("--max-nodes", type=int, default=1_000_000, help="Search node budget")
+    parser.add_argument("-o", "--output", help="Write the result as JSON to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    try:
+        databases = batch_select.load_databases(args.reactors, args.filters, args.dryers)
+        result = optimize_campaign(batch_select.load_specs(args.specs), databases, args.objective, args.max_nodes)
+    except SelectionError as e:
+        parser.exit(1, f"error: {e}\n")
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0 if result["feasible"] else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
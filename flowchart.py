@@ -0,0 +1,264 @@
+import html
+import re
+import textwrap
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from instrumentation import span, timed
+from selection_engine import read_upload_bytes
+
+# Bump when extraction or flowchart rendering changes its output; cached
+# results (pdf_cache) are keyed by it
+PARSER_VERSION = "1"
+
+PROCEDURE_ANCHOR = re.compile(r"(?i)\bprocedure\b")
+STEP_PATTERN = re.compile(r"(\d{1,2})\.\s(.+?)(?=\n\d{1,2}\.\s|\Z)", re.DOTALL)
+
+# A step start ("12. " plus one character of text) still undecided at the end of the buffer
+_STEP_PREFIX_CHARS = 5
+
+
+def _format_step(match):
+    num, step = match.groups()
+    step = step.strip().replace('\n', ' ')
+    return f"{num}. {step}"
+
+
+class StepParser:
+    """Incremental equivalent of running STEP_PATTERN over the joined page text.
+
+    Pages are fed one at a time and a step is emitted once the start of the
+    next step has been seen, so only the step in progress is buffered.
+    """
+
+    def __init__(self):
+        self.buffer = None
+
+    def feed(self, text):
+        self.buffer = text if self.buffer is None else self.buffer + "\n" + text
+        steps = []
+        keep_from = max(0, len(self.buffer) - _STEP_PREFIX_CHARS)
+        for match in STEP_PATTERN.finditer(self.buffer):
+            if match.end() == len(self.buffer):
+                # Ran to the end of the buffer, so the next page may extend it
+                keep_from = match.start()
+                break
+            steps.append(_format_step(match))
+            keep_from = match.end()
+        self.buffer = self.buffer[keep_from:]
+        return steps
+
+    def close(self):
+        steps = [_format_step(m) for m in STEP_PATTERN.finditer(self.buffer or "")]
+        self.buffer = None
+        return steps
+
+
+def iter_numbered_steps(page_texts):
+    # Steps after the first "procedure" anchor; without an anchor every step
+    # in the document counts, so those are held back until the end
+    anchored = None
+    fallback = StepParser()
+    held = []
+    for text in page_texts:
+        if not text:
+            continue
+        if anchored is None:
+            match = PROCEDURE_ANCHOR.search(text)
+            if match is None:
+                held.extend(fallback.feed(text))
+                continue
+            anchored = StepParser()
+            held = fallback = None
+            text = text[match.end():]
+        yield from anchored.feed(text)
+
+    if anchored is None:
+        yield from held
+        yield from fallback.close()
+    else:
+        yield from anchored.close()
+
+
+_worker_pdf = None
+
+
+def _init_page_worker(data):
+    import pdfplumber
+    global _worker_pdf
+    _worker_pdf = pdfplumber.open(BytesIO(data))
+
+
+def _extract_page_range(start, stop):
+    texts = []
+    for page in _worker_pdf.pages[start:stop]:
+        texts.append(page.extract_text())
+        page.close()
+    return texts
+
+
+def iter_page_texts(file, workers=None, pages_per_task=8, on_page=None):
+    # Text of each page in order. With workers > 1, page ranges are extracted
+    # across a process pool with a bounded number of ranges in flight.
+    # on_page(done, total) is called as each page's text is handed out; an
+    # exception it raises stops the extraction.
+    # pdfplumber (and pdfminer under it) is imported on first use, so loading
+    # this module for the other flowchart formats stays cheap
+    import pdfplumber
+    data = read_upload_bytes(file)
+    with pdfplumber.open(BytesIO(data)) as pdf:
+        page_count = len(pdf.pages)
+        if not workers or workers <= 1:
+            for done, page in enumerate(pdf.pages, start=1):
+                yield page.extract_text()
+                page.close()
+                if on_page:
+                    on_page(done, page_count)
+            return
+
+    for done, text in enumerate(_iter_page_ranges(data, page_count, workers, pages_per_task), start=1):
+        yield text
+        if on_page:
+            on_page(done, page_count)
+
+
+def _iter_page_ranges(data, page_count, workers, pages_per_task):
+    ranges = [(i, min(i + pages_per_task, page_count)) for i in range(0, page_count, pages_per_task)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_page_worker, initargs=(data,)) as pool:
+        pending = []
+        for start, stop in ranges:
+            pending.append(pool.submit(_extract_page_range, start, stop))
+            if len(pending) >= workers * 2:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+
+def extract_numbered_steps_from_pdf(file, workers=None, on_page=None):
+    data = read_upload_bytes(file)
+    with span("extract_numbered_steps_from_pdf", bytes=len(data)) as s:
+        steps = list(iter_numbered_steps(iter_page_texts(data, workers, on_page=on_page)))
+        s.set(rows=len(steps))
+    return steps
+
+
+NOTE_PATTERN = re.compile(r"(.*?)(?:(?:note[:\-])\s*)(.+)", re.IGNORECASE)
+DECISION_PATTERN = re.compile(r"\b(send|submit)\b", re.IGNORECASE)
+
+# Excel limits a sheet to 1,048,576 rows; long procedures are also easier to
+# read split into several sheets
+MAX_STEPS_PER_SHEET = 500
+
+
+def split_step_note(text):
+    note_match = NOTE_PATTERN.search(text)
+    if note_match:
+        instruction = note_match.group(1).strip()
+        note = "Note: " + note_match.group(2).strip()
+        return instruction, note
+    return text.strip(), None
+
+
+def flowchart_nodes(steps):
+    # (display text, is decision) for each step
+    for step in steps:
+        instruction, note = split_step_note(step)
+        display_text = instruction
+        if note:
+            display_text += f"\n{note}"
+        yield display_text, bool(DECISION_PATTERN.search(instruction))
+
+
+class FlowchartFormats:
+    def __init__(self, workbook):
+        self.box = workbook.add_format({'border': 2, 'align': 'center', 'valign': 'vcenter', 'text_wrap': True})
+        self.diamond = workbook.add_format({
+            'border': 2, 'align': 'center', 'valign': 'vcenter',
+            'text_wrap': True, 'bold': True, 'font_color': 'blue', 'bg_color': '#DDEEFF'
+        })
+        self.arrow = workbook.add_format({'align': 'center', 'valign': 'vcenter', 'font_size': 20, 'bold': True})
+
+
+def write_flowchart_sheet(workbook, worksheet, steps, formats=None, arrow_after_last=False):
+    # Rows are written strictly in order, so this also works in constant_memory mode
+    formats = formats or FlowchartFormats(workbook)
+    worksheet.set_column('C:E', 35)
+    steps = list(steps)
+    row = 0
+    for i, (display_text, is_diamond) in enumerate(flowchart_nodes(steps)):
+        worksheet.set_row(row, 100)
+        worksheet.merge_range(row, 2, row + 1, 4, display_text, formats.diamond if is_diamond else formats.box)
+        if arrow_after_last or i < len(steps) - 1:
+            worksheet.write(row + 2, 3, "↓", formats.arrow)
+        row += 3
+
+
+def create_excel_with_flowchart_only(steps, max_steps_per_sheet=MAX_STEPS_PER_SHEET):
+    import xlsxwriter
+    steps = list(steps)
+    with span("create_excel_with_flowchart_only", rows=len(steps)) as s:
+        output = BytesIO()
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+        formats = FlowchartFormats(workbook)
+        chunks = [steps[i:i + max_steps_per_sheet] for i in range(0, len(steps), max_steps_per_sheet)] or [[]]
+        for n, chunk in enumerate(chunks, start=1):
+            worksheet = workbook.add_worksheet("Process Flow" if n == 1 else f"Process Flow ({n})")
+            # Every sheet but the last ends with an arrow into the next sheet
+            write_flowchart_sheet(workbook, worksheet, chunk, formats, arrow_after_last=n < len(chunks))
+        workbook.close()
+        s.set(bytes=output.tell())
+    output.seek(0)
+    return output
+
+
+SVG_WIDTH = 480
+SVG_BOX_WIDTH = 360
+SVG_LINE_HEIGHT = 16
+SVG_CHARS_PER_LINE = 48
+SVG_ARROW_HEIGHT = 36
+
+
+@timed()
+def create_svg_flowchart(steps):
+    # Single pass: each node's height follows from its wrapped line count
+    parts = []
+    x = (SVG_WIDTH - SVG_BOX_WIDTH) / 2
+    centre = SVG_WIDTH / 2
+    y = 20
+    steps = list(steps)
+    for i, (display_text, is_decision) in enumerate(flowchart_nodes(steps)):
+        lines = [wrapped for paragraph in display_text.split("\n") for wrapped in textwrap.wrap(paragraph, SVG_CHARS_PER_LINE) or [""]]
+        height = len(lines) * SVG_LINE_HEIGHT + 24
+        if is_decision:
+            height += 24
+            parts.append(
+                f'<polygon class="decision" points="{centre},{y} {x + SVG_BOX_WIDTH},{y + height / 2} {centre},{y + height} {x},{y + height / 2}"/>'
+            )
+        else:
+            parts.append(f'<rect class="step" x="{x}" y="{y}" width="{SVG_BOX_WIDTH}" height="{height}" rx="4"/>')
+        text_y = y + (height - len(lines) * SVG_LINE_HEIGHT) / 2 + SVG_LINE_HEIGHT - 4
+        tspans = "".join(
+            f'<tspan x="{centre}" y="{text_y + k * SVG_LINE_HEIGHT}">{html.escape(line)}</tspan>' for k, line in enumerate(lines)
+        )
+        parts.append(f'<text class="{"decision" if is_decision else "step"}">{tspans}</text>')
+        y += height
+        if i < len(steps) - 1:
+            parts.append(f'<line x1="{centre}" y1="{y}" x2="{centre}" y2="{y + SVG_ARROW_HEIGHT - 4}" marker-end="url(#arrow)"/>')
+            y += SVG_ARROW_HEIGHT
+    y += 20
+
+    header = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{SVG_WIDTH}" height="{y}" viewBox="0 0 {SVG_WIDTH} {y}">'
+        '<defs><marker id="arrow" markerWidth="10" markerHeight="10" refX="5" refY="5" orient="auto">'
+        '<path d="M0,0 L10,5 L0,10 z"/></marker></defs>'
+        '<style>rect.step{fill:#fff;stroke:#000;stroke-width:2}polygon.decision{fill:#DDEEFF;stroke:#000;stroke-width:2}'
+        'line{stroke:#000;stroke-width:2}text{font:13px sans-serif;text-anchor:middle}text.decision{fill:blue;font-weight:bold}</style>'
+    )
+    return header + "".join(parts) + "</svg>"
+
+
+def create_html_flowchart(steps, title="Process Flow"):
+    return (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(title)}</title></head>'
+        f'<body><h1>{html.escape(title)}</h1>{create_svg_flowchart(steps)}</body></html>'
+    )
@@ -0,0 +1,194 @@
+import argparse
+import csv
+import io
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pdf_cache
+from instrumentation import span
+from flowchart import extract_numbered_steps_from_pdf, create_excel_with_flowchart_only, write_flowchart_sheet, FlowchartFormats
+
+SUMMARY_FIELDS = ["report", "status", "steps", "seconds", "error"]
+
+
+def iter_zip_reports(data):
+    # (name, bytes) for every PDF in a ZIP archive, in archive order
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and info.filename.lower().endswith(".pdf"):
+                yield info.filename, archive.read(info)
+
+
+def iter_directory_reports(path):
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                full = os.path.join(root, name)
+                with open(full, "rb") as f:
+                    yield os.path.relpath(full, path), f.read()
+
+
+def iter_reports(path):
+    if os.path.isdir(path):
+        return iter_directory_reports(path)
+    with open(path, "rb") as f:
+        return iter_zip_reports(f.read())
+
+
+# One cache handle per process and path
+_caches = {}
+
+
+def _cache_for(path):
+    if path and path not in _caches:
+        _caches[path] = pdf_cache.PdfCache(path)
+    return _caches.get(path)
+
+
+def _convert_report(name, data, render, cache_path=None):
+    start = time.perf_counter()
+    result = {"report": name, "status": "ok", "steps": 0, "error": ""}
+    try:
+        cache = _cache_for(cache_path)
+        steps = cache.steps(data) if cache else extract_numbered_steps_from_pdf(data)
+        result["steps"] = len(steps)
+        if not steps:
+            result["status"] = "no steps"
+        elif render:
+            result["workbook"] = cache.workbook(data, steps) if cache else create_excel_with_flowchart_only(steps).getvalue()
+        else:
+            result["step list"] = steps
+    except Exception as e:
+        # One corrupt PDF must not stop the batch; it is reported in the summary
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def convert_reports(reports, render=True, workers=None, on_progress=None, cache_path=None):
+    # Extract (and optionally render) each report in worker processes.
+    # Results come back in input order. With cache_path, reports seen before
+    # are served from that pdf_cache.
+    reports = list(reports)
+    workers = workers or os.cpu_count() or 1
+    results = [None] * len(reports)
+    with span("convert_reports", rows=len(reports), bytes=sum(len(data) for _, data in reports), workers=workers):
+        if workers == 1:
+            for i, (name, data) in enumerate(reports):
+                results[i] = _convert_report(name, data, render, cache_path)
+                if on_progress:
+                    on_progress(i + 1, len(reports))
+            return results
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_convert_report, name, data, render, cache_path): i for i, (name, data) in enumerate(reports)}
+            try:
+                for done, future in enumerate(as_completed(futures), start=1):
+                    results[futures[future]] = future.result()
+                    if on_progress:
+                        on_progress(done, len(reports))
+            except BaseException:
+                # e.g. on_progress cancelling the batch: skip the reports not yet started
+                pool.shutdown(cancel_futures=True)
+                raise
+    return results
+
+
+def _summary(results):
+    return [{k: r[k] for k in SUMMARY_FIELDS} for r in results]
+
+
+def _summary_csv(summary):
+    text = io.StringIO()
+    writer = csv.DictWriter(text, fieldnames=SUMMARY_FIELDS)
+    writer.writeheader()
+    writer.writerows(summary)
+    return text.getvalue()
+
+
+def convert_to_archive(reports, workers=None, on_progress=None, cache_path=None):
+    # ZIP with one flowchart workbook per report plus summary.csv
+    results = convert_reports(reports, render=True, workers=workers, on_progress=on_progress, cache_path=cache_path)
+    summary = _summary(results)
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+        for r in results:
+            if "workbook" in r:
+                archive.writestr(os.path.splitext(r["report"])[0] + ".xlsx", r["workbook"])
+        archive.writestr("summary.csv", _summary_csv(summary))
+    return output.getvalue(), summary
+
+
+def _sheet_name(report, used):
+    # Excel sheet names: max 31 characters, no []:*?/\ and unique ignoring case
+    base = re.sub(r"[\[\]:*?/\\]", "_", os.path.splitext(os.path.basename(report))[0])[:31] or "Report"
+    name, n = base, 1
+    while name.lower() in used:
+        n += 1
+        suffix = f" ({n})"
+        name = base[:31 - len(suffix)] + suffix
+    used.add(name.lower())
+    return name
+
+
+def convert_to_workbook(reports, workers=None, on_progress=None, cache_path=None):
+    # One workbook with a Summary sheet and a flowchart sheet per report
+    import xlsxwriter
+    results = convert_reports(reports, render=False, workers=workers, on_progress=on_progress, cache_path=cache_path)
+    summary = _summary(results)
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    formats = FlowchartFormats(workbook)
+    summary_sheet = workbook.add_worksheet("Summary")
+    summary_sheet.write_row(0, 0, SUMMARY_FIELDS)
+    for row, item in enumerate(summary, start=1):
+        summary_sheet.write_row(row, 0, [item[k] for k in SUMMARY_FIELDS])
+
+    used = {"summary"}
+    for r in results:
+        if "step list" in r:
+            write_flowchart_sheet(workbook, workbook.add_worksheet(_sheet_name(r["report"], used)), r["step list"], formats)
+    workbook.close()
+    return output.getvalue(), summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate flowchart workbooks for a directory or ZIP of familiarization reports.")
+    parser.add_argument("source", help="Directory or ZIP file containing PDF reports")
+    parser.add_argument("-o", "--output", required=True, help="Output .zip (one workbook per report) or .xlsx (one sheet per report)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--cache", default=pdf_cache.CACHE_PATH, help="Extraction cache (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="Extract every report again")
+    args = parser.parse_args(argv)
+    cache_path = None if args.no_cache else args.cache
+
+    def report_progress(done, total):
+        print(f"\r{done}/{total} reports", end="", file=sys.stderr)
+
+    start = time.perf_counter()
+    reports = list(iter_reports(args.source))
+    if args.output.lower().endswith(".xlsx"):
+        data, summary = convert_to_workbook(reports, args.workers, report_progress, cache_path)
+    else:
+        data, summary = convert_to_archive(reports, args.workers, report_progress, cache_path)
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print(file=sys.stderr)
+
+    for item in summary:
+        line = f"{item['status']:>8}  {item['seconds']:7.3f}s  {item['steps']:5d} steps  {item['report']}"
+        if item["error"]:
+            line += f"  ({item['error']})"
+        print(line)
+    failed = sum(1 for item in summary if item["status"] != "ok")
+    print(f"{len(summary) - failed} of {len(summary)} reports converted in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
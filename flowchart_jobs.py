@@ -0,0 +1,205 @@
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import flowchart
+import flowchart_batch
+from instrumentation import span
+
+# Report conversions run on a fixed set of worker threads shared by every
+# session in the process, so a long pdfplumber pass never holds a script
+# thread. Queued jobs are handed out round-robin across owners: a session
+# that queues a large batch does not hold up another session's single report.
+JOB_WORKERS = int(os.environ.get("REACTOR_JOB_WORKERS", "2"))
+# Finished jobs are kept until released (downloaded), or at most this long
+RESULT_TTL = float(os.environ.get("REACTOR_JOB_TTL_MIN", "60")) * 60
+# Processes per batch conversion: every job worker may run a batch at once,
+# so this stays small instead of flowchart_batch's default of one per CPU
+BATCH_WORKERS = int(os.environ.get("REACTOR_BATCH_WORKERS", "2"))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, id, owner, name, task, args):
+        self.id = id
+        self.owner = owner
+        self.name = name
+        self.task = task
+        self.args = args
+        self.status = QUEUED
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.error = ""
+        self.finished = None
+        self._cancel = threading.Event()
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def fraction(self):
+        return min(self.done / self.total, 1.0) if self.total else 0.0
+
+    def progress(self, done, total):
+        # Reported by the task as it goes; a pending cancel takes effect here
+        self.done, self.total = done, total
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+
+class JobQueue:
+    """Background jobs on a bounded pool of worker threads.
+
+    A task is called as task(job, *args) and reports progress through
+    job.progress(done, total), which is also where cancel() stops it.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, result_ttl=RESULT_TTL):
+        self.workers = max(1, workers)
+        self.result_ttl = result_ttl
+        self.jobs = {}
+        self._queues = OrderedDict()  # owner -> deque of queued jobs
+        self._ids = itertools.count(1)
+        self._ready = threading.Condition()
+        self._threads = []
+        self._closed = False
+
+    def submit(self, owner, name, task, *args):
+        with self._ready:
+            self._expire()
+            job = Job(next(self._ids), owner, name, task, args)
+            self.jobs[job.id] = job
+            self._queues.setdefault(owner, deque()).append(job)
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f"flowchart-job-{len(self._threads) + 1}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._ready.notify()
+        return job
+
+    # jobs is changed by other sessions' submit and release: read it under the lock
+    def get(self, job_id):
+        with self._ready:
+            return self.jobs.get(job_id)
+
+    def owner_jobs(self, owner):
+        with self._ready:
+            jobs = list(self.jobs.values())
+        return [job for job in jobs if job.owner == owner]
+
+    def queued_ahead(self, job):
+        # Jobs that will start before this one under round-robin dispatch
+        with self._ready:
+            if job.status != QUEUED:
+                return 0
+            queues = [list(queue) for queue in self._queues.values()]
+            ahead = 0
+            for turn in itertools.count():
+                for queue in queues:
+                    if turn < len(queue):
+                        if queue[turn] is job:
+                            return ahead
+                        ahead += 1
+
+    def cancel(self, job_id):
+        with self._ready:
+            job = self.jobs.get(job_id)
+            if job is None or not job.active:
+                return
+            job._cancel.set()
+            if job.status == QUEUED:
+                self._unqueue(job)
+                self._finish(job, CANCELLED)
+
+    def release(self, job_id):
+        # Forget a job once its result has been collected; a running job is cancelled
+        self.cancel(job_id)
+        with self._ready:
+            self.jobs.pop(job_id, None)
+
+    def close(self):
+        with self._ready:
+            self._closed = True
+            for job in list(self.jobs.values()):
+                if job.active:
+                    job._cancel.set()
+            self._ready.notify_all()
+
+    def _unqueue(self, job):
+        queue = self._queues[job.owner]
+        queue.remove(job)
+        if not queue:
+            del self._queues[job.owner]
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished = time.time()
+        job.args = None  # the report bytes are not needed any more
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id in [j.id for j in self.jobs.values() if j.finished is not None and j.finished < cutoff]:
+            del self.jobs[job_id]
+
+    def _next(self):
+        # The first owner's oldest job; that owner then goes to the back of the line
+        while not self._queues and not self._closed:
+            self._ready.wait()
+        if self._closed:
+            return None
+        owner, queue = next(iter(self._queues.items()))
+        job = queue.popleft()
+        if queue:
+            self._queues.move_to_end(owner)
+        else:
+            del self._queues[owner]
+        job.status = RUNNING
+        return job
+
+    def _work(self):
+        while True:
+            with self._ready:
+                job = self._next()
+            if job is None:
+                return
+            with span(f"job.{job.task.__name__}"):
+                try:
+                    job.result = job.task(job, *job.args)
+                    status = DONE
+                except JobCancelled:
+                    status = CANCELLED
+                except Exception as e:
+                    job.error = f"{type(e).__name__}: {e}"
+                    status = FAILED
+            with self._ready:
+                self._finish(job, status)
+
+
+def extract_steps(job, data, cache=None):
+    # Numbered steps of one report, with per-page progress
+    if cache:
+        return cache.steps(data, on_page=job.progress)
+    return flowchart.extract_numbered_steps_from_pdf(data, on_page=job.progress)
+
+
+def render_workbook(job, data, steps, cache=None):
+    job.progress(0, 1)
+    workbook = cache.workbook(data, steps) if cache else flowchart.create_excel_with_flowchart_only(steps).getvalue()
+    job.progress(1, 1)
+    return workbook
+
+
+def convert_batch(job, reports, one_workbook=False, cache_path=None, workers=BATCH_WORKERS):
+    # (bytes, summary) of flowchart_batch.convert_to_workbook or convert_to_archive,
+    # with progress counted in reports
+    convert = flowchart_batch.convert_to_workbook if one_workbook else flowchart_batch.convert_to_archive
+    return convert(reports, workers=workers, on_progress=job.progress, cache_path=cache_path)
@@ -0,0 +1,209 @@
+import contextlib
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import logging
+import marshal
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+# Spans are cheap enough to leave on everywhere. Each one is logged as a JSON
+# line on the "reactor.timing" logger (REACTOR_TIMING_LOG: a file path, or "-"
+# for stderr) and added to process-wide totals that write_metrics() renders in
+# the Prometheus text format (REACTOR_METRICS_PATH, rewritten after every run).
+LOG_PATH = os.environ.get("REACTOR_TIMING_LOG")
+METRICS_PATH = os.environ.get("REACTOR_METRICS_PATH")
+# The in-app panel is also available per browser tab with ?diagnostics=1
+DIAGNOSTICS = os.environ.get("REACTOR_DIAGNOSTICS") == "1"
+PROFILE_MODES = ["cprofile", "tracemalloc"]
+
+logger = logging.getLogger("reactor.timing")
+if LOG_PATH and not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr) if LOG_PATH == "-" else logging.FileHandler(LOG_PATH)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_run_spans = contextvars.ContextVar("run_spans", default=None)
+_depth = contextvars.ContextVar("span_depth", default=0)
+_lock = threading.Lock()
+# stage -> [count, seconds, rows, bytes, errors]
+_totals = {}
+
+
+class Span:
+    def __init__(self, name, depth, attrs):
+        self.name = name
+        self.depth = depth
+        self.attrs = attrs
+        self.seconds = None
+        self.status = "ok"
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    # Times the block; rows/bytes given here or via .set() are reported with it
+    depth = _depth.get()
+    s = Span(name, depth, attrs)
+    spans = _run_spans.get()
+    if spans is not None:
+        spans.append(s)
+    token = _depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        yield s
+    except Exception:
+        s.status = "error"
+        raise
+    finally:
+        s.seconds = time.perf_counter() - start
+        _depth.reset(token)
+        _record(s)
+
+
+def timed(name=None, rows=None):
+    # Decorator form of span(); rows(result) gives the row count to report
+    def decorate(fn):
+        stage = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage) as s:
+                result = fn(*args, **kwargs)
+                if rows is not None:
+                    s.set(rows=rows(result))
+                return result
+        return wrapper
+    return decorate
+
+
+def _record(s):
+    with _lock:
+        totals = _totals.setdefault(s.name, [0, 0.0, 0, 0, 0])
+        totals[0] += 1
+        totals[1] += s.seconds
+        totals[2] += int(s.attrs.get("rows") or 0)
+        totals[3] += int(s.attrs.get("bytes") or 0)
+        totals[4] += s.status != "ok"
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({
+            "ts": round(time.time(), 3),
+            "span": s.name,
+            "seconds": round(s.seconds, 6),
+            "depth": s.depth,
+            "status": s.status,
+            **s.attrs,
+        }, default=str))
+
+
+@contextlib.contextmanager
+def capture_run(name="run"):
+    # Collects the spans of one script run (per thread, so sessions stay apart)
+    spans = []
+    token = _run_spans.set(spans)
+    try:
+        with span(name):
+            yield spans
+    finally:
+        _run_spans.reset(token)
+        if METRICS_PATH:
+            write_metrics(METRICS_PATH)
+
+
+def span_rows(spans):
+    return [{
+        "stage": "  " * s.depth + s.name,
+        "ms": round(s.seconds * 1e3, 2) if s.seconds is not None else None,
+        "rows": s.attrs.get("rows"),
+        "bytes": s.attrs.get("bytes"),
+        "status": s.status,
+    } for s in spans]
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def metrics_text():
+    with _lock:
+        totals = {k: list(v) for k, v in _totals.items()}
+    series = [
+        ("reactor_stage_seconds", "summary", "Wall time spent in each instrumented stage.", None),
+        ("reactor_stage_rows_total", "counter", "Rows processed by each stage.", 2),
+        ("reactor_stage_bytes_total", "counter", "Bytes read or written by each stage.", 3),
+        ("reactor_stage_errors_total", "counter", "Stage runs that raised.", 4),
+    ]
+    lines = []
+    for metric, kind, help_text, column in series:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for stage, t in sorted(totals.items()):
+            label = f'{{stage="{_label(stage)}"}}'
+            if column is None:
+                lines.append(f"{metric}_count{label} {t[0]}")
+                lines.append(f"{metric}_sum{label} {t[1]:.6f}")
+            else:
+                lines.append(f"{metric}{label} {t[column]}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path):
+    # Written to a temporary file and renamed so a scraper never sees half a file
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(metrics_text())
+        os.replace(tmp, path)
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+@contextlib.contextmanager
+def profiled(mode, limit=30):
+    # Opt-in capture around one run. cProfile only sees the calling thread;
+    # tracemalloc is process-wide, so it also counts other sessions' allocations.
+    report = {"mode": mode, "text": None, "stats": None}
+    profiler = None
+    tracing = False
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Only one profiler can be active per process (another session's capture)
+            profiler = None
+            report["text"] = "Another profile capture was running; try again."
+    elif mode == "tracemalloc" and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        tracing = True
+    try:
+        yield report
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+            report["text"] = out.getvalue()
+            profiler.create_stats()
+            # Same format as Stats.dump_stats(), so snakeviz/pstats can load it
+            report["stats"] = marshal.dumps(profiler.stats)
+        elif tracing:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            top = snapshot.statistics("lineno")[:limit]
+            report["text"] = f"current {current / 2**20:.2f} MiB, peak {peak / 2**20:.2f} MiB\n" + "\n".join(str(stat) for stat in top)
@@ -0,0 +1,243 @@
+import collections
+import contextlib
+import itertools
+import random
+import threading
+import weakref
+
+from selection_engine import SelectionError
+
+# Windows are half-open [start, end): a batch may start the moment the
+# previous one ends. Any ordered type works for times (datetimes, hours).
+
+
+class BookingConflict(SelectionError):
+    def __init__(self, equipment, conflicts):
+        self.equipment = equipment
+        self.conflicts = conflicts
+        labels = ", ".join(str(b.label or b.id) for b in conflicts)
+        super().__init__(f"{equipment} is already booked in this window ({labels}).")
+
+
+class Booking:
+    def __init__(self, id, equipment, start, end, label=None, owner=None):
+        self.id = id
+        self.equipment = equipment
+        self.start = start
+        self.end = end
+        self.label = label
+        self.owner = owner
+
+    def __repr__(self):
+        return f"Booking({self.id}, {self.equipment!r}, {self.start!r}, {self.end!r})"
+
+
+class _Node:
+    __slots__ = ("booking", "key", "priority", "left", "right", "max_end")
+
+    def __init__(self, booking, priority):
+        self.booking = booking
+        self.key = (booking.start, booking.end, booking.id)
+        self.priority = priority
+        self.left = None
+        self.right = None
+        self.max_end = booking.end
+
+
+def _update(node):
+    node.max_end = node.booking.end
+    for child in (node.left, node.right):
+        if child is not None and child.max_end > node.max_end:
+            node.max_end = child.max_end
+    return node
+
+
+def _split(node, key):
+    # (nodes with key < key, nodes with key >= key)
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        return _update(node), right
+    left, node.left = _split(node.left, key)
+    return left, _update(node)
+
+
+def _merge(left, right):
+    if left is None or right is None:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _update(left)
+    right.left = _merge(left, right.left)
+    return _update(right)
+
+
+class IntervalTree:
+    """Bookings of one piece of equipment, as a treap ordered by start time.
+
+    Each node also holds the latest end time in its subtree, so a search
+    skips any subtree that finishes before the queried window begins:
+    any_overlap() is O(log n) expected, overlaps() O(log n + matches).
+    """
+
+    def __init__(self, seed=0):
+        self.root = None
+        self.size = 0
+        self._random = random.Random(seed)
+
+    def add(self, booking):
+        left, right = _split(self.root, (booking.start, booking.end, booking.id))
+        self.root = _merge(_merge(left, _Node(booking, self._random.random())), right)
+        self.size += 1
+
+    def remove(self, booking):
+        key = (booking.start, booking.end, booking.id)
+        left, rest = _split(self.root, key)
+        middle, right = _split(rest, (booking.start, booking.end, booking.id + 1))
+        if middle is None:
+            raise KeyError(booking.id)
+        self.root = _merge(left, _merge(_merge(middle.left, middle.right), right))
+        self.size -= 1
+
+    def any_overlap(self, start, end):
+        node = self.root
+        while node is not None:
+            b = node.booking
+            if b.start < end and b.end > start:
+                return b
+            # The left subtree can only overlap if something in it ends after start
+            if node.left is not None and node.left.max_end > start:
+                node = node.left
+            elif b.start < end:
+                node = node.right
+            else:
+                return None
+        return None
+
+    def overlaps(self, start, end):
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None or node.max_end <= start:
+                continue
+            b = node.booking
+            if b.start < end:
+                if b.end > start:
+                    found.append(b)
+                stack.append(node.right)
+            stack.append(node.left)
+        return sorted(found, key=lambda b: (b.start, b.end, b.id))
+
+    def __iter__(self):
+        stack, node = [], self.root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.booking
+            node = node.right
+
+
+class Owner:
+    """Key for one planner's bookings (e.g. one app session).
+
+    Once the owner is garbage collected, its bookings are cancelled.
+    """
+
+    def __init__(self, key, on_collect):
+        self.key = key
+        weakref.finalize(self, on_collect, key)
+
+
+class OccupancyCalendar:
+    """Time windows booked on each piece of equipment, one IntervalTree each.
+
+    Safe to share between threads: every call holds the calendar's lock.
+    """
+
+    def __init__(self):
+        self.trees = {}
+        self.bookings = {}
+        self._ids = itertools.count(1)
+        self._owners = itertools.count(1)
+        self._lock = threading.RLock()
+        self._collected = collections.deque()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._lock:
+            # Bookings of collected owners are cancelled here, not in the
+            # garbage collector, which may run in the middle of a call
+            while self._collected:
+                self._release(self._collected.popleft())
+            yield
+
+    def owner(self):
+        return Owner(next(self._owners), self._collected.append)
+
+    def book(self, equipment, start, end, label=None, allow_conflict=False, owner=None):
+        if not start < end:
+            raise SelectionError("A booking must end after it starts.")
+        equipment = str(equipment)
+        with self._locked():
+            tree = self.trees.setdefault(equipment, IntervalTree())
+            if not allow_conflict and tree.any_overlap(start, end) is not None:
+                raise BookingConflict(equipment, tree.overlaps(start, end))
+            booking = Booking(next(self._ids), equipment, start, end, label, owner)
+            tree.add(booking)
+            self.bookings[booking.id] = booking
+        return booking
+
+    def cancel(self, booking_id):
+        with self._locked():
+            return self._cancel(booking_id)
+
+    def _cancel(self, booking_id):
+        booking = self.bookings.pop(booking_id)
+        tree = self.trees[booking.equipment]
+        tree.remove(booking)
+        if not tree.size:
+            del self.trees[booking.equipment]
+        return booking
+
+    def release(self, owner):
+        # Cancels every booking made with this owner key
+        with self._locked():
+            return self._release(owner)
+
+    def _release(self, owner):
+        return [self._cancel(b.id) for b in list(self.bookings.values()) if b.owner == owner]
+
+    def conflicts(self, equipment, start, end):
+        with self._locked():
+            tree = self.trees.get(str(equipment))
+            return tree.overlaps(start, end) if tree else []
+
+    def is_free(self, equipment, start, end):
+        with self._locked():
+            tree = self.trees.get(str(equipment))
+            return tree is None or tree.any_overlap(start, end) is None
+
+    def busy_ids(self, start, end):
+        # Equipment with a booking overlapping the window: O(log n) per booked item
+        with self._locked():
+            return {equipment for equipment, tree in self.trees.items() if tree.any_overlap(start, end) is not None}
+
+    def next_free(self, equipment, start, duration):
+        # Earliest start at or after start with duration free on this equipment
+        with self._locked():
+            tree = self.trees.get(str(equipment))
+            while tree is not None:
+                clash = tree.overlaps(start, start + duration)
+                if not clash:
+                    break
+                start = max(b.end for b in clash)
+        return start
+
+    def schedule(self, equipment):
+        with self._locked():
+            tree = self.trees.get(str(equipment))
+            return list(tree) if tree else []
@@ -0,0 +1,155 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from importlib import metadata
+
+import flowchart
+from instrumentation import span
+from selection_engine import content_hash, read_upload_bytes
+
+# Steps extracted from familiarization reports, and the flowchart workbooks
+# made from them, keyed by the PDF's SHA-256 and the parser version. Least
+# recently used entries are evicted once the cache exceeds its size cap.
+# REACTOR_PDF_CACHE="" turns the cache off.
+CACHE_PATH = os.environ.get("REACTOR_PDF_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdf_cache.sqlite3"))
+MAX_BYTES = int(float(os.environ.get("REACTOR_PDF_CACHE_MB", "256")) * 2**20)
+# Per-page text is only needed to re-parse without pdfplumber; off by default
+KEEP_PAGES = os.environ.get("REACTOR_PDF_CACHE_PAGES") == "1"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    digest TEXT NOT NULL,
+    version TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (digest, version, kind)
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+"""
+
+
+def parser_version():
+    return f"{flowchart.PARSER_VERSION}/pdfplumber-{metadata.version('pdfplumber')}"
+
+
+def _encode(value):
+    return zlib.compress(json.dumps(value).encode())
+
+
+def _decode(data):
+    return json.loads(zlib.decompress(data))
+
+
+class PdfCache:
+    """On-disk LRU cache of report extraction and flowchart rendering results.
+
+    Safe to share between threads and processes: every call uses its own
+    SQLite connection and the database runs in WAL mode.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_BYTES, keep_pages=KEEP_PAGES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.keep_pages = keep_pages
+        self.version = parser_version()
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0}
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            db.execute("PRAGMA synchronous=NORMAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, digest, kind):
+        with self._connect() as db:
+            row = db.execute("SELECT data FROM entries WHERE digest = ? AND version = ? AND kind = ?", (digest, self.version, kind)).fetchone()
+            if row is not None:
+                db.execute("UPDATE entries SET last_used = ? WHERE digest = ? AND version = ? AND kind = ?", (time.time(), digest, self.version, kind))
+        with self._lock:
+            self.stats["hits" if row is not None else "misses"] += 1
+        return None if row is None else bytes(row[0])
+
+    def put(self, digest, kind, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries (digest, version, kind, size, last_used, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, self.version, kind, len(data), time.time(), data),
+            )
+            self._evict(db)
+
+    def _evict(self, db):
+        excess = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return
+        victims = []
+        for rowid, size in db.execute("SELECT rowid, size FROM entries ORDER BY last_used"):
+            victims.append((rowid,))
+            excess -= size
+            if excess <= 0:
+                break
+        db.executemany("DELETE FROM entries WHERE rowid = ?", victims)
+        with self._lock:
+            self.stats["evicted"] += len(victims)
+
+    def size(self):
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM entries")
+
+    def steps(self, file, workers=None, on_page=None):
+        # extract_numbered_steps_from_pdf, served from the cache on a repeat upload
+        data = read_upload_bytes(file)
+        digest = content_hash(data)
+        cached = self.get(digest, "steps")
+        if cached is not None:
+            with span("extract_numbered_steps_from_pdf.cached", bytes=len(data)) as s:
+                steps = _decode(cached)
+                s.set(rows=len(steps))
+            return steps
+        if self.keep_pages:
+            with span("extract_numbered_steps_from_pdf", bytes=len(data)) as s:
+                pages = list(flowchart.iter_page_texts(data, workers, on_page=on_page))
+                steps = list(flowchart.iter_numbered_steps(pages))
+                s.set(rows=len(steps))
+            self.put(digest, "pages", _encode(pages))
+        else:
+            steps = flowchart.extract_numbered_steps_from_pdf(data, workers, on_page)
+        self.put(digest, "steps", _encode(steps))
+        return steps
+
+    def page_texts(self, file):
+        # Cached per-page text, or None if it was not kept
+        cached = self.get(content_hash(read_upload_bytes(file)), "pages")
+        return None if cached is None else _decode(cached)
+
+    def workbook(self, file, steps):
+        # create_excel_with_flowchart_only bytes for the report's steps
+        digest = content_hash(read_upload_bytes(file))
+        cached = self.get(digest, "xlsx")
+        if cached is None:
+            cached = flowchart.create_excel_with_flowchart_only(steps).getvalue()
+            self.put(digest, "xlsx", cached)
+        return cached
+
+
+def open_cache(path=CACHE_PATH):
+    return PdfCache(path) if path else None
@@ -0,0 +1,253 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+
+from selection_engine import content_hash
+
+# Projects live in one SQLite file. Equipment workbooks are stored once per
+# content hash however many projects use them, and each unit operation is a
+# row, so saving after a change rewrites only the operations that changed.
+PROJECT_DB_PATH = os.environ.get("REACTOR_PROJECT_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "projects.sqlite3"))
+EXPORT_VERSION = 1
+DATABASE_KINDS = ["reactors", "filters", "dryers"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS project_databases (
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    digest TEXT NOT NULL REFERENCES blobs(digest),
+    PRIMARY KEY (project_id, kind)
+);
+CREATE TABLE IF NOT EXISTS operations (
+    project_id INTEGER NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    row_hash TEXT NOT NULL,
+    selection TEXT,
+    steps TEXT NOT NULL,
+    booking TEXT,
+    PRIMARY KEY (project_id, position)
+) WITHOUT ROWID;
+"""
+
+
+def _archive_path(kind, name):
+    return f"databases/{kind}{os.path.splitext(name)[1] or '.xlsx'}"
+
+
+def _operation_row(steps, selection, window=None):
+    # window: (start, end) ISO timestamps the equipment is booked for, or None
+    steps_json = json.dumps(steps, sort_keys=True, default=str)
+    selection = None if selection is None else str(selection)
+    booking = None if window is None else json.dumps(list(window))
+    key = f"{selection}\x00{steps_json}" if booking is None else f"{selection}\x00{steps_json}\x00{booking}"
+    row_hash = hashlib.sha1(key.encode()).hexdigest()
+    return row_hash, selection, steps_json, booking
+
+
+def operation_hashes(selections):
+    return [_operation_row(*selection)[0] for selection in selections]
+
+
+class ProjectStore:
+    """Unit-operation projects and their equipment workbooks in SQLite.
+
+    A short-lived connection per call keeps the store safe to share between
+    Streamlit session threads; WAL mode lets readers run alongside a writer.
+    """
+
+    def __init__(self, path=PROJECT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+            # Stores created before operations had a time window
+            if "booking" not in [row[1] for row in db.execute("PRAGMA table_info(operations)")]:
+                db.execute("ALTER TABLE operations ADD COLUMN booking TEXT")
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            db.execute("PRAGMA foreign_keys=ON")
+            db.execute("PRAGMA synchronous=NORMAL")
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def projects(self):
+        with self._connect() as db:
+            return [
+                {"id": pid, "name": name, "updated": updated, "operations": count}
+                for pid, name, updated, count in db.execute(
+                    "SELECT p.id, p.name, p.updated, COUNT(o.position) FROM projects p "
+                    "LEFT JOIN operations o ON o.project_id = p.id GROUP BY p.id ORDER BY p.updated DESC"
+                )
+            ]
+
+    def create(self, name):
+        now = time.time()
+        with self._connect() as db:
+            try:
+                return db.execute("INSERT INTO projects (name, created, updated) VALUES (?, ?, ?)", (name, now, now)).lastrowid
+            except sqlite3.IntegrityError:
+                raise ValueError(f"A project named '{name}' already exists.") from None
+
+    def find(self, name):
+        with self._connect() as db:
+            row = db.execute("SELECT id FROM projects WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise ValueError(f"No project named '{name}'.")
+        return row[0]
+
+    def delete(self, project_id):
+        with self._connect() as db:
+            db.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+            db.execute("DELETE FROM blobs WHERE digest NOT IN (SELECT digest FROM project_databases)")
+
+    def save_database(self, project_id, kind, name, data):
+        # Returns the content hash; the workbook itself is written only if new
+        digest = content_hash(data)
+        with self._connect() as db:
+            db.execute("INSERT OR IGNORE INTO blobs (digest, size, data) VALUES (?, ?, ?)", (digest, len(data), data))
+            db.execute(
+                "INSERT INTO project_databases (project_id, kind, name, digest) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (project_id, kind) DO UPDATE SET name = excluded.name, digest = excluded.digest",
+                (project_id, kind, name, digest),
+            )
+            self._touch(db, project_id)
+        return digest
+
+    def database_digest(self, project_id, kind):
+        with self._connect() as db:
+            row = db.execute("SELECT digest FROM project_databases WHERE project_id = ? AND kind = ?", (project_id, kind)).fetchone()
+        return row[0] if row else None
+
+    def database(self, project_id, kind):
+        # (name, bytes) of the project's workbook of this kind, or None
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT d.name, b.data FROM project_databases d JOIN blobs b ON b.digest = d.digest "
+                "WHERE d.project_id = ? AND d.kind = ?",
+                (project_id, kind),
+            ).fetchone()
+        return (row[0], bytes(row[1])) if row else None
+
+    def load(self, project_id):
+        # [(steps, selection, window)] in unit-operation order
+        with self._connect() as db:
+            rows = db.execute("SELECT selection, steps, booking FROM operations WHERE project_id = ? ORDER BY position", (project_id,)).fetchall()
+        return [(json.loads(steps), selection, booking and tuple(json.loads(booking))) for selection, steps, booking in rows]
+
+    def sync(self, project_id, selections, known_hashes=None):
+        # Writes only the operations whose content changed and drops removed
+        # ones. known_hashes are the row hashes already stored (from the last
+        # sync); without them they are read back first. Returns the new hashes.
+        rows = [_operation_row(*selection) for selection in selections]
+        hashes = [r[0] for r in rows]
+        if hashes == known_hashes:
+            return hashes
+        with self._lock, self._connect() as db:
+            if known_hashes is None:
+                known_hashes = [h for (h,) in db.execute("SELECT row_hash FROM operations WHERE project_id = ? ORDER BY position", (project_id,))]
+            changed = [(project_id, i, *row) for i, row in enumerate(rows) if i >= len(known_hashes) or known_hashes[i] != row[0]]
+            if changed:
+                db.executemany(
+                    "INSERT INTO operations (project_id, position, row_hash, selection, steps, booking) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (project_id, position) DO UPDATE SET row_hash = excluded.row_hash, "
+                    "selection = excluded.selection, steps = excluded.steps, booking = excluded.booking",
+                    changed,
+                )
+            if len(known_hashes) > len(rows):
+                db.execute("DELETE FROM operations WHERE project_id = ? AND position >= ?", (project_id, len(rows)))
+            if changed or len(known_hashes) > len(rows):
+                self._touch(db, project_id)
+        return hashes
+
+    @staticmethod
+    def _touch(db, project_id):
+        db.execute("UPDATE projects SET updated = ? WHERE id = ?", (time.time(), project_id))
+
+    def export_project(self, project_id):
+        # ZIP with project.json and the project's equipment workbooks
+        selections = self.load(project_id)
+        with self._connect() as db:
+            name = db.execute("SELECT name FROM projects WHERE id = ?", (project_id,)).fetchone()[0]
+        manifest = {"version": EXPORT_VERSION, "name": name, "databases": {},
+                    "operations": [{"selection": selection, "steps": steps, "window": window} for steps, selection, window in selections]}
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+            for kind in DATABASE_KINDS:
+                stored = self.database(project_id, kind)
+                if stored:
+                    manifest["databases"][kind] = stored[0]
+                    archive.writestr(_archive_path(kind, stored[0]), stored[1])
+            archive.writestr("project.json", json.dumps(manifest, indent=2, default=str))
+        return output.getvalue()
+
+    def import_project(self, data, name=None):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            manifest = json.loads(archive.read("project.json"))
+            if manifest.get("version") != EXPORT_VERSION:
+                raise ValueError(f"Unsupported project export version {manifest.get('version')}.")
+            project_id = self.create(name or manifest["name"])
+            for kind, db_name in manifest.get("databases", {}).items():
+                self.save_database(project_id, kind, db_name, archive.read(_archive_path(kind, db_name)))
+        self.sync(project_id, [(op["steps"], op["selection"], op.get("window")) for op in manifest["operations"]], known_hashes=[])
+        return project_id
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List, export and import saved selection projects.")
+    parser.add_argument("--db", default=PROJECT_DB_PATH, help="Project store (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list")
+    export = commands.add_parser("export")
+    export.add_argument("name")
+    export.add_argument("-o", "--output", required=True, help="Output .zip")
+    imported = commands.add_parser("import")
+    imported.add_argument("archive", help="Project .zip from export")
+    imported.add_argument("--name", help="Name for the imported project (default: the exported name)")
+    args = parser.parse_args(argv)
+
+    store = ProjectStore(args.db)
+    try:
+        if args.command == "list":
+            for project in store.projects():
+                updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(project["updated"]))
+                print(f"{project['name']}\t{project['operations']} unit operations\t{updated}")
+        elif args.command == "export":
+            with open(args.output, "wb") as f:
+                f.write(store.export_project(store.find(args.name)))
+        else:
+            with open(args.archive, "rb") as f:
+                store.import_project(f.read(), args.name)
+    except (ValueError, KeyError, zipfile.BadZipFile) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
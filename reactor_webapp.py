@@ -1,54 +1,474 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import io
-from openpyxl import load_workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment
-import re
-import pdfplumber
-from io import BytesIO
-import xlsxwriter
-
-def load_reactor_data(filepath):
-    df = pd.read_excel(filepath)
-    df.columns = df.columns.str.strip().str.lower()
-    rename_map = {
-        "vessel id": "reactor id",
-        "min sensing volume": "min sensing",
-        "min stirring volume": "min stirring",
-        "capacity": "max volume",
-        "moc": "moc", 
-        "utilities": "utilities",
-        "agitator": "agitator"
-    }
-    df = df.rename(columns={k: v for k, v in rename_map.items() if k in df.columns})
-
-    if "utilities" not in df.columns:
-        st.error(" 'utilities' column not found in the uploaded Excel. Please ensure it's named correctly.")
-        return pd.DataFrame()
-
-    df["moc"] = df["moc"].str.upper().replace({"ALL GLASS": "GLR"})
-    df["materials"] = df["moc"].apply(lambda x: [m.strip() for m in x.split("/")])
-    df["thermal options"] = df["utilities"].astype(str).apply(lambda x: [t.strip().upper() for t in x.split(",")])
-    df["agitator"] = df["agitator"].astype(str).str.upper()
-    return df[["reactor id", "min sensing", "min stirring", "max volume", "materials", "thermal options", "agitator"]]
+import os
+import uuid
+import zipfile
+from datetime import datetime, timedelta
+from functools import partial
+from streamlit.errors import StreamlitAPIException
+import selection_engine as engine
+from selection_engine import SelectionError, read_upload_bytes, content_hash
+from flowchart import create_svg_flowchart, create_html_flowchart
+import flowchart_batch
+import flowchart_jobs
+import sweeps
+import project_store
+import pdf_cache
+import site_catalog
+from occupancy import OccupancyCalendar
+import instrumentation
+from instrumentation import span
+from rules import get_rules
+
+# Parsed equipment databases are shared across sessions and keyed by the
+# SHA-256 of the uploaded bytes, so the same workbook is only parsed once.
+EQUIPMENT_CACHE_ENTRIES = 32
+# Reactor columns shown to the user; the index's packed materials and
+# thermal options bitsets are left out
+REACTOR_COLUMNS = ["reactor id", "min sensing", "min stirring", "max volume", "agitator", "Preference Match", "Fill (%)", "Score"]
+REACTOR_CHANGES_SHOWN = 50
+
+def load_reactor_index(uploaded_file):
+    # An edited re-upload is patched from the index this session used last,
+    # and the vessels it added, removed or modified are kept for display
+    data = read_upload_bytes(uploaded_file)
+    digest = content_hash(data)
+    previous = st.session_state.get("reactor_index")
+    try:
+        with span("load_reactor_index", bytes=len(data)):
+            index = _build_reactor_index(digest, data, previous)
+    except SelectionError as e:
+        st.error(str(e))
+        return None
+    if previous is not None and digest != st.session_state.get("reactor_digest"):
+        st.session_state.reactor_changes = engine.reactor_changes(previous, index)
+    st.session_state.reactor_index, st.session_state.reactor_digest = index, digest
+    return index
+
+@st.cache_resource(max_entries=EQUIPMENT_CACHE_ENTRIES, show_spinner=False)
+def _build_reactor_index(digest, _data, _previous=None):
+    return engine.load_reactor_index(_data, _previous)
+
+def render_reactor_changes():
+    changes = st.session_state.get("reactor_changes")
+    if not changes or not any(changes.values()):
+        return
+    st.info(f"Reactor database updated: {len(changes['added'])} added, {len(changes['removed'])} removed, "
+            f"{len(changes['modified'])} modified.")
+    with st.expander("Changed vessels"):
+        for label, ids in changes.items():
+            if ids:
+                shown = ", ".join(ids[:REACTOR_CHANGES_SHOWN]) + (f" and {len(ids) - REACTOR_CHANGES_SHOWN} more" if len(ids) > REACTOR_CHANGES_SHOWN else "")
+                st.markdown(f"**{label.capitalize()}:** {shown}")
 
 def load_filter_data(uploaded_file):
-    df = pd.read_excel(uploaded_file)
-    df.columns = df.columns.str.strip().str.lower()
-    return df
+    data = read_upload_bytes(uploaded_file)
+    with span("load_filter_data", bytes=len(data)):
+        return _parse_filter_data(content_hash(data), data)
+
+@st.cache_data(max_entries=EQUIPMENT_CACHE_ENTRIES, show_spinner=False)
+def _parse_filter_data(digest, _data):
+    return engine.load_filter_data(_data)
 
 def load_dryer_data(uploaded_file):
-    df = pd.read_excel(uploaded_file)
-    df.columns = df.columns.str.strip().str.lower()  # Clean column names
-    rename_map = {
-        "dryer id": "equipment id",   # Standardized for consistency
-        "capacity": "capacity",
-        "moc": "moc",
-        "dryer type": "dryer type"
+    data = read_upload_bytes(uploaded_file)
+    with span("load_dryer_data", bytes=len(data)):
+        return _parse_dryer_data(content_hash(data), data)
+
+@st.cache_data(max_entries=EQUIPMENT_CACHE_ENTRIES, show_spinner=False)
+def _parse_dryer_data(digest, _data):
+    return engine.load_dryer_data(_data)
+
+@st.cache_resource(show_spinner=False)
+def get_pdf_cache():
+    return pdf_cache.open_cache()
+
+# Report extraction and flowchart rendering run as background jobs on a pool
+# shared by all sessions; the Flowchart Generator polls them while any of
+# this session's jobs is still queued or running.
+JOB_POLL_SECONDS = 1.0
+
+@st.cache_resource(show_spinner=False)
+def get_job_queue():
+    return flowchart_jobs.JobQueue()
+
+def job_owner():
+    if "job_owner" not in st.session_state:
+        st.session_state.job_owner = uuid.uuid4().hex
+    return st.session_state.job_owner
+
+def jobs_active():
+    return any(job.active for job in get_job_queue().owner_jobs(job_owner()))
+
+def report_steps_job(uploaded_file):
+    # (job, None) while this upload's extraction job runs or after it failed,
+    # (None, steps) once it is done. The job is submitted the first time the
+    # upload is seen and released as soon as its steps have been read; the
+    # session keeps the steps of its latest report.
+    data = uploaded_file.getvalue()
+    digest = content_hash(data)
+    if digest in st.session_state.report_steps:
+        return None, st.session_state.report_steps[digest]
+    queue = get_job_queue()
+    job = queue.get(st.session_state.report_jobs.get(digest))
+    if job is None:
+        job = queue.submit(job_owner(), uploaded_file.name, flowchart_jobs.extract_steps, data, get_pdf_cache())
+        st.session_state.report_jobs[digest] = job.id
+    elif job.status == flowchart_jobs.DONE:
+        st.session_state.report_steps = {digest: job.result}
+        queue.release(st.session_state.report_jobs.pop(digest))
+        return None, job.result
+    return job, None
+
+def retry_report(digest):
+    get_job_queue().release(st.session_state.report_jobs.pop(digest))
+
+def submit_download(name, file_name, mime, unit, task, *args):
+    # A job whose result is offered for download until it has been downloaded
+    job = get_job_queue().submit(job_owner(), name, task, *args)
+    st.session_state.download_jobs[job.id] = (file_name, mime, unit)
+
+def release_download(job_id):
+    get_job_queue().release(job_id)
+    st.session_state.download_jobs.pop(job_id, None)
+
+def render_job_progress(job, unit):
+    queue = get_job_queue()
+    if job.status == flowchart_jobs.QUEUED:
+        ahead = queue.queued_ahead(job)
+        st.progress(0.0, text=f"{job.name}: queued" + (f" behind {ahead} job(s)" if ahead else ""))
+    elif job.total:
+        st.progress(job.fraction, text=f"{job.name}: {job.done} of {job.total} {unit}")
+    else:
+        st.progress(0.0, text=f"{job.name}: starting")
+    st.button("Cancel", key=f"cancel_job_{job.id}", on_click=queue.cancel, args=(job.id,))
+
+def render_downloads():
+    queue = get_job_queue()
+    for job_id, (file_name, mime, unit) in list(st.session_state.download_jobs.items()):
+        job = queue.get(job_id)
+        if job is None:
+            # Expired unread
+            del st.session_state.download_jobs[job_id]
+        elif job.active:
+            render_job_progress(job, unit)
+        elif job.status == flowchart_jobs.DONE:
+            data = job.result
+            if isinstance(data, tuple):
+                data, summary = data
+                failed = sum(1 for r in summary if r["status"] != "ok")
+                if failed:
+                    st.warning(f"⚠️ {failed} of {len(summary)} reports produced no flowchart.")
+                else:
+                    st.success(f"✅ Converted {len(summary)} reports")
+                st.dataframe(pd.DataFrame(summary))
+            st.download_button(label=f"📥 Download {file_name}", data=data, file_name=file_name, mime=mime,
+                               key=f"download_job_{job_id}", on_click=release_download, args=(job_id,))
+        else:
+            st.warning(f"{job.name}: {job.error or 'cancelled'}")
+            st.button("Dismiss", key=f"dismiss_job_{job_id}", on_click=release_download, args=(job_id,))
+
+def run_flowchart_generator():
+    for key in ("report_jobs", "report_steps", "download_jobs"):
+        st.session_state.setdefault(key, {})
+    polling = jobs_active()
+    st.fragment(render_flowchart_generator, run_every=JOB_POLL_SECONDS if polling else None)(polling)
+
+def render_flowchart_generator(polling):
+    st.header("📋 Flowchart Generator from Familiarization Report")
+
+    uploaded_file = st.file_uploader("📄 Upload Familiarization Report PDF", type=["pdf"])
+    if uploaded_file:
+        job, steps = report_steps_job(uploaded_file)
+        if job is not None and job.active:
+            render_job_progress(job, "pages")
+        elif job is not None:
+            st.warning(f"⚠️ Extraction stopped: {job.error or 'cancelled'}")
+            st.button("Extract again", key="retry_report", on_click=retry_report, args=(content_hash(uploaded_file.getvalue()),))
+        elif steps:
+            st.success(f"✅ Extracted {len(steps)} steps under 'Procedure'")
+            flowchart_format = st.radio("Flowchart format", ["Excel", "HTML", "SVG"], horizontal=True)
+            if st.button("Generate Flowchart"):
+                if flowchart_format == "Excel":
+                    submit_download(uploaded_file.name, "flowchart_only.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "sheets",
+                                    flowchart_jobs.render_workbook, uploaded_file.getvalue(), steps, get_pdf_cache())
+                elif flowchart_format == "HTML":
+                    st.download_button(
+                        label="📥 Download Flowchart HTML",
+                        data=create_html_flowchart(steps),
+                        file_name="flowchart.html",
+                        mime="text/html"
+                    )
+                else:
+                    st.download_button(
+                        label="📥 Download Flowchart SVG",
+                        data=create_svg_flowchart(steps),
+                        file_name="flowchart.svg",
+                        mime="image/svg+xml"
+                    )
+        else:
+            st.warning("⚠️ No procedure steps found in the uploaded PDF.")
+
+    st.markdown("---")
+    st.subheader("Batch conversion")
+    uploaded_zip = st.file_uploader("🗂️ Upload a ZIP of Familiarization Report PDFs", type=["zip"])
+    if uploaded_zip:
+        batch_output = st.radio("Output", ["ZIP of workbooks", "One workbook, sheet per report"], horizontal=True)
+        if st.button("Generate Flowcharts for All Reports"):
+            try:
+                reports = list(flowchart_batch.iter_zip_reports(uploaded_zip.getvalue()))
+            except zipfile.BadZipFile as e:
+                st.error(f"Could not read {uploaded_zip.name}: {e}")
+                reports = None
+            if batch_output == "ZIP of workbooks":
+                file_name, mime = "flowcharts.zip", "application/zip"
+            else:
+                file_name, mime = "flowcharts.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            if reports is not None:
+                submit_download(uploaded_zip.name, file_name, mime, "reports",
+                                flowchart_jobs.convert_batch, reports, batch_output != "ZIP of workbooks", pdf_cache.CACHE_PATH)
+
+    render_downloads()
+    # Start polling when a job was submitted, stop once they have all finished
+    if polling != jobs_active():
+        st.rerun()
+
+NO_PROJECT = "(unsaved session)"
+
+@st.cache_resource(show_spinner=False)
+def get_project_store():
+    return project_store.ProjectStore()
+
+def open_project(project_id):
+    store = get_project_store()
+    st.session_state.project_id = project_id
+    if project_id is None:
+        return
+    with span("open_project") as stage:
+        st.session_state.selections = store.load(project_id)
+        st.session_state.booking_ids = None
+        st.session_state.pop("selection_summaries", None)
+        st.session_state.pop("unit_op_result", None)
+        st.session_state.project_hashes = project_store.operation_hashes(st.session_state.selections)
+        st.session_state.project_databases = {kind: store.database_digest(project_id, kind) for kind in project_store.DATABASE_KINDS}
+        stage.set(rows=len(st.session_state.selections))
+
+def create_project():
+    store = get_project_store()
+    try:
+        project_id = store.create(st.session_state.project_new_name.strip())
+    except ValueError as e:
+        st.session_state.project_error = str(e)
+        return
+    # The current session becomes the project's first saved state
+    st.session_state.project_id = project_id
+    st.session_state.project_hashes = store.sync(project_id, st.session_state.selections, known_hashes=[])
+    st.session_state.project_databases = {}
+    st.session_state.project_choice = st.session_state.project_new_name.strip()
+
+def import_project():
+    store = get_project_store()
+    uploaded = st.session_state.get("project_import")
+    if not uploaded:
+        return
+    try:
+        project_id = store.import_project(uploaded.getvalue(), st.session_state.project_new_name.strip() or None)
+    except (ValueError, KeyError, zipfile.BadZipFile) as e:
+        st.session_state.project_error = f"Could not import {uploaded.name}: {e}"
+        return
+    st.session_state.project_choice = next(p["name"] for p in store.projects() if p["id"] == project_id)
+
+def render_projects():
+    store = get_project_store()
+    st.header("Project")
+    projects = store.projects()
+    choice = st.selectbox("Saved project", [NO_PROJECT] + [p["name"] for p in projects], key="project_choice")
+    project_id = next((p["id"] for p in projects if p["name"] == choice), None)
+    if project_id != st.session_state.get("project_id"):
+        open_project(project_id)
+    if "project_error" in st.session_state:
+        st.error(st.session_state.pop("project_error"))
+    if project_id is not None:
+        st.caption("Unit operations and uploaded databases are saved as they change.")
+        st.download_button("Export project (.zip)", data=partial(store.export_project, project_id), file_name=f"{choice}.zip", mime="application/zip", key="project_export")
+    with st.expander("New or imported project"):
+        st.text_input("Project name", key="project_new_name")
+        st.button("Save session as new project", on_click=create_project, key="project_create")
+        st.file_uploader("Import project (.zip)", type=["zip"], key="project_import")
+        st.button("Import", on_click=import_project, key="project_import_button")
+
+def project_workbook(kind, uploaded_file):
+    # With a project open, uploads are saved to it (once per content hash) and
+    # its saved workbook stands in when nothing is uploaded.
+    project_id = st.session_state.get("project_id")
+    if project_id is None:
+        return uploaded_file
+    store = get_project_store()
+    if uploaded_file:
+        data = read_upload_bytes(uploaded_file)
+        saved = st.session_state.project_databases
+        if saved.get(kind) != content_hash(data):
+            saved[kind] = store.save_database(project_id, kind, uploaded_file.name, data)
+        return data
+    stored = store.database(project_id, kind)
+    if stored is None:
+        return None
+    st.caption(f"Using {stored[0]} saved with the project.")
+    return stored[1]
+
+def save_project():
+    project_id = st.session_state.get("project_id")
+    if project_id is not None:
+        st.session_state.project_hashes = get_project_store().sync(project_id, st.session_state.selections, st.session_state.project_hashes)
+
+def _window_times(window):
+    return tuple(datetime.fromisoformat(t) for t in window)
+
+def _booking_label(step_log):
+    return f"Unit Operation {step_log[0]['unit_op']}" if step_log else None
+
+@st.cache_resource(show_spinner=False)
+def get_calendar():
+    # One calendar for every session, so planners see each other's bookings
+    return OccupancyCalendar()
+
+def get_bookings():
+    # This session's bookings in the shared calendar, one per selection with a
+    # time window. Rebooked when the selections were replaced (a project was
+    # opened), otherwise kept in step by add_selection and remove_selection.
+    # They are cancelled once Streamlit drops the session's state.
+    calendar = get_calendar()
+    if "booking_owner" not in st.session_state:
+        st.session_state.booking_owner = calendar.owner()
+        st.session_state.booking_ids = None
+    owner = st.session_state.booking_owner.key
+    if st.session_state.booking_ids is None or len(st.session_state.booking_ids) != len(st.session_state.selections):
+        calendar.release(owner)
+        booking_ids = []
+        for step_log, selection, window in st.session_state.selections:
+            booking_ids.append(_book(calendar, step_log, selection, window))
+        st.session_state.booking_ids = booking_ids
+    return calendar
+
+def _selection_summary(step_log, selection, window):
+    lines = ["| Operation | Material | Input (L) | Actual (L) | Accumulated (L) |", "|---|---|---|---|---|"]
+    for step in step_log:
+        lines.append(f"| {step.get('operation', 'N/A')} | {step.get('material', 'N/A')} | {step.get('input_volume', 0)} "
+                     f"| {step.get('actual_volume', 0)} | {step.get('accumulated_volume', 0)} |")
+    lines.append(f"\n**Selected Equipment:** {selection}")
+    if window:
+        lines.append(f"\n**Booked:** {window[0].replace('T', ' ')} to {window[1].replace('T', ' ')}")
+    return "\n".join(lines)
+
+def get_selection_summaries():
+    # Sidebar markdown of every selection, built once per selection as it is
+    # added rather than on every rerun; rebuilt like get_bookings.
+    if "selection_summaries" not in st.session_state or len(st.session_state.selection_summaries) != len(st.session_state.selections):
+        st.session_state.selection_summaries = [_selection_summary(*entry) for entry in st.session_state.selections]
+    return st.session_state.selection_summaries
+
+def _book(calendar, step_log, selection, window):
+    if not window:
+        return None
+    return calendar.book(selection, *_window_times(window), label=_booking_label(step_log), allow_conflict=True,
+                         owner=st.session_state.booking_owner.key).id
+
+def add_selection(step_log, selection, window=None):
+    # Returns a warning when the equipment was already booked in the window
+    calendar = get_bookings()
+    summaries = get_selection_summaries()
+    warning = None
+    if window:
+        clashes = calendar.conflicts(selection, *_window_times(window))
+        if clashes:
+            warning = f"{selection} is already booked in this window by {', '.join(b.label or str(b.id) for b in clashes)}."
+    st.session_state.booking_ids.append(_book(calendar, step_log, selection, window))
+    st.session_state.selections.append((step_log, selection, window))
+    summaries.append(_selection_summary(step_log, selection, window))
+    return warning
+
+def replace_selection(i, selection):
+    calendar = get_bookings()
+    summaries = get_selection_summaries()
+    step_log, _, window = st.session_state.selections[i]
+    if st.session_state.booking_ids[i] is not None:
+        calendar.cancel(st.session_state.booking_ids[i])
+    st.session_state.booking_ids[i] = _book(calendar, step_log, selection, window)
+    st.session_state.selections[i] = (step_log, selection, window)
+    summaries[i] = _selection_summary(step_log, selection, window)
+
+def remove_selection(i):
+    calendar = get_bookings()
+    get_selection_summaries()
+    st.session_state.selections.pop(i)
+    st.session_state.selection_summaries.pop(i)
+    booking_id = st.session_state.booking_ids.pop(i)
+    if booking_id is not None:
+        calendar.cancel(booking_id)
+    result = st.session_state.get("unit_op_result")
+    if result is not None and result["index"] >= i:
+        if result["index"] == i:
+            del st.session_state.unit_op_result
+        else:
+            result["index"] -= 1
+
+# Fragments that show the selections; a callback that changes them reruns
+# these instead of the whole app.
+SELECTION_FRAGMENTS = ["selection_sidebar", "unit_operation_result", "unit_operation_form", "steps_export"]
+SIDEBAR_PAGE_SIZE = 10
+
+def record_selection(step_log, selection, window, heading, matches=None, site_matches=None, note=None, warnings=()):
+    # Adds a submitted unit operation and keeps its results on screen above
+    # the next one. matches is (kind, unit_op, options, table) and
+    # site_matches the result of query_site_matches.
+    warnings = list(warnings)
+    clash = add_selection(step_log, selection, window)
+    if clash:
+        warnings.append(clash)
+    # Back to the last page of the sidebar, where the new selection is
+    st.session_state.pop("sidebar_page", None)
+    st.session_state.unit_op_result = {
+        "index": len(st.session_state.selections) - 1,
+        "heading": heading,
+        "matches": matches,
+        "site_matches": site_matches,
+        "note": note,
+        "warnings": warnings,
     }
-    df = df.rename(columns=rename_map)
-    return df
+    # The sidebar, export and the next unit operation's form all change
+    st.rerun()
+
+def refresh_selections():
+    # Called from widget callbacks. Without a reactor database the form and
+    # result fragments are not on the page; returning normally then reruns the app.
+    save_project()
+    try:
+        st.rerun(SELECTION_FRAGMENTS)
+    except StreamlitAPIException:
+        pass
+
+def choose_equipment(i, key):
+    replace_selection(i, st.session_state[key])
+    refresh_selections()
+
+def remove_step(i):
+    remove_selection(i)
+    refresh_selections()
+
+def schedule_window(batch_id):
+    # Optional (start, end) booking for this unit operation, and the
+    # equipment already booked in that window, which is left out of the matches
+    if not st.checkbox("Book the equipment for a time window", key=f"book_{batch_id}"):
+        return None, set()
+    start = st.datetime_input("Start", key=f"book_start_{batch_id}")
+    hours = st.number_input("Duration (h)", min_value=0.25, value=8.0, step=0.25, key=f"book_hours_{batch_id}")
+    end = start + timedelta(hours=hours)
+    busy = get_bookings().busy_ids(start, end)
+    if busy:
+        st.caption(f"Booked in this window and left out: {', '.join(sorted(busy))}")
+    return (start.isoformat(), end.isoformat()), busy
 
 def collect_unit_operation(unit_op_id):
     steps = []
@@ -90,512 +510,491 @@ def collect_unit_operation(unit_op_id):
 
     return first_step_volume, total_volume, steps
 
-def filter_reactors(df, user_input, first_step_vol, total_vol):
-    df = df[(df["min sensing"] <= first_step_vol) & (df["min stirring"] <= first_step_vol)]
-
-    process_type = user_input["process_type"]
-    vol_limit = 0.7 if process_type in ["distillation", "reaction", "pressurized"] else 0.95
-    df = df[df["max volume"] * vol_limit >= total_vol]
-
-    if user_input["ph_condition"] == "basic":
-        allowed = ["SSR", "HAR"]
-    elif user_input["ph_condition"] == "acidic":
-        allowed = ["GLR", "HAR"]
-    elif user_input["ph_condition"] == "neutral":
-        allowed = ["GLR", "SSR", "HAR"]
-    elif user_input["ph_condition"] == "coupon":
-        mat = user_input["coupon_materials"][0].strip().upper()
-        if user_input["corrosion_rate"] < 0.1:
-            allowed = [mat]
-        else:
-            st.error("Corrosion rate too high for this material.")
-            return pd.DataFrame()
-    else:
-        allowed = []
-
-    df = df[df["materials"].apply(lambda mats: any(m in mats for m in allowed))]
-
-    temp = user_input["temperature"]
-    if 10 <= temp <= 20:
-        thermal = ["CHB"]
-    elif 20 < temp <= 35:
-        thermal = ["CT"]
-    elif 20 < temp <= 90:
-        thermal = ["HW"]
-    else:
-        thermal = ["LPS", "HOT OIL", "EJECTION CONDENSATE"]
-
-    df = df[df["thermal options"].apply(lambda opts: any(t in opts for t in thermal))]
-
-    preferred = []
-    if user_input["reaction_nature"] == "homogeneous":
-        preferred = ["PROPELLOR", "PBT", "RCI", "ANCHOR", "CBRT"]
-    elif user_input["reaction_nature"] == "heterogeneous":
-        if user_input["reaction_subtype"] == "biphasic":
-            preferred = ["PROPELLOR", "PBT", "CBRT", "RCI"]
-        elif user_input["reaction_subtype"] == "solid-liquid":
-            preferred = ["PROPELLOR", "PBT", "CBRT", "RCI", "ANCHOR"]
-        elif user_input["reaction_subtype"] == "gas-liquid":
-            preferred = ["RUSTON", "DISC"]
-
-    df["Preference Match"] = df["agitator"].apply(lambda a: "yes" if any(p in a for p in preferred) else "warning")
-    return df
-
-def filter_filters(df, user_input, filter_types_required):
-    ph_condition = user_input["ph_condition"]
-
-    if ph_condition == "basic":
-        allowed = ["SSR", "HAR", "HALAR"]
-    elif ph_condition == "acidic":
-        allowed = ["HALAR", "HAR"]
-    elif ph_condition == "neutral":
-        allowed = ["SSR", "HAR", "HALAR"]
-    elif ph_condition == "coupon":
-        mat = user_input["coupon_materials"][0].strip().upper()
-        if user_input["corrosion_rate"] < 0.1:
-            allowed = [mat]
-        else:
-            st.error("Corrosion rate too high for this material.")
-            return pd.DataFrame()
-    else:
-        allowed = []
-
-    df = df[df["moc"].astype(str).str.upper().isin(allowed)]
-
-    # Volume calculation
-    mass = user_input["mass"]
-    bulk_density = user_input["bulk_density"]
-    volume_m3 = mass / bulk_density if bulk_density > 0 else 0
-    volume_litres = volume_m3 * 1000
-    st.write(f"Volume required (L): {volume_litres:.2f}")
-
-    if "cake capacity" not in df.columns:
-        st.error("'cake capacity' column not found in the uploaded Excel.")
-        return pd.DataFrame()
-
-    df = df[df["cake capacity"] * 0.9 >= volume_litres]
-
-    if not filter_types_required:
-        st.warning("No filter type matched the selected filter property.")
-        return pd.DataFrame()
-
-    if "filter type" not in df.columns:
-        st.error("'filter type' column not found in the uploaded Excel.")
-        return pd.DataFrame()
-
-    df["filter type"] = df["filter type"].astype(str).str.upper()
-    df = df[df["filter type"].apply(lambda x: any(f in x for f in filter_types_required))]
-
-    return df
-
-
-def filter_dryers(df, user_input):
-    ph_condition = user_input["ph_condition"]
-
-    # MOC compatibility based on pH
-    if ph_condition == "basic":
-        allowed = ["SSR", "HAR", "HALAR"]
-    elif ph_condition == "acidic":
-        allowed = ["HALAR", "HAR"]
-    elif ph_condition == "neutral":
-        allowed = ["SSR", "HAR", "HALAR"]
-    elif ph_condition == "coupon":
-        mat = user_input["coupon_materials"][0].strip().upper()
-        if user_input["corrosion_rate"] < 0.1:
-            allowed = [mat]
-        else:
-            st.error("Corrosion rate too high for this material.")
-            return pd.DataFrame()
-    else:
-        allowed = []
-
-    # Filter by MOC
-    df = df[df["moc"].astype(str).str.upper().isin(allowed)]
-
-    # Volume check
-    volume_L = user_input["volume"]
-    st.write(f"Volume required (L): {volume_L:.2f}")
-
-    if "capacity" not in df.columns:
-        st.error("'capacity' column not found in the uploaded Excel.")
-        return pd.DataFrame()
-
-    # Capacity should be >= required volume (with 90% margin)
-    df = df[df["capacity"] * 0.9 >= volume_L]
-
-    return df
-
-
-
+EXPORT_COLUMNS = ["Unit Operation", "Operation", "Material", "Volume Added (L)", "Accumulated Volume (L)", "Reactor ID"]
+EXPORT_CACHE_ENTRIES = 64
 
 def export_steps_to_excel(steps_by_unitop):
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-        all_steps = []
-        for unitop_id, (steps, selected_reactor) in enumerate(steps_by_unitop, start=1):
+    # Rows, column widths and unit-operation merge ranges are collected in one
+    # pass, then written in row order under xlsxwriter's constant_memory mode.
+    import xlsxwriter
+    with span("export_steps_to_excel") as stage:
+        rows = []
+        groups = []
+        widths = [len(h) for h in EXPORT_COLUMNS]
+        for unitop_id, (steps, selected_reactor, *_) in enumerate(steps_by_unitop, start=1):
+            if steps:
+                groups.append(len(steps))
             for s in steps:
-                all_steps.append({
-                    "Unit Operation": unitop_id,
-                    "Operation": s["operation"],
-                    "Material": s["material"],
-                    "Volume Added (L)": s["actual_volume"],
-                    "Accumulated Volume (L)": s["accumulated_volume"],
-                    "Reactor ID": selected_reactor
-                })
-
-        df_export = pd.DataFrame(all_steps)
-        df_export.to_excel(writer, index=False, sheet_name="Steps", startrow=2)
-        ws = writer.sheets["Steps"]
-
-        for col in ws.columns:
-            max_length = max(len(str(cell.value)) if cell.value else 0 for cell in col)
-            col_letter = get_column_letter(col[0].column)
-            ws.column_dimensions[col_letter].width = max_length + 2
-
-        current_row = 3
-        prev_op = None
-        for i, row in enumerate(df_export.itertuples(index=False), start=current_row):
-            if prev_op != row[0]:
-                start_row = i
-                count = df_export["Unit Operation"].tolist().count(row[0])
-                ws.merge_cells(start_row=start_row, start_column=1, end_row=start_row + count - 1, end_column=1)
-                cell = ws.cell(row=start_row, column=1)
-                cell.alignment = Alignment(horizontal="center", vertical="center")
-                prev_op = row[0]
+                row = (unitop_id, s["operation"], s["material"], s["actual_volume"], s["accumulated_volume"], selected_reactor)
+                for c, value in enumerate(row):
+                    if value and len(str(value)) > widths[c]:
+                        widths[c] = len(str(value))
+                rows.append(row)
+
+        buffer = io.BytesIO()
+        workbook = xlsxwriter.Workbook(buffer, {"constant_memory": True})
+        ws = workbook.add_worksheet("Steps")
+        header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+        merged_format = workbook.add_format({"align": "center", "valign": "vcenter"})
+        for c, width in enumerate(widths):
+            ws.set_column(c, c, width + 2)
+
+        header_row = 2
+        ws.write_row(header_row, 0, EXPORT_COLUMNS, header_format)
+        r = header_row + 1
+        rows_iter = iter(rows)
+        for size in groups:
+            if size > 1:
+                # Without data or format, merge_range() only records the range:
+                # xlsxwriter skips unformatted blanks, so nothing is written into
+                # later rows ahead of their data, which constant_memory mode drops.
+                ws.merge_range(r, 0, r + size - 1, 0, None)
+            for k in range(size):
+                row = next(rows_iter)
+                if k == 0:
+                    ws.write(r, 0, row[0], merged_format)
+                else:
+                    ws.write_blank(r, 0, None, merged_format)
+                ws.write_row(r, 1, row[1:])
+                r += 1
+        workbook.close()
+        stage.set(rows=len(rows), bytes=buffer.tell())
 
     buffer.seek(0)
     return buffer
 
-def main():
+@st.cache_data(max_entries=EXPORT_CACHE_ENTRIES, show_spinner=False)
+def steps_summary_bytes(selections):
+    # Keyed by the selections' content, so reruns that leave them unchanged reuse the bytes
+    return export_steps_to_excel(selections).getvalue()
+
+def render_app():
     tab1, tab2 = st.tabs(["Equipment Selection", "Flowchart Generator"])
     
     with tab1:
 
      st.set_page_config("Reactor and Filter Selector", layout="wide")
      st.title("Process Engineering Automation")
+     st.caption(f"Selection rules version {get_rules().version}")
 
     # Sidebar for tracking selections
      if "selections" not in st.session_state:
         st.session_state.selections = []
 
      with st.sidebar:
-        st.header("Unit Operation Steps")
-        if st.session_state.selections:
-            for i, (step_log, selection) in enumerate(st.session_state.selections):
-                st.markdown(f"### Step {i+1}")
-                for step in step_log:
-                    st.markdown(f"- **Operation:** {step.get('operation', 'N/A')}")
-                    st.markdown(f"- **Material:** {step.get('material', 'N/A')}")
-                    st.markdown(f"- **Input Volume (L):** {step.get('input_volume', 0)}")
-                    st.markdown(f"- **Actual Volume (L):** {step.get('actual_volume', 0)}")
-                    st.markdown(f"- **Accumulated Volume (L):** {step.get('accumulated_volume', 0)}")
-                st.markdown(f"**Selected Equipment:** {selection}")
-                if st.button(f"❌ Remove Step {i+1}", key=f"remove_{i}"):
-                    st.session_state.selections.pop(i)
-                    st.rerun()
-        else:
-            st.info("No unit operations added yet.")
+        render_projects()
+        render_selection_sidebar()
 
-     uploaded_file = st.file_uploader("Upload reactor database", type="xlsx")
+     uploaded_file = project_workbook("reactors", st.file_uploader("Upload reactor database", type=engine.TABLE_FORMATS))
      if not uploaded_file:
         st.info("Upload the reactor database to start.")
      else:
-        df = load_reactor_data(uploaded_file)
-        if not df.empty:
-            for idx in range(len(st.session_state.selections), len(st.session_state.selections) + 1):
-                st.header("Enter Process Conditions")
-                batch_id = idx + 1
-                st.markdown(f"## Unit Operation {batch_id}")
-
-                unit_op_type = st.selectbox("Select unit operation type", ["reaction", "distillation", "pressurized", "extraction/workup", "filtration", "drying"], key=f"unit_type_{batch_id}")
-                ph_condition = st.selectbox("pH condition", ["basic", "acidic", "neutral", "coupon"], key=f"ph_{batch_id}")
-                corrosion_rate = 0
-                coupon_materials = []
-                if ph_condition == "coupon":
-                    corrosion_rate = st.number_input("Corrosion rate (mm/year)", min_value=0.0, key=f"cr_{batch_id}")
-                    coupon_materials = [st.text_input("Material for coupon study", key=f"mat_{batch_id}").upper()]
-
-                temperature = st.number_input("Process temperature (°C)", min_value=0.0, key=f"temp_{batch_id}")
-
-                # ---------- NON-FILTRATION AND NON-DRYING OPERATIONS ----------
-                if unit_op_type not in ["filtration", "drying"]:
-                    reaction_nature = st.selectbox("Nature of reaction", ["none", "homogeneous", "heterogeneous"], key=f"rn_{batch_id}")
-                    reaction_subtype = None
-                    if reaction_nature == "heterogeneous":
-                        reaction_subtype = st.selectbox("Subtype", ["biphasic", "solid-liquid", "gas-liquid"], key=f"rs_{batch_id}")
-                    st.markdown("---")
-                    first_vol, total_vol, step_log = collect_unit_operation(batch_id)
-                    if st.button(f"Submit Unit Operation {batch_id}", key=f"submit_{batch_id}"):
-                        user_input = {
-                            "process_type": unit_op_type,
-                            "ph_condition": ph_condition,
-                            "corrosion_rate": corrosion_rate,
-                            "coupon_materials": coupon_materials,
-                            "temperature": temperature,
-                            "reaction_nature": reaction_nature,
-                            "reaction_subtype": reaction_subtype
-                        }
-                        matched_df = filter_reactors(df.copy(), user_input, first_vol, total_vol)
-                        if not matched_df.empty:
-                            styled = matched_df[["reactor id", "min sensing", "min stirring", "max volume", "agitator", "Preference Match"]]
-                            st.success(f"Reactors matching Unit Operation {batch_id}")
-                            selected_reactor = st.selectbox("Select one reactor to use:", styled["reactor id"].tolist(), key=f"sel_reactor_{batch_id}")
-                            st.dataframe(styled.style.applymap(
-                                lambda v: "background-color: #d4edda" if v == "yes" else "background-color: #fff3cd",
-                                subset=["Preference Match"]
-                            ))
-                            st.session_state.selections.append((step_log, selected_reactor))
-                        else:
-                            st.warning("No matching reactors found for this unit operation.")
-
-                # ---------- FILTRATION OPERATION ----------
-                elif unit_op_type == "filtration":
-                    uploaded_filter_file = st.file_uploader(f"Upload Filter Database (for Unit Operation {batch_id})", type=["xlsx"], key=f"upload_filter_{batch_id}")
-
-                    st.markdown("### Or manually enter custom filter (not in database)")
-                    custom_filter = st.checkbox("Enter custom filter details", key=f"custom_filter_chk_{batch_id}")
-                    if custom_filter:
-                        custom_filter_name = st.text_input("Filter ID or Name", key=f"custom_filter_name_{batch_id}")
-                        custom_volume = st.number_input("Filtered Volume (L)", min_value=0.0, key=f"custom_filter_volume_{batch_id}")
-
-                        if st.button("Submit Custom Filter", key=f"submit_custom_filter_{batch_id}"):
-                            st.session_state.selections.append(([{
-                                "unit_op": batch_id,
-                                "operation": "filtration",
-                                "material": "N/A",
-                                "input_volume": 0,
-                                "actual_volume": custom_volume,
-                                "accumulated_volume": custom_volume,
-                                "custom": True
-                            }], custom_filter_name))
-                            st.success(f"Custom filter '{custom_filter_name}' added.")
-
-                    if uploaded_filter_file:
-                        filter_df = load_filter_data(uploaded_filter_file)
-
-                        mass = st.number_input("Mass (kg)", min_value=0.0, key=f"mass_{batch_id}")
-                        bulk_density = st.number_input("Bulk density (kg/m³)", min_value=0.0, key=f"bd_{batch_id}")
-
-                        filter_property = st.selectbox(
-                            "Select a filter-specific property",
-                            ["specific cake resistance (m/kg)", "rate of cake buildup", "settling rate"],
-                            key=f"filter_prop_{batch_id}"
-                        )
-
-                        filter_types_required = []
-                        val = 0
-
-                        if filter_property == "specific cake resistance (m/kg)":
-                            val = st.number_input("Enter specific cake resistance (m/kg)", min_value=0.0, key=f"resistance_{batch_id}")
-                            if 1e7 <= val < 1e8:
-                                filter_types_required = ["CENTRIFUGE", "NUTSCHE"]
-                            elif 1e8 <= val < 1e10:
-                                filter_types_required = ["CENTRIFUGE", "ANFD", "RPF", "VNF"]
-                            elif val >= 1e10:
-                                filter_types_required = ["CENTRIFUGE", "NUTSCHE"]
-
-                        elif filter_property == "rate of cake buildup":
-                            unit = st.selectbox("Select unit for rate of cake buildup", ["cm/sec", "cm/min", "cm/hr"], key=f"buildup_unit_{batch_id}")
-                            val = st.number_input(f"Enter rate of cake buildup ({unit})", min_value=0.0, key=f"buildup_val_{batch_id}")
-                            if unit == "cm/sec" and 0.1 <= val <= 10:
-                                filter_types_required = ["CENTRIFUGE", "NUTSCHE"]
-                            elif unit == "cm/min" and 0.1 <= val <= 10:
-                                filter_types_required = ["CENTRIFUGE", "ANFD", "RPF"]
-                            elif unit == "cm/hr" and 0.1 <= val <= 10:
-                                filter_types_required = ["ANFD"]
-
-                        elif filter_property == "settling rate":
-                            val = st.number_input("Enter settling rate (cm/sec)", min_value=0.0, key=f"settling_{batch_id}")
-                            if val > 5:
-                                filter_types_required = ["CENTRIFUGE", "NUTSCHE"]
-                            elif 0.1 <= val <= 5:
-                                filter_types_required = ["ANFD", "RPF"]
-                            elif val < 0.1:
-                                filter_types_required = ["ANFD"]
-
-                        if st.button(f"Submit Filtration Operation {batch_id}", key=f"submit_{batch_id}"):
-                            user_input = {
-                                "ph_condition": ph_condition,
-                                "corrosion_rate": corrosion_rate,
-                                "coupon_materials": coupon_materials,
-                                "temperature": temperature,
-                                "bulk_density": bulk_density,
-                                "mass": mass
-                            }
-
-                            matched_df = filter_filters(filter_df.copy(), user_input, filter_types_required)
-
-                            if not matched_df.empty:
-                                # Calculate volume and cake height
-                                volume_L = mass / bulk_density * 1000 if bulk_density > 0 else 0
-                                volume_m = mass / bulk_density if bulk_density > 0 else 0
-                                if "area" in matched_df.columns:
-                                    matched_df["Cake Height (cm)"] = matched_df["area"].apply(lambda a: round((volume_m * 100 / a) if a > 0 else 0, 2))
-
-                                st.success("Matching filters found")
-                                st.dataframe(matched_df)
-
-                                filter_id_col = next((col for col in matched_df.columns if col.strip().lower() in ["equipment id", "filter id", "id"]), None)
-                                if filter_id_col:
-                                    filter_options = matched_df[filter_id_col].astype(str).tolist()
-                                else:
-                                    st.warning("No suitable ID column found in filters. Using index.")
-                                    filter_options = matched_df.index.astype(str).tolist()
-
-                                selected_filter = st.selectbox("Select one filter to use:", filter_options, key=f"sel_filter_{batch_id}")
-
-                                st.session_state.selections.append(([
-                                    {
-                                        "unit_op": batch_id,
-                                        "operation": "filtration",
-                                        "material": "N/A",
-                                        "input_volume": 0,
-                                        "actual_volume": volume_L,
-                                        "accumulated_volume": volume_L
-                                    }
-                                ], selected_filter))
-                            else:
-                                st.warning("No matching filters found.")
-
-                # ---------- DRYING OPERATION ----------
-                elif unit_op_type == "drying":
-                    uploaded_dryer_file = st.file_uploader(f"Upload Dryer Database (for Unit Operation {batch_id})", type=["xlsx"], key=f"upload_dryer_{batch_id}")
-
-                    st.markdown("### Or manually enter custom dryer (not in database)")
-                    custom_dryer = st.checkbox("Enter custom dryer details", key=f"custom_dryer_chk_{batch_id}")
-                    if custom_dryer:
-                        custom_dryer_name = st.text_input("Dryer ID or Name", key=f"custom_dryer_name_{batch_id}")
-                        custom_capacity = st.number_input("Drying Volume (L)", min_value=0.0, key=f"custom_dryer_capacity_{batch_id}")
-
-                        if st.button("Submit Custom Dryer", key=f"submit_custom_dryer_{batch_id}"):
-                            st.session_state.selections.append(([{
-                                "unit_op": batch_id,
-                                "operation": "drying",
-                                "material": "N/A",
-                                "input_volume": 0,
-                                "actual_volume": custom_capacity,
-                                "accumulated_volume": custom_capacity,
-                                "custom": True
-                            }], custom_dryer_name))
-                            st.success(f"Custom dryer '{custom_dryer_name}' added.")
-
-                    if uploaded_dryer_file:
-                        dryer_df = load_dryer_data(uploaded_dryer_file)
-
-                        volume_L = st.number_input("Volume (L)", min_value=0.0, key=f"vol_dry_{batch_id}")
-
-                        if st.button(f"Submit Drying Operation {batch_id}", key=f"submit_dry_{batch_id}"):
-                            user_input = {
-                                "ph_condition": ph_condition,
-                                "corrosion_rate": corrosion_rate,
-                                "coupon_materials": coupon_materials,
-                                "temperature": temperature,
-                                "volume": volume_L
-                            }
-
-                            matched_df = filter_dryers(dryer_df.copy(), user_input)
-                            if "area" in matched_df.columns:
-                                matched_df["Cake Height (cm)"] = matched_df["area"].apply(lambda a: round((volume_L * 0.1 / a) if a > 0 else 0, 2))
-
-                            if not matched_df.empty:
-                                st.success("Matching dryers found")
-                                st.dataframe(matched_df)
-                                selected_dryer = st.selectbox("Select one dryer to use:", matched_df["equipment id"].tolist() if "equipment id" in matched_df.columns else matched_df.index.astype(str), key=f"sel_dryer_{batch_id}")
-                                st.session_state.selections.append(([{
-                                    "unit_op": batch_id,
-                                    "operation": "drying",
-                                    "material": "N/A",
-                                    "input_volume": 0,
-                                    "actual_volume": volume_L,
-                                    "accumulated_volume": volume_L
-                                }], selected_dryer))
-                            else:
-                                st.warning("No matching dryers found.")
+        reactor_index = load_reactor_index(uploaded_file)
+        render_reactor_changes()
+        if reactor_index is not None and not reactor_index.df.empty:
+            render_sweep(reactor_index)
+            catalog = render_sites()
+            render_unit_operation_result()
+            render_unit_operation(reactor_index, catalog)
 
     with tab2:
-        st.header("📋 Flowchart Generator from Familiarization Report")
-
-        def extract_numbered_steps_from_pdf(file):
-            with pdfplumber.open(file) as pdf:
-                full_text = "\n".join(page.extract_text() for page in pdf.pages if page.extract_text())
-
-            match = re.search(r"(?i)\bprocedure\b", full_text)
-            if match:
-                full_text = full_text[match.end():]
-
-            pattern = r"(\d{1,2})\.\s(.+?)(?=\n\d{1,2}\.\s|\Z)"
-            matches = re.findall(pattern, full_text, re.DOTALL)
-
-            steps = []
-            for num, step in matches:
-                step = step.strip().replace('\n', ' ')
-                steps.append(f"{num}. {step}")
-            return steps
-
-        def split_step_note(text):
-            note_match = re.search(r"(.*?)(?:(?:note[:\-])\s*)(.+)", text, flags=re.IGNORECASE)
-            if note_match:
-                instruction = note_match.group(1).strip()
-                note = "Note: " + note_match.group(2).strip()
-                return instruction, note
-            return text.strip(), None
-
-        def create_excel_with_flowchart_only(steps):
-            output = BytesIO()
-            workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-            worksheet = workbook.add_worksheet("Process Flow")
-
-            row = 0
-            box_format = workbook.add_format({'border': 2, 'align': 'center', 'valign': 'vcenter', 'text_wrap': True})
-            diamond_format = workbook.add_format({
-                'border': 2, 'align': 'center', 'valign': 'vcenter',
-                'text_wrap': True, 'bold': True, 'font_color': 'blue', 'bg_color': '#DDEEFF'
-            })
-
-            for i, step in enumerate(steps):
-                instruction, note = split_step_note(step)
-                is_diamond = bool(re.search(r"\b(send|submit)\b", instruction, re.IGNORECASE))
-                cell_format = diamond_format if is_diamond else box_format
-
-                display_text = instruction
-                if note:
-                    display_text += f"\n{note}"
-
-                worksheet.set_row(row, 100)
-                worksheet.set_column('C:E', 35)
-                worksheet.merge_range(row, 2, row + 1, 4, display_text, cell_format)
-
-                if i < len(steps) - 1:
-                    worksheet.write(row + 2, 3, "↓", workbook.add_format({
-                        'align': 'center', 'valign': 'vcenter', 'font_size': 20, 'bold': True
-                    }))
-
-                row += 3
-
-            workbook.close()
-            output.seek(0)
-            return output
-
-        uploaded_file = st.file_uploader("📄 Upload Familiarization Report PDF", type=["pdf"])
-        if uploaded_file:
-            steps = extract_numbered_steps_from_pdf(uploaded_file)
-            if steps:
-                st.success(f"✅ Extracted {len(steps)} steps under 'Procedure'")
-                if st.button("Generate Flowchart Excel"):
-                    excel_file = create_excel_with_flowchart_only(steps)
-                    st.download_button(
-                        label="📥 Download Flowchart Excel",
-                        data=excel_file,
-                        file_name="flowchart_only.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
-            else:
-                st.warning("⚠️ No procedure steps found in the uploaded PDF.")
+        run_flowchart_generator()
+
+    save_project()
 
     # Export Excel summary for Equipment Selection tab
+    render_steps_export()
+
+@st.fragment(key="selection_sidebar")
+def render_selection_sidebar():
+    # One page of collapsed selections at a time, the last page by default
+    selections = st.session_state.selections
+    with span("sidebar", rows=len(selections)):
+        st.header("Unit Operation Steps")
+        if not selections:
+            st.info("No unit operations added yet.")
+            return
+        summaries = get_selection_summaries()
+        pages = -(-len(selections) // SIDEBAR_PAGE_SIZE)
+        page = pages
+        if pages > 1:
+            if st.session_state.get("sidebar_page", 0) > pages:
+                del st.session_state.sidebar_page
+            page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=pages, step=1, key="sidebar_page")
+        first = (page - 1) * SIDEBAR_PAGE_SIZE
+        for i in range(first, min(first + SIDEBAR_PAGE_SIZE, len(selections))):
+            with st.expander(f"Step {i+1}: {selections[i][1]}"):
+                st.markdown(summaries[i])
+                st.button(f"❌ Remove Step {i+1}", key=f"remove_{i}", on_click=remove_step, args=(i,))
+
+@st.fragment(key="unit_operation_result")
+def render_unit_operation_result():
+    result = st.session_state.get("unit_op_result")
+    if result is None:
+        return
+    if result["note"]:
+        st.write(result["note"])
+    for warning in result["warnings"]:
+        st.warning(warning)
+    st.success(result["heading"])
+    if result["matches"] is not None:
+        kind, unit_op, options, table = result["matches"]
+        key = f"sel_{kind}_{unit_op}"
+        # Shows the equipment currently selected for this unit operation
+        st.session_state[key] = st.session_state.selections[result["index"]][1]
+        st.selectbox(f"Select one {kind} to use:", options, key=key, on_change=choose_equipment, args=(result["index"], key))
+        with span(f"render_{kind}_matches", rows=len(options)):
+            st.dataframe(table)
+    render_site_matches(result["site_matches"])
+
+@st.fragment(key="steps_export")
+def render_steps_export():
+    # The workbook is only written when the button is clicked
     if st.session_state.selections:
-        excel_buffer = export_steps_to_excel(st.session_state.selections)
-        st.download_button("Download Steps Summary", data=excel_buffer.getvalue(), file_name="unit_op_steps.xlsx")
+        st.download_button("Download Steps Summary", data=partial(steps_summary_bytes, list(st.session_state.selections)), file_name="unit_op_steps.xlsx")
+
+@st.fragment(key="unit_operation_form")
+def render_unit_operation(reactor_index, catalog):
+    # Widgets here only rerun the form; a submitted unit operation reruns the app
+    st.header("Enter Process Conditions")
+    batch_id = len(st.session_state.selections) + 1
+    st.markdown(f"## Unit Operation {batch_id}")
+
+    unit_op_type = st.selectbox("Select unit operation type", engine.REACTOR_OPERATIONS + ["filtration", "drying"], key=f"unit_type_{batch_id}")
+    ph_condition = st.selectbox("pH condition", ["basic", "acidic", "neutral", "coupon"], key=f"ph_{batch_id}")
+    corrosion_rate = 0
+    coupon_materials = []
+    if ph_condition == "coupon":
+        corrosion_rate = st.number_input("Corrosion rate (mm/year)", min_value=0.0, key=f"cr_{batch_id}")
+        coupon_materials = [st.text_input("Material for coupon study", key=f"mat_{batch_id}").upper()]
+
+    temperature = st.number_input("Process temperature (°C)", min_value=0.0, key=f"temp_{batch_id}")
+    top_k = st.number_input("Recommendations to show (0 for every match)", min_value=0, value=engine.DEFAULT_TOP_K, step=1, key=f"top_k_{batch_id}") or None
+    window, busy = schedule_window(batch_id)
+
+    # ---------- NON-FILTRATION AND NON-DRYING OPERATIONS ----------
+    if unit_op_type not in ["filtration", "drying"]:
+        reaction_nature = st.selectbox("Nature of reaction", ["none", "homogeneous", "heterogeneous"], key=f"rn_{batch_id}")
+        reaction_subtype = None
+        if reaction_nature == "heterogeneous":
+            reaction_subtype = st.selectbox("Subtype", ["biphasic", "solid-liquid", "gas-liquid"], key=f"rs_{batch_id}")
+        st.markdown("---")
+        first_vol, total_vol, step_log = collect_unit_operation(batch_id)
+        if st.button(f"Submit Unit Operation {batch_id}", key=f"submit_{batch_id}"):
+            user_input = {
+                "process_type": unit_op_type,
+                "ph_condition": ph_condition,
+                "corrosion_rate": corrosion_rate,
+                "coupon_materials": coupon_materials,
+                "temperature": temperature,
+                "reaction_nature": reaction_nature,
+                "reaction_subtype": reaction_subtype
+            }
+            try:
+                matched_df = engine.rank_reactors(reactor_index, user_input, first_vol, total_vol, k=top_k, busy=busy)
+            except SelectionError as e:
+                st.error(str(e))
+                matched_df = pd.DataFrame()
+            site_matches = query_site_matches(catalog, "reactors", lambda: catalog.rank_reactors(user_input, first_vol, total_vol, k=top_k))
+            if not matched_df.empty:
+                styled = matched_df[REACTOR_COLUMNS]
+                options = styled["reactor id"].tolist()
+                record_selection(step_log, options[0], window, f"Best reactors for Unit Operation {batch_id}",
+                                 matches=("reactor", batch_id, options, styled.style.map(
+                                     lambda v: "background-color: #d4edda" if v == "yes" else "background-color: #fff3cd",
+                                     subset=["Preference Match"]
+                                 )),
+                                 site_matches=site_matches)
+            else:
+                st.warning("No matching reactors found for this unit operation.")
+            render_site_matches(site_matches)
+
+    # ---------- FILTRATION OPERATION ----------
+    elif unit_op_type == "filtration":
+        uploaded_filter_file = project_workbook("filters", st.file_uploader(f"Upload Filter Database (for Unit Operation {batch_id})", type=engine.TABLE_FORMATS, key=f"upload_filter_{batch_id}"))
+
+        st.markdown("### Or manually enter custom filter (not in database)")
+        custom_filter = st.checkbox("Enter custom filter details", key=f"custom_filter_chk_{batch_id}")
+        if custom_filter:
+            custom_filter_name = st.text_input("Filter ID or Name", key=f"custom_filter_name_{batch_id}")
+            custom_volume = st.number_input("Filtered Volume (L)", min_value=0.0, key=f"custom_filter_volume_{batch_id}")
+
+            if st.button("Submit Custom Filter", key=f"submit_custom_filter_{batch_id}"):
+                record_selection([{
+                    "unit_op": batch_id,
+                    "operation": "filtration",
+                    "material": "N/A",
+                    "input_volume": 0,
+                    "actual_volume": custom_volume,
+                    "accumulated_volume": custom_volume,
+                    "custom": True
+                }], custom_filter_name, window, f"Custom filter '{custom_filter_name}' added.")
+
+        if uploaded_filter_file:
+            filter_df = load_filter_data(uploaded_filter_file)
+
+            mass = st.number_input("Mass (kg)", min_value=0.0, key=f"mass_{batch_id}")
+            bulk_density = st.number_input("Bulk density (kg/m³)", min_value=0.0, key=f"bd_{batch_id}")
+
+            filter_property = st.selectbox(
+                "Select a filter-specific property",
+                ["specific cake resistance (m/kg)", "rate of cake buildup", "settling rate"],
+                key=f"filter_prop_{batch_id}"
+            )
+
+            val = 0
+            unit = None
+
+            if filter_property == "specific cake resistance (m/kg)":
+                val = st.number_input("Enter specific cake resistance (m/kg)", min_value=0.0, key=f"resistance_{batch_id}")
+            elif filter_property == "rate of cake buildup":
+                unit = st.selectbox("Select unit for rate of cake buildup", ["cm/sec", "cm/min", "cm/hr"], key=f"buildup_unit_{batch_id}")
+                val = st.number_input(f"Enter rate of cake buildup ({unit})", min_value=0.0, key=f"buildup_val_{batch_id}")
+            elif filter_property == "settling rate":
+                val = st.number_input("Enter settling rate (cm/sec)", min_value=0.0, key=f"settling_{batch_id}")
+
+            filter_types_required = engine.filter_types_for(filter_property, val, unit)
+
+            if st.button(f"Submit Filtration Operation {batch_id}", key=f"submit_{batch_id}"):
+                user_input = {
+                    "ph_condition": ph_condition,
+                    "corrosion_rate": corrosion_rate,
+                    "coupon_materials": coupon_materials,
+                    "temperature": temperature,
+                    "bulk_density": bulk_density,
+                    "mass": mass
+                }
+
+                volume_L = engine.filter_volume_litres(mass, bulk_density)
+                volume_note = f"Volume required (L): {volume_L:.2f}"
+                st.write(volume_note)
+
+                matched_df = pd.DataFrame()
+                if not filter_types_required:
+                    st.warning("No filter type matched the selected filter property.")
+                else:
+                    try:
+                        matched_df = engine.rank_filters(filter_df, user_input, filter_types_required, k=top_k, busy=busy)
+                    except SelectionError as e:
+                        st.error(str(e))
+
+                site_matches = query_site_matches(catalog, "filters", lambda: catalog.rank_filters(user_input, filter_types_required, k=top_k)) if filter_types_required else None
+                if not matched_df.empty:
+                    warnings = []
+                    filter_id_col = engine.equipment_id_column(matched_df)
+                    if filter_id_col:
+                        filter_options = matched_df[filter_id_col].astype(str).tolist()
+                    else:
+                        warnings.append("No suitable ID column found in filters. Using index.")
+                        filter_options = matched_df.index.astype(str).tolist()
+
+                    record_selection([
+                        {
+                            "unit_op": batch_id,
+                            "operation": "filtration",
+                            "material": "N/A",
+                            "input_volume": 0,
+                            "actual_volume": volume_L,
+                            "accumulated_volume": volume_L
+                        }
+                    ], filter_options[0], window, "Best matching filters",
+                        matches=("filter", batch_id, filter_options, matched_df),
+                        site_matches=site_matches,
+                        note=volume_note, warnings=warnings)
+                else:
+                    st.warning("No matching filters found.")
+                render_site_matches(site_matches)
+
+    # ---------- DRYING OPERATION ----------
+    elif unit_op_type == "drying":
+        uploaded_dryer_file = project_workbook("dryers", st.file_uploader(f"Upload Dryer Database (for Unit Operation {batch_id})", type=engine.TABLE_FORMATS, key=f"upload_dryer_{batch_id}"))
+
+        st.markdown("### Or manually enter custom dryer (not in database)")
+        custom_dryer = st.checkbox("Enter custom dryer details", key=f"custom_dryer_chk_{batch_id}")
+        if custom_dryer:
+            custom_dryer_name = st.text_input("Dryer ID or Name", key=f"custom_dryer_name_{batch_id}")
+            custom_capacity = st.number_input("Drying Volume (L)", min_value=0.0, key=f"custom_dryer_capacity_{batch_id}")
+
+            if st.button("Submit Custom Dryer", key=f"submit_custom_dryer_{batch_id}"):
+                record_selection([{
+                    "unit_op": batch_id,
+                    "operation": "drying",
+                    "material": "N/A",
+                    "input_volume": 0,
+                    "actual_volume": custom_capacity,
+                    "accumulated_volume": custom_capacity,
+                    "custom": True
+                }], custom_dryer_name, window, f"Custom dryer '{custom_dryer_name}' added.")
+
+        if uploaded_dryer_file:
+            dryer_df = load_dryer_data(uploaded_dryer_file)
+
+            volume_L = st.number_input("Volume (L)", min_value=0.0, key=f"vol_dry_{batch_id}")
+
+            if st.button(f"Submit Drying Operation {batch_id}", key=f"submit_dry_{batch_id}"):
+                user_input = {
+                    "ph_condition": ph_condition,
+                    "corrosion_rate": corrosion_rate,
+                    "coupon_materials": coupon_materials,
+                    "temperature": temperature,
+                    "volume": volume_L
+                }
+
+                volume_note = f"Volume required (L): {volume_L:.2f}"
+                st.write(volume_note)
+                try:
+                    matched_df = engine.rank_dryers(dryer_df, user_input, k=top_k, busy=busy)
+                except SelectionError as e:
+                    st.error(str(e))
+                    matched_df = pd.DataFrame()
+
+                site_matches = query_site_matches(catalog, "dryers", lambda: catalog.rank_dryers(user_input, k=top_k))
+                if not matched_df.empty:
+                    dryer_options = matched_df["equipment id"].tolist() if "equipment id" in matched_df.columns else matched_df.index.astype(str).tolist()
+                    record_selection([{
+                        "unit_op": batch_id,
+                        "operation": "drying",
+                        "material": "N/A",
+                        "input_volume": 0,
+                        "actual_volume": volume_L,
+                        "accumulated_volume": volume_L
+                    }], dryer_options[0], window, "Best matching dryers",
+                        matches=("dryer", batch_id, dryer_options, matched_df),
+                        site_matches=site_matches, note=volume_note)
+                else:
+                    st.warning("No matching dryers found.")
+                render_site_matches(site_matches)
+
+def render_sweep(reactor_index):
+    with st.expander("What-if sweep over temperature, volume and pH"):
+        process_type = st.selectbox("Unit operation type", engine.REACTOR_OPERATIONS, key="sweep_type")
+        t_range = st.slider("Temperature range (°C)", 0.0, 300.0, (0.0, 150.0), key="sweep_temp")
+        t_points = st.number_input("Temperature points", min_value=1, max_value=500, value=31, key="sweep_temp_points")
+        v_low = st.number_input("Smallest total volume (L)", min_value=0.0, value=100.0, key="sweep_vol_low")
+        v_high = st.number_input("Largest total volume (L)", min_value=0.0, value=10000.0, key="sweep_vol_high")
+        v_points = st.number_input("Volume points", min_value=1, max_value=500, value=50, key="sweep_vol_points")
+        ph_classes = list(get_rules().moc["reactor"])
+        ph_conditions = st.multiselect("pH conditions", ph_classes, default=ph_classes, key="sweep_ph")
+        first_vol = st.number_input("First step volume (L, 0 for one charge of the total)", min_value=0.0, key="sweep_first")
+        if st.button("Run sweep", key="sweep_run"):
+            try:
+                result = sweeps.sweep_reactors(
+                    reactor_index, process_type, first_vol or None,
+                    np.linspace(t_range[0], t_range[1], int(t_points)),
+                    np.linspace(v_low, v_high, int(v_points)),
+                    ph_conditions,
+                )
+            except SelectionError as e:
+                st.session_state.pop("sweep_result", None)
+                st.error(str(e))
+                return
+            # Kept so the results survive the rerun of a download click
+            st.session_state.sweep_result = (reactor_index, result)
+        last = st.session_state.get("sweep_result")
+        if last is None or last[0] is not reactor_index:
+            return
+        result = last[1]
+        st.vega_lite_chart(sweeps.heatmap_spec(result.counts()))
+        st.dataframe(result.vessel_summary().head(engine.DEFAULT_TOP_K), hide_index=True)
+        # The exports are only built when their button is clicked
+        st.download_button("Download sweep (.xlsx)", data=partial(result.to_excel), file_name="sweep.xlsx", key="sweep_xlsx")
+        st.download_button("Download vessel × condition matrix (.csv)", data=partial(result.to_csv), file_name="sweep_matrix.csv", mime="text/csv", key="sweep_csv")
+
+@st.cache_resource(show_spinner=False)
+def get_site_catalog():
+    # One catalog (and one query thread pool) for every session, so planners
+    # see the same sites
+    return site_catalog.SiteCatalog()
+
+def render_sites():
+    # Each file is one site's database, named after the file
+    catalog = get_site_catalog()
+    registered = st.session_state.setdefault("site_uploads", set())
+    with st.expander("Other sites"):
+        st.caption("Upload other sites' databases (the file name is the site name) to list matches across sites under each result. Sites are shared with every session until removed.")
+        reindexed = []
+        for kind in site_catalog.DATABASE_KINDS:
+            for f in st.file_uploader(f"Site {kind[:-1]} databases", type=engine.TABLE_FORMATS, accept_multiple_files=True, key=f"site_{kind}") or []:
+                if f.file_id in registered:
+                    continue
+                registered.add(f.file_id)
+                site = os.path.splitext(f.name)[0]
+                catalog.register(site, **{kind: f.getvalue()})
+                try:
+                    reindexed += catalog.refresh()
+                except SelectionError as e:
+                    # A bad upload must not break the shared catalog for everyone
+                    catalog.remove(site, kind)
+                    st.error(str(e))
+        if reindexed:
+            st.caption("Indexed " + ", ".join(f"{site} {kind}" for site, kind in reindexed))
+        sites = catalog.sites()
+        if sites:
+            removed = st.multiselect("Remove sites", sites, key="site_remove")
+            if st.button("Remove", key="site_remove_button", disabled=not removed):
+                for site in removed:
+                    catalog.remove(site)
+                st.rerun()
+    return catalog
+
+def query_site_matches(catalog, kind, query):
+    # (sites, merged matches) across the catalog's sites, or None without any.
+    # Run once on submit; the frame is kept with the result, not the query.
+    sites = catalog.sites(kind)
+    if not sites:
+        return None
+    try:
+        merged = query()
+    except SelectionError as e:
+        st.error(str(e))
+        return None
+    if kind == "reactors":
+        merged = merged[["site"] + REACTOR_COLUMNS]
+    return len(sites), merged
+
+def render_site_matches(site_matches):
+    if site_matches is None:
+        return
+    sites, merged = site_matches
+    st.markdown(f"#### Across {sites} sites")
+    with span("render_site_matches", rows=len(merged)):
+        st.dataframe(merged, hide_index=True)
+
+def diagnostics_enabled():
+    return instrumentation.DIAGNOSTICS or st.query_params.get("diagnostics") == "1"
+
+def arm_profiler():
+    # The rerun triggered by this click is not the one the user wants to profile
+    st.session_state.profile_pending = st.session_state.profile_choice
+    st.session_state.profile_just_armed = True
+
+def render_diagnostics(spans):
+    with st.sidebar.expander("Diagnostics", expanded=False):
+        st.dataframe(pd.DataFrame(instrumentation.span_rows(spans)), hide_index=True)
+        st.selectbox("Profiler", instrumentation.PROFILE_MODES, key="profile_choice")
+        st.button("Profile the next rerun", on_click=arm_profiler)
+        if st.session_state.get("profile_pending"):
+            st.caption(f"{st.session_state.profile_pending} armed for the next rerun")
+        report = st.session_state.get("last_profile")
+        if report and report["text"]:
+            st.caption(f"Last {report['mode']} capture")
+            st.code(report["text"], language=None)
+            if report["stats"]:
+                st.download_button("Download profile (.prof)", data=report["stats"], file_name="rerun.prof")
+
+def main():
+    profile_mode = None
+    if not st.session_state.pop("profile_just_armed", False):
+        profile_mode = st.session_state.pop("profile_pending", None)
+    with instrumentation.capture_run() as spans:
+        try:
+            with instrumentation.profiled(profile_mode) as report:
+                render_app()
+        finally:
+            if profile_mode:
+                st.session_state.last_profile = report
+    if diagnostics_enabled():
+        render_diagnostics(spans)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,151 @@
+import json
+import math
+import os
+from bisect import bisect_left
+
+# The rule table lives outside the code so a rule change is a data edit.
+# get_rules() recompiles it when the file changes on disk.
+RULES_PATH = os.environ.get("REACTOR_RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json"))
+
+
+class IntervalMap:
+    """First-match band lookup compiled into disjoint pieces.
+
+    Bands are checked in table order like an if/elif chain. At compile time
+    every elementary piece of the number line (each endpoint and each open
+    gap between endpoints) is resolved to the first band covering it, so a
+    lookup is one binary search regardless of how many bands there are.
+    """
+
+    def __init__(self, bands, default=()):
+        self.default = tuple(default)
+        self.endpoints = sorted({b[k] for b in bands for k in ("min", "max") if b.get(k) is not None})
+        # Piece 2i + 1 is endpoint i; piece 2i is the gap just below endpoint i
+        self.pieces = []
+        for p in range(2 * len(self.endpoints) + 1):
+            value = self._representative(p)
+            self.pieces.append(next((tuple(b["result"]) for b in bands if self._covers(b, value)), self.default))
+
+    def _representative(self, p):
+        e = self.endpoints
+        if not e:
+            return 0.0
+        if p % 2:
+            return e[p // 2]
+        i = p // 2
+        if i == 0:
+            return e[0] - 1.0
+        if i == len(e):
+            return e[-1] + 1.0
+        return (e[i - 1] + e[i]) / 2
+
+    @staticmethod
+    def _covers(band, value):
+        lo, hi = band.get("min"), band.get("max")
+        if lo is not None and (value < lo or (value == lo and not band.get("min_inclusive", True))):
+            return False
+        if hi is not None and (value > hi or (value == hi and not band.get("max_inclusive", True))):
+            return False
+        return True
+
+    def lookup(self, value):
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return self.default
+        i = bisect_left(self.endpoints, value)
+        if i < len(self.endpoints) and self.endpoints[i] == value:
+            return self.pieces[2 * i + 1]
+        return self.pieces[2 * i]
+
+
+# Used when a rule table predates the ranking section
+DEFAULT_RANKING = {
+    "weights": {"fill": 1.0, "agitator": 0.5, "cake_height": 0.5},
+    "cake_height_cm": {"min": 5, "max": 50},
+}
+
+
+def _bands(rows, result_key):
+    return [{**row, "result": row[result_key]} for row in rows]
+
+
+class CompiledRules:
+    def __init__(self, table):
+        self.version = str(table.get("version", ""))
+        self.moc = {
+            equipment: {ph: frozenset(codes) for ph, codes in by_ph.items()}
+            for equipment, by_ph in table["moc"].items()
+        }
+        self.max_corrosion_rate = float(table["coupon"]["max_corrosion_rate"])
+
+        limits = table["volume_limits"]
+        reactor_limits = dict(limits["reactor"])
+        self.reactor_default_limit = float(reactor_limits.pop("default"))
+        self.reactor_limits = {k: float(v) for k, v in reactor_limits.items()}
+        self.filter_limit = float(limits["filter"])
+        self.dryer_limit = float(limits["dryer"])
+
+        thermal = table["thermal_utilities"]
+        self.thermal = IntervalMap(_bands(thermal["bands"], "utilities"), thermal["default"])
+
+        self.agitator_preferences = {k: tuple(v) for k, v in table["agitator_preferences"].items()}
+        self.agitator_keywords = tuple(dict.fromkeys(k for v in self.agitator_preferences.values() for k in v))
+
+        self.filter_types = {}
+        for prop, spec in table["filter_types"].items():
+            if "units" in spec:
+                self.filter_types[prop] = {unit: IntervalMap(_bands(rows, "types")) for unit, rows in spec["units"].items()}
+            else:
+                self.filter_types[prop] = {None: IntervalMap(_bands(spec["bands"], "types"))}
+
+        ranking = table.get("ranking", DEFAULT_RANKING)
+        self.ranking_weights = {**DEFAULT_RANKING["weights"], **ranking.get("weights", {})}
+        band = ranking.get("cake_height_cm", DEFAULT_RANKING["cake_height_cm"])
+        self.cake_height_band = (float(band["min"]), float(band["max"]))
+
+    def allowed_materials(self, equipment, user_input):
+        # Shared by reactors, filters and dryers. Returns None when a coupon
+        # study's corrosion rate rules the material out.
+        ph_condition = user_input["ph_condition"]
+        if ph_condition == "coupon":
+            if user_input["corrosion_rate"] < self.max_corrosion_rate:
+                return frozenset([user_input["coupon_materials"][0].strip().upper()])
+            return None
+        return self.moc.get(equipment, {}).get(ph_condition, frozenset())
+
+    def volume_limit(self, equipment, process_type=None):
+        if equipment == "reactor":
+            return self.reactor_limits.get(process_type, self.reactor_default_limit)
+        return self.filter_limit if equipment == "filter" else self.dryer_limit
+
+    def thermal_utilities(self, temperature):
+        return list(self.thermal.lookup(temperature))
+
+    def preferred_agitators(self, reaction_nature, reaction_subtype=None):
+        if reaction_subtype:
+            key = f"{reaction_nature}/{reaction_subtype}"
+            if key in self.agitator_preferences:
+                return list(self.agitator_preferences[key])
+        return list(self.agitator_preferences.get(reaction_nature, ()))
+
+    def filter_types_for(self, filter_property, value, unit=None):
+        maps = self.filter_types.get(filter_property, {})
+        interval_map = maps.get(unit) if unit in maps else maps.get(None)
+        return list(interval_map.lookup(value)) if interval_map else []
+
+
+def load_rules(path=RULES_PATH):
+    with open(path) as f:
+        return CompiledRules(json.load(f))
+
+
+_compiled = {}
+
+
+def get_rules(path=RULES_PATH):
+    # Compiled once per file version; a stat per call picks up edits without a restart
+    mtime = os.stat(path).st_mtime_ns
+    cached = _compiled.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, load_rules(path))
+        _compiled[path] = cached
+    return cached[1]
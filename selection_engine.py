@@ -0,0 +1,694 @@
+import contextlib
+import csv
+import hashlib
+import io
+import os
+import tempfile
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import span, timed
+from rules import get_rules
+
+
+# Volumes stay float64: at float32 a vessel filled exactly to its limit can
+# fall either side of the comparison.
+VOLUME_DTYPE = np.float64
+REACTOR_VOLUME_COLUMNS = ["min sensing", "min stirring", "max volume"]
+VESSEL_VOLUME_COLUMNS = ["cake capacity", "capacity"]
+VESSEL_CODE_COLUMNS = ["moc", "filter type", "dryer type"]
+DEFAULT_TOP_K = 10
+REACTOR_OPERATIONS = ["reaction", "distillation", "pressurized", "extraction/workup"]
+
+# Equipment databases may be .xlsx, .csv or .parquet. The header is checked
+# before any rows are read and only the columns a loader needs are kept. An
+# .xlsx is parsed once: its sheet is saved as a Parquet snapshot under
+# REACTOR_SNAPSHOT_DIR ("" turns snapshots off), keyed by content hash.
+TABLE_FORMATS = ["xlsx", "csv", "parquet"]
+SNAPSHOT_DIR = os.environ.get("REACTOR_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshots"))
+SNAPSHOT_VERSION = 1
+MAX_SNAPSHOTS = 64
+
+REACTOR_RENAME = {
+    "vessel id": "reactor id",
+    "min sensing volume": "min sensing",
+    "min stirring volume": "min stirring",
+    "capacity": "max volume",
+}
+REACTOR_COLUMNS = ["reactor id", *REACTOR_VOLUME_COLUMNS, "moc", "utilities", "agitator"]
+DRYER_RENAME = {"dryer id": "equipment id"}
+
+
+class SelectionError(ValueError):
+    pass
+
+
+def read_upload_bytes(source):
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    if hasattr(source, "read"):
+        data = source.read()
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return data
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def table_format(data):
+    if data[:4] == b"PK\x03\x04":
+        return "xlsx"
+    if data[:4] == b"PAR1":
+        return "parquet"
+    return "csv"
+
+
+def _column_key(name, rename):
+    key = str(name).strip().lower()
+    return rename.get(key, key)
+
+
+def read_header(data, fmt=None):
+    # Column names as stored, without reading any data rows
+    fmt = fmt or table_format(data)
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(BytesIO(data)).names)
+    if fmt == "csv":
+        first = io.TextIOWrapper(BytesIO(data), encoding="utf-8-sig", newline="").readline()
+        return next(csv.reader([first]), [])
+    from openpyxl import load_workbook
+    workbook = load_workbook(BytesIO(data), read_only=True, data_only=True)
+    try:
+        row = next(workbook.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+    finally:
+        workbook.close()
+    return [c for c in row if c is not None]
+
+
+def _snapshot_path(digest):
+    return os.path.join(SNAPSHOT_DIR, f"{digest}.v{SNAPSHOT_VERSION}.parquet")
+
+
+def _write_snapshot(df, path):
+    # Written to a temporary file and renamed so a concurrent load never sees half a file
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=SNAPSHOT_DIR, prefix=".snapshot-")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+    except Exception:
+        # Sheets pyarrow cannot store (mixed-type columns) are simply parsed each time
+        os.unlink(tmp)
+        return False
+    # Another process may evict the same snapshots while these are listed
+    snapshots = []
+    for entry in os.scandir(SNAPSHOT_DIR):
+        if entry.name.endswith(".parquet"):
+            with contextlib.suppress(FileNotFoundError):
+                snapshots.append((entry.stat().st_mtime, entry.path))
+    for _, old in sorted(snapshots)[:-MAX_SNAPSHOTS]:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(old)
+    return True
+
+
+def _read_snapshot(path):
+    # The snapshot's bytes, or None when there is none or it was just evicted
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    with contextlib.suppress(FileNotFoundError):
+        os.utime(path)
+    return data
+
+
+def read_table(source, columns=None, rename=None, required=None, what="database"):
+    # DataFrame with stripped, lower-cased column names (then renamed). With
+    # columns, only those are read; required columns missing from the header
+    # raise SelectionError before any row is parsed.
+    data = read_upload_bytes(source)
+    rename = rename or {}
+    fmt = table_format(data)
+    with span("read_table", bytes=len(data), format=fmt) as s:
+        snapshot = _snapshot_path(content_hash(data)) if fmt == "xlsx" and SNAPSHOT_DIR else None
+        cached = _read_snapshot(snapshot) if snapshot else None
+        if cached is not None:
+            header = read_header(cached, "parquet")
+            s.set(snapshot="hit")
+        else:
+            header = read_header(data, fmt)
+        keys = [_column_key(c, rename) for c in header]
+        missing = [c for c in (required or []) if c not in keys]
+        if missing:
+            raise SelectionError(f"Column(s) not found in the uploaded {what}: {', '.join(missing)}. Please ensure they're named correctly.")
+
+        if columns is None:
+            usecols = None
+        else:
+            wanted = set(columns)
+            # First occurrence of each wanted column, in header order
+            usecols = [c for i, (c, k) in enumerate(zip(header, keys)) if k in wanted and k not in keys[:i]]
+
+        if cached is not None:
+            df = pd.read_parquet(BytesIO(cached), columns=usecols)
+        elif fmt == "parquet":
+            df = pd.read_parquet(BytesIO(data), columns=usecols)
+        elif fmt == "csv":
+            df = pd.read_csv(BytesIO(data), encoding="utf-8-sig", usecols=usecols)
+        elif snapshot:
+            df = pd.read_excel(BytesIO(data))
+            s.set(snapshot="written" if _write_snapshot(df, snapshot) else "skipped")
+            if usecols is not None:
+                df = df[usecols]
+        else:
+            df = pd.read_excel(BytesIO(data), usecols=usecols)
+        df.columns = [_column_key(c, rename) for c in df.columns]
+        s.set(rows=len(df))
+    return df
+
+
+def read_reactor_table(source):
+    # The reactor columns as read, before normalize_reactors
+    return read_table(source, REACTOR_COLUMNS, REACTOR_RENAME, REACTOR_COLUMNS, "reactor database")
+
+
+def normalize_reactors(df, codes=None):
+    # Compact schema: float64 volumes, the multi-valued MOC and utility codes
+    # packed into one uint64 bitset per row (vocabularies in df.attrs["codes"])
+    # and the agitator as a categorical. codes are the vocabularies of an
+    # earlier frame to extend, so rows patched into it keep the same bits.
+    codes = codes or {}
+    moc = df["moc"].str.upper().replace({"ALL GLASS": "GLR"}).astype("category")
+    material_vocab, materials = _pack_categories(moc, lambda x: [m.strip() for m in x.split("/")], codes.get("materials"))
+    utilities = df["utilities"].astype(str).astype("category")
+    thermal_vocab, thermal = _pack_categories(utilities, lambda x: [t.strip().upper() for t in x.split(",")], codes.get("thermal options"))
+    compact = pd.DataFrame({
+        "reactor id": df["reactor id"],
+        **{c: df[c].astype(VOLUME_DTYPE) for c in REACTOR_VOLUME_COLUMNS},
+        "materials": materials,
+        "thermal options": thermal,
+        "agitator": df["agitator"].astype(str).str.upper().astype("category"),
+    })
+    compact.attrs["codes"] = {"materials": material_vocab, "thermal options": thermal_vocab}
+    return compact
+
+
+@timed(rows=len)
+def load_reactor_data(source):
+    return normalize_reactors(read_reactor_table(source))
+
+
+def reactor_row_hashes(df):
+    # One uint64 per row of a reactor table as read, over every reactor column
+    # but the id (the key the hashes are looked up by). Volumes are hashed as
+    # floats so a workbook re-saved with 1000.0 for 1000 hashes the same.
+    hashes = np.zeros(len(df), dtype=np.uint64)
+    for c in REACTOR_COLUMNS[1:]:
+        if c in REACTOR_VOLUME_COLUMNS:
+            column_hashes = pd.util.hash_array(df[c].to_numpy(dtype=np.float64))
+        else:
+            # Few distinct values: hash each once
+            codes, uniques = pd.factorize(df[c], use_na_sentinel=False)
+            column_hashes = pd.util.hash_array(np.asarray(uniques, dtype=object))[codes]
+        hashes = hashes * np.uint64(0x100000001B3) ^ column_hashes
+    return hashes
+
+
+def _compact_vessels(df):
+    for c in VESSEL_VOLUME_COLUMNS:
+        if c in df.columns and pd.api.types.is_numeric_dtype(df[c]):
+            df[c] = df[c].astype(VOLUME_DTYPE)
+    for c in VESSEL_CODE_COLUMNS:
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+    return df
+
+
+@timed(rows=len)
+def load_filter_data(source):
+    # Every column is kept: matched filters are shown with their full row
+    return _compact_vessels(read_table(source, what="filter database"))
+
+
+@timed(rows=len)
+def load_dryer_data(source):
+    return _compact_vessels(read_table(source, rename=DRYER_RENAME, what="dryer database"))
+
+
+def _vocabulary(lists, base=None):
+    # Sorted codes, or base with any new codes appended
+    codes = sorted({c for v in lists for c in v})
+    if base is not None:
+        codes = list(base) + [c for c in codes if c not in base]
+    if len(codes) > 64:
+        raise SelectionError(f"Too many distinct codes ({len(codes)}) for a 64-bit mask.")
+    return tuple(codes)
+
+
+def _code_bitmasks(lists, vocab):
+    # One uint64 per row with bit i set when vocab code i appears in the row's list
+    lengths = np.fromiter((len(v) for v in lists), dtype=np.int64, count=len(lists))
+    rows = np.repeat(np.arange(len(lists)), lengths)
+    codes = [c for v in lists for c in v]
+    bits = np.array([np.uint64(1) << np.uint64(vocab[c]) for c in codes], dtype=np.uint64)
+    masks = np.zeros(len(lists), dtype=np.uint64)
+    np.bitwise_or.at(masks, rows, bits)
+    return masks
+
+
+def _pack_categories(series, split, vocab=None):
+    # Each distinct value is split and packed once; rows then take their
+    # category's mask (missing values get no codes)
+    lists = [split(str(v)) for v in series.cat.categories]
+    vocab = _vocabulary(lists, vocab)
+    masks = np.append(_code_bitmasks(lists, {c: i for i, c in enumerate(vocab)}), np.uint64(0))
+    return vocab, masks[series.cat.codes.to_numpy()]
+
+
+def _bitset_column(df, column):
+    # (code -> bit, per-row masks) for a packed column, or packed here from lists
+    values = df[column]
+    if values.dtype == np.uint64:
+        vocab = df.attrs["codes"][column]
+        return {c: i for i, c in enumerate(vocab)}, values.to_numpy()
+    lists = values.tolist()
+    vocab = {c: i for i, c in enumerate(_vocabulary(lists))}
+    return vocab, _code_bitmasks(lists, vocab)
+
+
+def _per_value(series, test):
+    # Upper-cased string test evaluated once per category for categoricals
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return test(series.astype(str).str.upper()).to_numpy(dtype=bool)
+    values = pd.Series(list(series.cat.categories.astype(str).str.upper()) + ["NAN"])
+    return test(values).to_numpy(dtype=bool)[series.cat.codes.to_numpy()]
+
+
+def _agitator_bits(agitator, vocab):
+    # One bit per agitator keyword found in the row's agitator, per category
+    agitator = agitator.astype("category")
+    agitator_values = agitator.cat.categories.astype(str)
+    category_bits = np.zeros(len(agitator_values) + 1, dtype=np.uint64)
+    for keyword, i in vocab.items():
+        hit = agitator_values.str.contains(keyword, regex=False)
+        category_bits[:-1][np.asarray(hit, dtype=bool)] |= np.uint64(1) << np.uint64(i)
+    return category_bits[agitator.cat.codes.to_numpy()]
+
+
+def _merge_order(order, new_position, values, fresh_rows):
+    # Sort order of a patched column from the old one: kept rows stay in their
+    # old relative order (new_position maps old rows to new, -1 if dropped)
+    # and the fresh rows are merged in by binary search
+    kept = new_position[order]
+    kept = kept[kept >= 0]
+    fresh = fresh_rows[np.argsort(values[fresh_rows], kind="stable")]
+    return np.insert(kept, np.searchsorted(values[kept], values[fresh], side="right"), fresh)
+
+
+class ReactorIndex:
+    def __init__(self, df, agitator_keywords=None):
+        with span("ReactorIndex", rows=len(df)):
+            self._build(df, agitator_keywords)
+
+    def _build(self, df, agitator_keywords):
+        self.df = df
+        # Per-row hashes of the table the index was built from (build_reactor_index)
+        self.row_hashes = None
+        self.id_index = None
+        self.material_vocab, self.material_bits = _bitset_column(df, "materials")
+        self.thermal_vocab, self.thermal_bits = _bitset_column(df, "thermal options")
+
+        # One bit per agitator keyword named in the rule table
+        keywords = get_rules().agitator_keywords if agitator_keywords is None else agitator_keywords
+        self.agitator_vocab = {k: i for i, k in enumerate(dict.fromkeys(keywords))}
+        if len(self.agitator_vocab) > 64:
+            raise ValueError(f"Too many agitator keywords ({len(self.agitator_vocab)}) for a 64-bit mask.")
+        self.agitator_bits = _agitator_bits(df["agitator"], self.agitator_vocab)
+
+        self.min_sensing = self._volumes(df["min sensing"])
+        self.min_stirring = self._volumes(df["min stirring"])
+        self.max_volume = self._volumes(df["max volume"])
+        self._sort_volumes(
+            np.argsort(self.min_sensing, kind="stable"),
+            np.argsort(self.min_stirring, kind="stable"),
+            np.argsort(self.max_volume, kind="stable"),
+        )
+
+    def _sort_volumes(self, sensing_order, stirring_order, volume_order):
+        self.sensing_order = sensing_order
+        self.stirring_order = stirring_order
+        self.volume_order = volume_order
+        self.sensing_sorted = self.min_sensing[sensing_order]
+        self.stirring_sorted = self.min_stirring[stirring_order]
+        self.volume_sorted = self.max_volume[volume_order]
+
+    def patched(self, table, positions, same):
+        # Index of a new version of the table. Rows whose hash is unchanged
+        # (same; positions are their rows here) are taken from this index as
+        # they are; only the other rows are normalized, and merged into the
+        # sorted volume columns instead of re-sorting them.
+        keep = positions[same]
+        fresh_rows = np.flatnonzero(~same)
+        fresh = normalize_reactors(table.iloc[fresh_rows], self.df.attrs["codes"])
+        # Row i of the new version is row src[i] of the kept rows followed by the fresh ones
+        src = np.empty(len(table), dtype=np.intp)
+        src[same] = np.arange(len(keep))
+        src[fresh_rows] = len(keep) + np.arange(len(fresh_rows))
+
+        def column(old, new):
+            return np.concatenate([old[keep], new])[src]
+
+        agitator = self.df["agitator"].cat
+        categories = agitator.categories.append(fresh["agitator"].cat.categories.difference(agitator.categories))
+        agitator_codes = column(agitator.codes.to_numpy(), categories.get_indexer(fresh["agitator"].astype(object)))
+
+        index = ReactorIndex.__new__(ReactorIndex)
+        index.row_hashes = index.id_index = None
+        index.material_vocab = {c: i for i, c in enumerate(fresh.attrs["codes"]["materials"])}
+        index.thermal_vocab = {c: i for i, c in enumerate(fresh.attrs["codes"]["thermal options"])}
+        index.material_bits = column(self.material_bits, fresh["materials"].to_numpy())
+        index.thermal_bits = column(self.thermal_bits, fresh["thermal options"].to_numpy())
+        index.agitator_vocab = self.agitator_vocab
+        index.agitator_bits = column(self.agitator_bits, _agitator_bits(fresh["agitator"], self.agitator_vocab))
+        index.min_sensing = column(self.min_sensing, self._volumes(fresh["min sensing"]))
+        index.min_stirring = column(self.min_stirring, self._volumes(fresh["min stirring"]))
+        index.max_volume = column(self.max_volume, self._volumes(fresh["max volume"]))
+        new_position = np.full(len(self.df), -1, dtype=np.intp)
+        new_position[keep] = np.flatnonzero(same)
+        index._sort_volumes(
+            _merge_order(self.sensing_order, new_position, index.min_sensing, fresh_rows),
+            _merge_order(self.stirring_order, new_position, index.min_stirring, fresh_rows),
+            _merge_order(self.volume_order, new_position, index.max_volume, fresh_rows),
+        )
+
+        index.df = pd.DataFrame({
+            "reactor id": table["reactor id"].reset_index(drop=True),
+            "min sensing": index.min_sensing,
+            "min stirring": index.min_stirring,
+            "max volume": index.max_volume,
+            "materials": index.material_bits,
+            "thermal options": index.thermal_bits,
+            "agitator": pd.Categorical.from_codes(agitator_codes, categories),
+        })
+        index.df.attrs["codes"] = fresh.attrs["codes"]
+        return index
+
+    @staticmethod
+    def _volumes(column):
+        return column.to_numpy(dtype=VOLUME_DTYPE)
+
+    @staticmethod
+    def mask_for(codes, vocab):
+        mask = np.uint64(0)
+        for c in codes:
+            if c in vocab:
+                mask |= np.uint64(1) << np.uint64(vocab[c])
+        return mask
+
+    def volume_candidates(self, first_step_vol, total_vol, vol_limit):
+        # Binary search each sorted column, then check the exact predicates on the narrowest span only
+        spans = [
+            self.sensing_order[:np.searchsorted(self.sensing_sorted, first_step_vol, side="right")],
+            self.stirring_order[:np.searchsorted(self.stirring_sorted, first_step_vol, side="right")],
+            self.volume_order[np.searchsorted(self.volume_sorted, total_vol / vol_limit * (1 - 1e-5), side="left"):],
+        ]
+        pos = min(spans, key=len)
+        keep = (
+            (self.min_sensing[pos] <= first_step_vol)
+            & (self.min_stirring[pos] <= first_step_vol)
+            & (self.max_volume[pos] * vol_limit >= total_vol)
+        )
+        return np.sort(pos[keep])
+
+    def busy_mask(self, pos, busy):
+        # True for the reactors at pos whose id is in busy (booked in the window)
+        return self.df["reactor id"].iloc[pos].astype(str).isin([str(b) for b in busy]).to_numpy()
+
+    def match_positions(self, first_step_vol, total_vol, vol_limit, materials, thermal, preferred, busy=None):
+        # (row positions, agitator preferred) for every feasible reactor
+        pos = self.volume_candidates(first_step_vol, total_vol, vol_limit)
+        if busy:
+            pos = pos[~self.busy_mask(pos, busy)]
+        pos = pos[(self.material_bits[pos] & self.mask_for(materials, self.material_vocab)) != 0]
+        pos = pos[(self.thermal_bits[pos] & self.mask_for(thermal, self.thermal_vocab)) != 0]
+
+        preferred_mask = self.mask_for(preferred, self.agitator_vocab)
+        is_preferred = (self.agitator_bits[pos] & preferred_mask) != 0
+        # Keywords added to the rule table after this index was built are matched on the candidates only
+        agitator = None
+        for p in preferred:
+            if p not in self.agitator_vocab:
+                if agitator is None:
+                    agitator = self.df["agitator"].iloc[pos].astype(str)
+                is_preferred |= agitator.str.contains(p, regex=False).to_numpy(dtype=bool)
+        return pos, is_preferred
+
+    def frame(self, pos, is_preferred, **columns):
+        return self.df.iloc[pos].assign(**{"Preference Match": np.where(is_preferred, "yes", "warning")}, **columns)
+
+    def match(self, first_step_vol, total_vol, vol_limit, materials, thermal, preferred, busy=None):
+        return self.frame(*self.match_positions(first_step_vol, total_vol, vol_limit, materials, thermal, preferred, busy))
+
+
+def _align(previous, ids, hashes):
+    # (row in previous or -1, content unchanged) for each row keyed by reactor
+    # id, or None when the previous version repeats an id
+    if previous.row_hashes is None or not previous.id_index.is_unique:
+        return None
+    positions = previous.id_index.get_indexer(ids)
+    known = positions >= 0
+    same = np.zeros(len(ids), dtype=bool)
+    same[known] = previous.row_hashes[positions[known]] == hashes[known]
+    return positions, same
+
+
+@timed(rows=lambda index: len(index.df))
+def build_reactor_index(table, previous=None):
+    # ReactorIndex for a table from read_reactor_table. With the index of an
+    # earlier version of the database, only rows added or changed since are
+    # normalized and patched in (see ReactorIndex.patched).
+    hashes = reactor_row_hashes(table)
+    ids = pd.Index(table["reactor id"].astype(str))
+    aligned = None if previous is None else _align(previous, ids, hashes)
+    if aligned is None:
+        index = ReactorIndex(normalize_reactors(table))
+    elif aligned[1].all() and np.array_equal(aligned[0], np.arange(len(previous.df))):
+        return previous
+    else:
+        index = previous.patched(table, *aligned)
+    index.row_hashes, index.id_index = hashes, ids
+    return index
+
+
+def load_reactor_index(source, previous=None):
+    return build_reactor_index(read_reactor_table(source), previous)
+
+
+def reactor_changes(previous, index):
+    # {"added", "removed", "modified": reactor ids} between two indexes from
+    # build_reactor_index, or None if they cannot be matched up by id
+    aligned = _align(previous, index.id_index, index.row_hashes) if index.row_hashes is not None else None
+    if aligned is None:
+        return None
+    positions, same = aligned
+    ids = index.id_index
+    return {
+        "added": ids[positions < 0].tolist(),
+        "removed": previous.id_index[~previous.id_index.isin(ids)].tolist(),
+        "modified": ids[(positions >= 0) & ~same].tolist(),
+    }
+
+
+def allowed_materials(equipment, user_input, rules=None):
+    allowed = (rules or get_rules()).allowed_materials(equipment, user_input)
+    if allowed is None:
+        raise SelectionError("Corrosion rate too high for this material.")
+    return allowed
+
+
+def reactor_volume_limit(process_type, rules=None):
+    return (rules or get_rules()).volume_limit("reactor", process_type)
+
+
+def _reactor_query(df, user_input, rules):
+    index = df if isinstance(df, ReactorIndex) else ReactorIndex(df, rules.agitator_keywords)
+    vol_limit = rules.volume_limit("reactor", user_input["process_type"])
+    allowed = allowed_materials("reactor", user_input, rules)
+    thermal = rules.thermal_utilities(user_input["temperature"])
+    preferred = rules.preferred_agitators(user_input["reaction_nature"], user_input["reaction_subtype"])
+    return index, vol_limit, allowed, thermal, preferred
+
+
+@timed(rows=len)
+def filter_reactors(df, user_input, first_step_vol, total_vol, rules=None, busy=None):
+    # busy: reactor ids to leave out, e.g. OccupancyCalendar.busy_ids() for the batch's window
+    index, vol_limit, allowed, thermal, preferred = _reactor_query(df, user_input, rules or get_rules())
+    return index.match(first_step_vol, total_vol, vol_limit, allowed, thermal, preferred, busy)
+
+
+def top_k(scores, k):
+    # Positions of the k highest scores, best first, ties in row order.
+    # Partial selection finds the cut-off; only the k winners are sorted.
+    scores = np.nan_to_num(np.asarray(scores, dtype=float), nan=-np.inf)
+    n = len(scores)
+    if k is None or k >= n:
+        return np.argsort(-scores, kind="stable")
+    if k <= 0:
+        return np.array([], dtype=np.intp)
+    cutoff = np.partition(scores, n - k)[n - k]
+    above = np.flatnonzero(scores > cutoff)
+    tied = np.flatnonzero(scores == cutoff)[:k - len(above)]
+    pick = np.concatenate([above, tied])
+    return pick[np.argsort(-scores[pick], kind="stable")]
+
+
+def fill_fractions(volume, capacity, limit):
+    # Share of each vessel's usable capacity (capacity x fill limit) the volume takes up
+    usable = np.asarray(capacity, dtype=float) * limit
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fill = np.where(usable > 0, volume / usable, 0.0)
+    return np.clip(fill, 0.0, 1.0)
+
+
+def _cake_height_scores(height, band):
+    # 1 inside the preferred band, falling off in proportion outside it
+    low, high = band
+    with np.errstate(divide="ignore", invalid="ignore"):
+        below = np.where(low > 0, height / low, 1.0)
+        above = np.where(height > 0, high / height, 0.0)
+    return np.clip(np.minimum(below, above), 0.0, 1.0)
+
+
+def ranking_scores(fill, preferred=None, cake_height=None, rules=None):
+    # Tighter fills rank higher; agitator preference and cake height add to it
+    rules = rules or get_rules()
+    weights = rules.ranking_weights
+    score = weights["fill"] * np.asarray(fill, dtype=float)
+    if preferred is not None:
+        score = score + weights["agitator"] * np.asarray(preferred, dtype=float)
+    if cake_height is not None:
+        score = score + weights["cake_height"] * _cake_height_scores(np.asarray(cake_height, dtype=float), rules.cake_height_band)
+    return score
+
+
+def _score_columns(fill, scores):
+    return {"Fill (%)": np.round(fill * 100, 1), "Score": np.round(scores, 3)}
+
+
+@timed(rows=len)
+def rank_reactors(df, user_input, first_step_vol, total_vol, k=DEFAULT_TOP_K, rules=None, busy=None):
+    # The k best feasible reactors; only the winners are materialised as rows
+    rules = rules or get_rules()
+    index, vol_limit, allowed, thermal, preferred = _reactor_query(df, user_input, rules)
+    pos, is_preferred = index.match_positions(first_step_vol, total_vol, vol_limit, allowed, thermal, preferred, busy)
+    fill = fill_fractions(total_vol, index.max_volume[pos], vol_limit)
+    scores = ranking_scores(fill, is_preferred, rules=rules)
+    order = top_k(scores, k)
+    return index.frame(pos[order], is_preferred[order], **_score_columns(fill[order], scores[order]))
+
+
+def filter_volume_litres(mass, bulk_density):
+    return mass / bulk_density * 1000 if bulk_density > 0 else 0
+
+
+def filter_types_for(filter_property, val, unit=None, rules=None):
+    return (rules or get_rules()).filter_types_for(filter_property, val, unit)
+
+
+def _drop_busy(df, busy):
+    col = equipment_id_column(df)
+    if not busy or col is None:
+        return df
+    return df[~df[col].astype(str).isin([str(b) for b in busy])]
+
+
+@timed(rows=len)
+def filter_filters(df, user_input, filter_types_required, rules=None, busy=None):
+    rules = rules or get_rules()
+    allowed = allowed_materials("filter", user_input, rules)
+    df = _drop_busy(df, busy)
+    df = df[_per_value(df["moc"], lambda v: v.isin(allowed))]
+
+    volume_litres = filter_volume_litres(user_input["mass"], user_input["bulk_density"])
+
+    if "cake capacity" not in df.columns:
+        raise SelectionError("'cake capacity' column not found in the uploaded Excel.")
+
+    df = df[_capacity_fits(df["cake capacity"], rules.volume_limit("filter"), volume_litres)]
+
+    if "filter type" not in df.columns:
+        raise SelectionError("'filter type' column not found in the uploaded Excel.")
+
+    df = df[_per_value(df["filter type"], lambda v: v.apply(lambda x: any(f in x for f in filter_types_required)))]
+    return df.assign(**{"filter type": df["filter type"].astype(str).str.upper()})
+
+
+def _capacity_fits(capacity, limit, volume):
+    return capacity * limit >= volume
+
+
+@timed(rows=len)
+def filter_dryers(df, user_input, rules=None, busy=None):
+    rules = rules or get_rules()
+    allowed = allowed_materials("dryer", user_input, rules)
+    df = _drop_busy(df, busy)
+
+    # Filter by MOC
+    df = df[_per_value(df["moc"], lambda v: v.isin(allowed))]
+
+    if "capacity" not in df.columns:
+        raise SelectionError("'capacity' column not found in the uploaded Excel.")
+
+    # Capacity should be >= required volume (with the rule table's fill margin)
+    return df[_capacity_fits(df["capacity"], rules.volume_limit("dryer"), user_input["volume"])]
+
+
+def cake_heights(df, volume_litres):
+    area = df["area"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(area > 0, np.round(volume_litres * 0.1 / area, 2), 0.0)
+
+
+def add_cake_height(df, volume_litres):
+    if "area" not in df.columns:
+        return df
+    return df.assign(**{"Cake Height (cm)": cake_heights(df, volume_litres)})
+
+
+def _rank_vessels(matched, volume_litres, capacity_col, limit, k, rules):
+    fill = fill_fractions(volume_litres, matched[capacity_col].to_numpy(dtype=float), limit)
+    height = cake_heights(matched, volume_litres) if "area" in matched.columns else None
+    scores = ranking_scores(fill, cake_height=height, rules=rules)
+    order = top_k(scores, k)
+    return add_cake_height(matched.iloc[order], volume_litres).assign(**_score_columns(fill[order], scores[order]))
+
+
+@timed(rows=len)
+def rank_filters(df, user_input, filter_types_required, k=DEFAULT_TOP_K, rules=None, busy=None):
+    rules = rules or get_rules()
+    matched = filter_filters(df, user_input, filter_types_required, rules, busy)
+    volume_litres = filter_volume_litres(user_input["mass"], user_input["bulk_density"])
+    return _rank_vessels(matched, volume_litres, "cake capacity", rules.volume_limit("filter"), k, rules)
+
+
+@timed(rows=len)
+def rank_dryers(df, user_input, k=DEFAULT_TOP_K, rules=None, busy=None):
+    rules = rules or get_rules()
+    matched = filter_dryers(df, user_input, rules, busy)
+    return _rank_vessels(matched, user_input["volume"], "capacity", rules.volume_limit("dryer"), k, rules)
+
+
+def equipment_id_column(df):
+    return next((col for col in df.columns if col.strip().lower() in ["equipment id", "filter id", "id"]), None)
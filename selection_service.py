@@ -0,0 +1,275 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+
+import numpy as np
+
+import batch_select
+import instrumentation
+from instrumentation import span
+from selection_engine import SelectionError
+
+MAX_BODY_BYTES = 1 << 20
+
+# Per-process equipment databases, loaded once by _init_worker
+_databases = {}
+
+
+def _init_worker(reactors, filters, dryers):
+    _databases.update(batch_select.load_databases(reactors, filters, dryers))
+
+
+def _select_many(specs):
+    # Runs in a worker: one task per batch keeps pickling overhead per request small
+    results = []
+    for spec in specs:
+        try:
+            matches = batch_select.select_for_spec(spec, _databases)
+        except (SelectionError, ValueError, KeyError, TypeError) as e:
+            # A malformed spec fails alone, not the whole batch
+            results.append({"status": "error", "message": str(e)})
+            continue
+        results.append({"status": "matched" if matches else "no match", "matches": matches})
+    return results
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _query_key(spec):
+    # Identical queries differ at most in their id
+    return json.dumps({k: v for k, v in spec.items() if k != "id"}, sort_keys=True, default=_json_default)
+
+
+class SelectionService:
+    """Asynchronous front end to batch_select.select_for_spec.
+
+    Identical queries in flight share one evaluation. Distinct queries are
+    gathered into batches: a batch is sent to the worker pool as soon as a
+    worker slot is free, so batches grow under load instead of queueing.
+    """
+
+    def __init__(self, reactors=None, filters=None, dryers=None, workers=None, max_batch=64):
+        self.sources = {"reactors": reactors, "filters": filters, "dryers": dryers}
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_batch = max_batch
+        self.max_running = max(1, self.workers) * 2
+        self.pool = None
+        self.restarting = None
+        self.running = 0
+        self.pending = []
+        self.inflight = {}
+        self.stats = {"requests": 0, "coalesced": 0, "batches": 0, "restarts": 0}
+
+    def start_pool(self, mp_context=None):
+        initargs = (self.sources["reactors"], self.sources["filters"], self.sources["dryers"])
+        if self.workers == 0:
+            # In-process: one thread keeps the event loop free without extra copies of the data
+            self.pool = ThreadPoolExecutor(max_workers=1, initializer=_init_worker, initargs=initargs)
+        else:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=mp_context, initializer=_init_worker, initargs=initargs)
+        # Start the workers, and so load their databases, before taking requests
+        slots = max(1, self.workers)
+        list(self.pool.map(_select_many, [[]] * slots))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    async def select(self, spec):
+        self.stats["requests"] += 1
+        key = _query_key(spec)
+        future = self.inflight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self.inflight[key] = future
+            future.add_done_callback(lambda _: self.inflight.pop(key, None))
+            self.pending.append((spec, future))
+            self._flush()
+        else:
+            self.stats["coalesced"] += 1
+        # Shielded so one client going away does not cancel the others' answer
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        loop = asyncio.get_running_loop()
+        if self.pool is None:
+            # Workers are (re)starting; _restart flushes once they are up
+            if self.pending and self.restarting is None:
+                self.restarting = loop.create_task(self._restart())
+            return
+        while self.pending and self.running < self.max_running:
+            batch = self.pending[:self.max_batch]
+            try:
+                task = loop.run_in_executor(self.pool, _select_many, [spec for spec, _ in batch])
+            except BrokenExecutor:
+                self._discard_pool(self.pool)
+                return self._flush()
+            self.pending = self.pending[self.max_batch:]
+            self.running += 1
+            self.stats["batches"] += 1
+            task.add_done_callback(partial(self._deliver, batch, self.pool))
+
+    def _discard_pool(self, pool):
+        # A worker that died (e.g. killed for memory) breaks the whole pool;
+        # a new one is started for the requests still to come
+        if pool is self.pool:
+            self.pool = None
+            self.stats["restarts"] += 1
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def _restart(self):
+        try:
+            # Spawned, not forked: forked workers would inherit the open client
+            # sockets and keep those connections from closing
+            spawn = multiprocessing.get_context("spawn")
+            await asyncio.get_running_loop().run_in_executor(None, self.start_pool, spawn)
+        except Exception as e:
+            pending, self.pending = self.pending, []
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.restarting = None
+        self._flush()
+
+    def _deliver(self, batch, pool, task):
+        self.running -= 1
+        try:
+            results = task.result()
+        except Exception as e:
+            if isinstance(e, BrokenExecutor):
+                self._discard_pool(pool)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        self._flush()
+
+    async def handle_select(self, body):
+        payload = json.loads(body or b"{}")
+        specs = payload if isinstance(payload, list) else [payload]
+        if not all(isinstance(s, dict) for s in specs):
+            raise ValueError("Expected a spec object or a list of spec objects.")
+        with span("service.select", rows=len(specs), bytes=len(body)):
+            results = await asyncio.gather(*(self.select(s) for s in specs))
+        results = [{"id": s.get("id"), **r} for s, r in zip(specs, results)]
+        return results if isinstance(payload, list) else results[0]
+
+    async def route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            loaded = [k for k, v in self.sources.items() if v]
+            return HTTPStatus.OK, {"status": "ok", "databases": loaded, "workers": self.workers, **self.stats}
+        if method == "GET" and path == "/metrics":
+            return HTTPStatus.OK, instrumentation.metrics_text()
+        if method == "POST" and path == "/select":
+            return HTTPStatus.OK, await self.handle_select(body)
+        return HTTPStatus.NOT_FOUND, {"error": f"No route for {method} {path}"}
+
+    async def handle_connection(self, reader, writer):
+        # HTTP/1.1 with keep-alive; one request at a time per connection
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Request body too large."}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                try:
+                    status, payload = await self.route(method, target.split("?", 1)[0], body)
+                except (ValueError, KeyError, TypeError) as e:
+                    status, payload = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+                except Exception as e:
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def respond(writer, status, payload, keep_alive):
+        if isinstance(payload, str):
+            data, content_type = payload.encode(), "text/plain; version=0.0.4"
+        else:
+            data, content_type = json.dumps(payload, default=_json_default).encode(), "application/json"
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + data)
+        await writer.drain()
+
+
+async def serve(service, host="127.0.0.1", port=8765, ready=None):
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, service.start_pool)
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    try:
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[:2])
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve reactor, filter and dryer selection as HTTP/JSON.")
+    parser.add_argument("--reactors", help="Reactor database (.xlsx, .csv or .parquet)")
+    parser.add_argument("--filters", help="Filter database (.xlsx, .csv or .parquet)")
+    parser.add_argument("--dryers", help="Dryer database (.xlsx, .csv or .parquet)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Worker processes (default: CPU count; 0 runs matching in a thread)")
+    args = parser.parse_args(argv)
+
+    if not (args.reactors or args.filters or args.dryers):
+        parser.error("supply at least one of --reactors, --filters or --dryers")
+
+    service = SelectionService(args.reactors, args.filters, args.dryers, args.workers)
+    start = time.perf_counter()
+
+    def announce(address):
+        print(f"Serving on http://{address[0]}:{address[1]} (ready in {time.perf_counter() - start:.2f}s)", file=sys.stderr)
+
+    try:
+        asyncio.run(serve(service, args.host, args.port, announce))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
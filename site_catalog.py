@@ -0,0 +1,249 @@
+import argparse
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+
+import batch_select
+import selection_engine as engine
+from instrumentation import span
+from selection_engine import SelectionError, REACTOR_OPERATIONS, content_hash, read_upload_bytes
+
+DATABASE_KINDS = ["reactors", "filters", "dryers"]
+
+
+def _unit_op_kind(unit_op_type):
+    if unit_op_type in REACTOR_OPERATIONS:
+        return "reactors"
+    return {"filtration": "filters", "drying": "dryers"}.get(unit_op_type)
+
+
+def _source_stat(source):
+    # Cheap change check for files; other sources are compared by content hash
+    if isinstance(source, (str, os.PathLike)):
+        st = os.stat(source)
+        return st.st_mtime_ns, st.st_size
+    return None
+
+
+def _build_shard(kind, data, previous=None):
+    # A changed reactor database is patched from the shard's previous index
+    if kind == "reactors":
+        return engine.load_reactor_index(data, previous)
+    if kind == "filters":
+        return engine.load_filter_data(data)
+    return engine.load_dryer_data(data)
+
+
+class Shard:
+    def __init__(self, site, kind, source):
+        self.site = site
+        self.kind = kind
+        self.source = source
+        self.stat = None
+        self.digest = None
+        self.data = None
+        self.dirty = True
+
+    def previous_index(self):
+        return self.data if self.kind == "reactors" else None
+
+
+class SiteCatalog:
+    """Equipment databases of several sites, each kept as its own indexed shard.
+
+    Queries run on every site's shard in parallel and come back as one frame
+    with a leading "site" column, sites in registration order. refresh()
+    re-indexes only the shards whose source changed. One catalog can be
+    shared between threads (the app keeps one for all sessions).
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.shards = {}
+        self.stats = {"reindexed": 0, "queries": 0}
+        self._pool = None
+        self._lock = threading.RLock()
+
+    def register(self, site, reactors=None, filters=None, dryers=None):
+        with self._lock:
+            for kind, source in zip(DATABASE_KINDS, (reactors, filters, dryers)):
+                if source is None:
+                    continue
+                shard = self.shards.get((site, kind))
+                if shard is None:
+                    self.shards[(site, kind)] = Shard(site, kind, source)
+                elif source is not shard.source:
+                    shard.source = source
+                    shard.dirty = True
+
+    def remove(self, site, kind=None):
+        with self._lock:
+            for key in [k for k in self.shards if k[0] == site and kind in (None, k[1])]:
+                del self.shards[key]
+
+    def sites(self, kind=None):
+        with self._lock:
+            return list(dict.fromkeys(s.site for s in self.shards.values() if kind is None or s.kind == kind))
+
+    def refresh(self):
+        # Returns the (site, kind) of every shard that was re-indexed
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self):
+        stale = []
+        for shard in self.shards.values():
+            stat = _source_stat(shard.source)
+            if shard.data is not None and not shard.dirty and (stat is None or stat == shard.stat):
+                continue
+            data = read_upload_bytes(shard.source)
+            digest = content_hash(data)
+            if shard.data is not None and digest == shard.digest:
+                # Touched or re-uploaded, but the same content
+                shard.stat, shard.dirty = stat, False
+            else:
+                stale.append((shard, stat, digest, data))
+        if not stale:
+            return []
+
+        with span("catalog.reindex", rows=len(stale), bytes=sum(len(item[3]) for item in stale)):
+            if self.workers > 1 and len(stale) > 1:
+                with ProcessPoolExecutor(max_workers=min(self.workers, len(stale))) as pool:
+                    futures = [pool.submit(_build_shard, shard.kind, data, shard.previous_index()) for shard, _, _, data in stale]
+            else:
+                futures = None
+            for i, (shard, stat, digest, data) in enumerate(stale):
+                try:
+                    built = futures[i].result() if futures else _build_shard(shard.kind, data, shard.previous_index())
+                except SelectionError as e:
+                    raise SelectionError(f"{shard.site} {shard.kind}: {e}") from None
+                shard.data, shard.digest, shard.stat, shard.dirty = built, digest, stat, False
+                self.stats["reindexed"] += 1
+        return [(item[0].site, item[0].kind) for item in stale]
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _query(self, kind, query):
+        # query(shard data) on every site holding this kind, merged site-tagged
+        with self._lock:
+            self._refresh()
+            # Indexed data is replaced, never changed in place, so the queries
+            # can run on this snapshot while other threads register or refresh
+            shards = [(s.site, s.data) for s in self.shards.values() if s.kind == kind]
+            if not shards:
+                raise SelectionError(f"No {kind[:-1]} database registered for any site.")
+            self.stats["queries"] += 1
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="catalog")
+            pool = self._pool
+        with span(f"catalog.{kind}", sites=len(shards)) as s:
+            # Each task runs in a copy of this context so its spans join the current run
+            futures = [pool.submit(contextvars.copy_context().run, query, data) for _, data in shards]
+            frames = []
+            for (site, _), future in zip(shards, futures):
+                frame = future.result()
+                frame.insert(0, "site", site)
+                frames.append(frame)
+            merged = pd.concat(frames, ignore_index=True)
+            s.set(rows=len(merged))
+        return merged
+
+    @staticmethod
+    def _best(merged, k):
+        # Per-site winners re-ranked together; ties keep site order
+        return merged.iloc[engine.top_k(merged["Score"].to_numpy(), k)].reset_index(drop=True)
+
+    def filter_reactors(self, user_input, first_step_vol, total_vol):
+        return self._query("reactors", lambda index: engine.filter_reactors(index, user_input, first_step_vol, total_vol))
+
+    def filter_filters(self, user_input, filter_types_required):
+        return self._query("filters", lambda df: engine.filter_filters(df, user_input, filter_types_required))
+
+    def filter_dryers(self, user_input):
+        return self._query("dryers", lambda df: engine.filter_dryers(df, user_input))
+
+    def rank_reactors(self, user_input, first_step_vol, total_vol, k=engine.DEFAULT_TOP_K):
+        return self._best(self._query("reactors", lambda index: engine.rank_reactors(index, user_input, first_step_vol, total_vol, k=k)), k)
+
+    def rank_filters(self, user_input, filter_types_required, k=engine.DEFAULT_TOP_K):
+        return self._best(self._query("filters", lambda df: engine.rank_filters(df, user_input, filter_types_required, k=k)), k)
+
+    def rank_dryers(self, user_input, k=engine.DEFAULT_TOP_K):
+        return self._best(self._query("dryers", lambda df: engine.rank_dryers(df, user_input, k=k)), k)
+
+    def match_spec(self, spec):
+        # batch_select.match_spec on every site with the spec's equipment type
+        kind = _unit_op_kind(spec.get("unit_op_type", "reaction"))
+        if kind is None:
+            raise SelectionError(f"Unknown unit operation type '{spec.get('unit_op_type')}'.")
+        return self._query(kind, lambda data: batch_select.match_spec(spec, {kind: data}))
+
+
+def load_sites(path):
+    # {"site": {"reactors": path, "filters": path, "dryers": path}}, paths relative to the file
+    with open(path) as f:
+        sites = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    return {site: {kind: os.path.join(base, p) for kind, p in kinds.items()} for site, kinds in sites.items()}
+
+
+def run_catalog(catalog, specs):
+    rows = []
+    for spec in specs:
+        base = {"spec id": spec["id"], "unit_op_type": spec.get("unit_op_type", "reaction")}
+        try:
+            matched = catalog.match_spec(spec).drop(columns="fill fraction")
+        except (SelectionError, ValueError, KeyError, TypeError) as e:
+            # A malformed spec fails alone, as in batch_select
+            rows.append({**base, "status": "error", "message": str(e)})
+            continue
+        if matched.empty:
+            rows.append({**base, "status": "no match"})
+            continue
+        rows.extend({**base, "status": "matched", **m} for m in matched.to_dict(orient="records"))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Screen unit-operation specs against the equipment of several sites.")
+    parser.add_argument("sites", help='JSON file: {"site": {"reactors": path, "filters": path, "dryers": path}}')
+    parser.add_argument("specs", help="CSV or JSON file of unit-operation specs")
+    parser.add_argument("-o", "--output", required=True, help="Output file (.csv or .json)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Parallel shards (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    catalog = SiteCatalog(args.workers)
+    for site, kinds in load_sites(args.sites).items():
+        unknown = set(kinds) - set(DATABASE_KINDS)
+        if unknown:
+            parser.error(f"site '{site}': unknown database type(s) {', '.join(sorted(unknown))}")
+        catalog.register(site, **kinds)
+
+    start = time.perf_counter()
+    try:
+        catalog.refresh()
+    except SelectionError as e:
+        print(e, file=sys.stderr)
+        return 1
+    indexed = time.perf_counter() - start
+    specs = batch_select.load_specs(args.specs)
+    rows = run_catalog(catalog, specs)
+    catalog.close()
+    batch_select.write_results(rows, args.output)
+    print(f"Indexed {len(catalog.shards)} shards from {len(catalog.sites())} sites in {indexed:.2f}s; "
+          f"screened {len(specs)} unit operations in {time.perf_counter() - start - indexed:.2f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+import argparse
+import io
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import selection_engine as engine
+from instrumentation import span
+from rules import get_rules
+from selection_engine import SelectionError
+
+# One Excel column per condition next to the vessel id column
+MAX_CONDITIONS = 16_383
+# The vessel x condition matrix is one byte per cell
+MAX_CELLS = 50_000_000
+# Larger matrices are left to the CSV export; xlsxwriter manages ~250k cells/s
+MAX_EXCEL_CELLS = 1_000_000
+
+
+def _csv_quote(value):
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class SweepResult:
+    """Reactor feasibility over a pH x temperature x total-volume grid.
+
+    feasible[r, p, t, v] is True when reactor r passes the filter_reactors
+    criteria at ph_conditions[p], temperatures[t] and volumes[v].
+    """
+
+    def __init__(self, reactor_ids, ph_conditions, temperatures, volumes, feasible):
+        self.reactor_ids = reactor_ids
+        self.ph_conditions = ph_conditions
+        self.temperatures = temperatures
+        self.volumes = volumes
+        self.feasible = feasible
+
+    def matrix(self):
+        # Vessel x condition, conditions in conditions() order
+        return self.feasible.reshape(len(self.reactor_ids), -1)
+
+    def conditions(self):
+        p, t, v = np.meshgrid(np.arange(len(self.ph_conditions)), self.temperatures, self.volumes, indexing="ij")
+        return pd.DataFrame({
+            "pH": np.asarray(self.ph_conditions, dtype=object)[p.ravel()],
+            "temperature (°C)": t.ravel(),
+            "total volume (L)": v.ravel(),
+        })
+
+    def counts(self):
+        return self.conditions().assign(**{"feasible reactors": self.feasible.sum(axis=0).ravel()})
+
+    def vessel_summary(self):
+        matrix = self.matrix()
+        share = matrix.mean(axis=1) if matrix.shape[1] else np.zeros(len(self.reactor_ids))
+        summary = pd.DataFrame({
+            "reactor id": self.reactor_ids,
+            "feasible conditions": matrix.sum(axis=1),
+            "feasible (%)": np.round(share * 100, 1),
+        })
+        return summary.sort_values("feasible conditions", ascending=False, kind="stable")
+
+    def condition_labels(self):
+        return [f"{ph} / {t:g} °C / {v:g} L" for ph, t, v in self.conditions().itertuples(index=False)]
+
+    def to_csv(self):
+        # Vessel x condition matrix of 0/1 cells, rendered as bytes in one
+        # vectorised pass instead of cell by cell
+        matrix = self.matrix()
+        cells = np.full((matrix.shape[0], 2 * matrix.shape[1]), ord(","), dtype=np.uint8)
+        cells[:, 0::2] = matrix + ord("0")
+        cells[:, -1] = ord("\n")
+        header = ",".join(_csv_quote(v) for v in ["reactor id"] + self.condition_labels()) + "\n"
+        lines = [header.encode()]
+        for reactor_id, row in zip(self.reactor_ids, cells):
+            lines.append(f"{_csv_quote(reactor_id)},".encode() + row.tobytes())
+        return b"".join(lines)
+
+    def to_excel(self):
+        import xlsxwriter
+        output = io.BytesIO()
+        workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+        bold = workbook.add_format({"bold": True})
+
+        for name, frame in [("Counts", self.counts()), ("Vessels", self.vessel_summary())]:
+            sheet = workbook.add_worksheet(name)
+            sheet.write_row(0, 0, list(frame.columns), bold)
+            for r, row in enumerate(frame.itertuples(index=False), start=1):
+                sheet.write_row(r, 0, row)
+
+        sheet = workbook.add_worksheet("Feasibility")
+        matrix = self.matrix()
+        if matrix.size > MAX_EXCEL_CELLS:
+            sheet.write(0, 0, f"{matrix.size:,} cells: download the CSV export for the full vessel x condition matrix.")
+        else:
+            sheet.write_row(0, 0, ["reactor id"] + self.condition_labels(), bold)
+            sheet.freeze_panes(1, 1)
+            for r, (reactor_id, row) in enumerate(zip(self.reactor_ids, matrix.astype(np.uint8)), start=1):
+                sheet.write(r, 0, reactor_id)
+                sheet.write_row(r, 1, row.tolist())
+        workbook.close()
+        return output.getvalue()
+
+
+def sweep_reactors(index, process_type, first_step_vol, temperatures, volumes, ph_conditions=None, rules=None):
+    # The filter_reactors criteria for every grid point at once: each criterion
+    # is evaluated along its own axis and the three are combined by broadcasting.
+    # Without a first step volume the whole total volume is one charge.
+    rules = rules or get_rules()
+    if not isinstance(index, engine.ReactorIndex):
+        index = engine.ReactorIndex(index, rules.agitator_keywords)
+    ph_conditions = list(ph_conditions or rules.moc["reactor"])
+    temperatures = np.asarray(temperatures, dtype=float)
+    volumes = np.asarray(volumes, dtype=float)
+    n_conditions = len(ph_conditions) * len(temperatures) * len(volumes)
+    if n_conditions > MAX_CONDITIONS:
+        raise SelectionError(f"{n_conditions:,} conditions requested; use at most {MAX_CONDITIONS:,} grid points.")
+    if n_conditions * len(index.df) > MAX_CELLS:
+        raise SelectionError("Sweep too large for this fleet; use fewer grid points.")
+
+    with span("sweep_reactors", rows=len(index.df), conditions=n_conditions):
+        vol_limit = rules.volume_limit("reactor", process_type)
+        first = volumes[None, :] if first_step_vol is None else float(first_step_vol)
+        material_masks = np.array([
+            index.mask_for(rules.moc["reactor"].get(ph, ()), index.material_vocab) for ph in ph_conditions
+        ], dtype=np.uint64)
+        thermal_masks = np.array([
+            index.mask_for(rules.thermal_utilities(t), index.thermal_vocab) for t in temperatures
+        ], dtype=np.uint64)
+
+        materials = (index.material_bits[:, None] & material_masks[None, :]) != 0
+        thermal = (index.thermal_bits[:, None] & thermal_masks[None, :]) != 0
+        volume = (
+            ((index.max_volume * vol_limit)[:, None] >= volumes[None, :])
+            & (index.min_sensing[:, None] <= first)
+            & (index.min_stirring[:, None] <= first)
+        )
+        feasible = materials[:, :, None, None] & thermal[:, None, :, None] & volume[:, None, None, :]
+    return SweepResult(index.df["reactor id"].astype(str).to_numpy(), ph_conditions, temperatures, volumes, feasible)
+
+
+def heatmap_spec(counts):
+    # Vega-Lite heatmap of feasible reactor counts, one panel per pH class
+    return {
+        "data": {"values": counts.rename(columns={
+            "temperature (°C)": "temperature", "total volume (L)": "volume", "feasible reactors": "reactors",
+        }).to_dict(orient="records")},
+        "mark": "rect",
+        "encoding": {
+            "column": {"field": "pH", "type": "nominal"},
+            "x": {"field": "volume", "type": "ordinal", "title": "Total volume (L)", "axis": {"labelOverlap": True}},
+            "y": {"field": "temperature", "type": "ordinal", "title": "Temperature (°C)", "sort": "descending", "axis": {"labelOverlap": True}},
+            "color": {"field": "reactors", "type": "quantitative", "title": "Feasible reactors"},
+            "tooltip": [{"field": f} for f in ["pH", "temperature", "volume", "reactors"]],
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Feasible reactors across a temperature x total-volume x pH grid.")
+    parser.add_argument("reactors", help="Reactor database (.xlsx, .csv or .parquet)")
+    parser.add_argument("-o", "--output", required=True, help="Output .xlsx (counts, vessel summary and matrix) or .csv (full matrix)")
+    parser.add_argument("--process-type", default="reaction")
+    parser.add_argument("--first-step-volume", type=float, help="First step volume (L); default: the total volume in one charge")
+    parser.add_argument("--temperature", type=float, nargs=3, default=[0, 150, 31], metavar=("START", "STOP", "POINTS"))
+    parser.add_argument("--volume", type=float, nargs=3, default=[100, 10000, 50], metavar=("START", "STOP", "POINTS"))
+    parser.add_argument("--ph", nargs="+", help="pH classes (default: every class in the rule table)")
+    args = parser.parse_args(argv)
+
+    index = engine.ReactorIndex(engine.load_reactor_data(args.reactors))
+    start = time.perf_counter()
+    try:
+        result = sweep_reactors(
+            index, args.process_type, args.first_step_volume,
+            np.linspace(args.temperature[0], args.temperature[1], int(args.temperature[2])),
+            np.linspace(args.volume[0], args.volume[1], int(args.volume[2])),
+            args.ph,
+        )
+    except SelectionError as e:
+        print(e, file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+    with open(args.output, "wb") as f:
+        f.write(result.to_csv() if args.output.lower().endswith(".csv") else result.to_excel())
+    print(f"{result.matrix().shape[1]:,} conditions x {len(result.reactor_ids):,} reactors in {elapsed:.3f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
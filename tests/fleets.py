@@ -0,0 +1,109 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+MOCS = ["GLR", "SSR", "HAR", "SSR/HAR", "GLR/SSR", "All glass", "HAST"]
+UTILITIES = ["CT", "HW", "CHB", "LPS", "HOT OIL", "EJECTION CONDENSATE", "BRINE"]
+VESSEL_MOCS = ["SSR", "HAR", "HALAR"]
+AGITATORS = ["Anchor", "PBT", "RCI", "Propellor", "CBRT", "Ruston", "Disc", "PBT + Anchor", "Paddle"]
+PH_MATERIALS = {"basic": ["SSR", "HAR"], "acidic": ["GLR", "HAR"], "neutral": ["GLR", "SSR", "HAR"]}
+PREFERRED = {"homogeneous": ["PROPELLOR", "PBT", "RCI", "ANCHOR", "CBRT"]}
+HETEROGENEOUS = {"biphasic": ["PROPELLOR", "PBT", "CBRT", "RCI"], "solid-liquid": ["PROPELLOR", "PBT", "CBRT", "RCI", "ANCHOR"],
+                 "gas-liquid": ["RUSTON", "DISC"]}
+REACTOR_OPERATIONS = ["reaction", "distillation", "pressurized", "extraction/workup"]
+
+
+def workbook(columns):
+    buffer = io.BytesIO()
+    pd.DataFrame(columns).to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def random_fleet(rows, seed=0):
+    # Reactor database columns as the plant exports them
+    rng = np.random.default_rng(seed)
+    capacity = rng.choice([250.0, 630.0, 1000.0, 1600.0, 2500.0, 4000.0, 6300.0, 10000.0], rows)
+    return {
+        "Vessel ID": [f"R-{i:04d}" for i in range(rows)],
+        "Min Sensing Volume": np.round(capacity * rng.uniform(0.02, 0.15, rows), 1).tolist(),
+        "Min Stirring Volume": np.round(capacity * rng.uniform(0.05, 0.25, rows), 1).tolist(),
+        "Capacity": capacity.tolist(),
+        "MOC": rng.choice(MOCS, rows).tolist(),
+        "Utilities": [", ".join(rng.choice(UTILITIES, rng.integers(1, 4), replace=False)) for _ in range(rows)],
+        "Agitator": rng.choice(AGITATORS, rows).tolist(),
+    }
+
+
+def random_filters(rows, seed=1):
+    rng = np.random.default_rng(seed)
+    return {
+        "Filter ID": [f"F-{i:04d}" for i in range(rows)],
+        "MOC": rng.choice(VESSEL_MOCS + ["GLR"], rows).tolist(),
+        "Cake Capacity": rng.choice([50.0, 100.0, 250.0, 500.0, 1000.0], rows).tolist(),
+        "Filter Type": rng.choice(["Centrifuge", "Nutsche", "ANFD", "RPF", "VNF"], rows).tolist(),
+        "Area": np.round(rng.uniform(0.2, 6.0, rows), 2).tolist(),
+    }
+
+
+def random_dryers(rows, seed=2):
+    rng = np.random.default_rng(seed)
+    return {
+        "Dryer ID": [f"D-{i:04d}" for i in range(rows)],
+        "MOC": rng.choice(VESSEL_MOCS + ["GLR"], rows).tolist(),
+        "Capacity": rng.choice([50.0, 100.0, 250.0, 500.0, 1000.0], rows).tolist(),
+        "Dryer Type": rng.choice(["RCVD", "ANFD", "Tray", "FBD"], rows).tolist(),
+    }
+
+
+def random_queries(rng, count):
+    for _ in range(count):
+        yield {
+            "process_type": str(rng.choice(REACTOR_OPERATIONS)),
+            "ph_condition": str(rng.choice(list(PH_MATERIALS))),
+            "corrosion_rate": 0,
+            "coupon_materials": [""],
+            "temperature": float(rng.choice([5, 10, 15, 20, 25, 35, 60, 90, 120])),
+            "reaction_nature": str(rng.choice(["none", "homogeneous", "heterogeneous"])),
+            "reaction_subtype": str(rng.choice(list(HETEROGENEOUS))),
+        }
+
+
+def reference_reactors(columns):
+    # The matching rules as they were written in the app before the index,
+    # applied row by row
+    df = pd.DataFrame(columns)
+    df.columns = df.columns.str.strip().str.lower()
+    df = df.rename(columns={"vessel id": "reactor id", "min sensing volume": "min sensing", "min stirring volume": "min stirring", "capacity": "max volume"})
+    df["moc"] = df["moc"].str.upper().replace({"ALL GLASS": "GLR"})
+    df["materials"] = df["moc"].apply(lambda x: [m.strip() for m in x.split("/")])
+    df["thermal options"] = df["utilities"].astype(str).apply(lambda x: [t.strip().upper() for t in x.split(",")])
+    df["agitator"] = df["agitator"].astype(str).str.upper()
+    return df
+
+
+def reference_filter_reactors(df, user_input, first_step_vol, total_vol):
+    df = df[(df["min sensing"] <= first_step_vol) & (df["min stirring"] <= first_step_vol)]
+    vol_limit = 0.7 if user_input["process_type"] in ["distillation", "reaction", "pressurized"] else 0.95
+    df = df[df["max volume"] * vol_limit >= total_vol]
+    if user_input["ph_condition"] == "coupon":
+        allowed = [user_input["coupon_materials"][0].strip().upper()]
+    else:
+        allowed = PH_MATERIALS[user_input["ph_condition"]]
+    df = df[np.array([any(m in mats for m in allowed) for mats in df["materials"]], dtype=bool)]
+    temp = user_input["temperature"]
+    if 10 <= temp <= 20:
+        thermal = ["CHB"]
+    elif 20 < temp <= 35:
+        thermal = ["CT"]
+    elif 20 < temp <= 90:
+        thermal = ["HW"]
+    else:
+        thermal = ["LPS", "HOT OIL", "EJECTION CONDENSATE"]
+    df = df[np.array([any(t in opts for t in thermal) for opts in df["thermal options"]], dtype=bool)]
+    preferred = []
+    if user_input["reaction_nature"] == "homogeneous":
+        preferred = PREFERRED["homogeneous"]
+    elif user_input["reaction_nature"] == "heterogeneous":
+        preferred = HETEROGENEOUS.get(user_input["reaction_subtype"], [])
+    return df.assign(**{"Preference Match": ["yes" if any(p in a for p in preferred) else "warning" for a in df["agitator"]]})
@@ -0,0 +1,43 @@
+import io
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def pdf(lines, lines_per_page=48):
+    # Minimal text-only PDF, one Helvetica line per entry
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)]
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page_lines in pages:
+        stream = "BT /F1 10 Tf 14 TL 40 800 Td " + " ".join(f"({_pdf_escape(line)}) '" for line in page_lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for n, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{n} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def procedure_report(steps, lines_per_page=48, title="Familiarization Report"):
+    # A short preamble, a "Procedure" heading and numbered steps, some of
+    # them wrapping onto a continuation line
+    verbs = ["Charge", "Add", "Stir", "Heat", "Cool", "Filter", "Wash", "Dry"]
+    lines = [title, "Product: TEST-001", "", "Procedure"]
+    for i in range(1, steps + 1):
+        lines.append(f"{i % 100}. {verbs[i % len(verbs)]} the batch as per BMR section {i % 37 + 1} and record observations.")
+        if i % 3 == 0:
+            lines.append("   Note: maintain temperature between 20 and 30 C throughout.")
+    return pdf(lines, lines_per_page)
@@ -0,0 +1,21 @@
+import batch_select
+from fleets import random_filters, random_fleet, workbook
+
+
+def test_a_malformed_spec_fails_alone(tmp_path):
+    reactors, filters = tmp_path / "reactors.xlsx", tmp_path / "filters.xlsx"
+    reactors.write_bytes(workbook(random_fleet(200, seed=1)))
+    filters.write_bytes(workbook(random_filters(100)))
+    specs = [
+        {"id": 1, "unit_op_type": "reaction", "ph_condition": "neutral", "temperature": 60, "step_volumes": "100;300"},
+        {"id": 2, "unit_op_type": "filtration", "filter_property": "settling rate", "filter_property_value": "abc", "mass": 10, "bulk_density": 500},
+        {"id": 3, "unit_op_type": "reaction", "step_volumes": "100;x"},
+        {"id": 4, "unit_op_type": "filtration", "ph_condition": "basic", "filter_property": "settling rate", "filter_property_value": 8, "mass": 10, "bulk_density": 500},
+    ]
+    for workers in (1, 2):
+        rows = batch_select.run_batch(specs, str(reactors), str(filters), workers=workers)
+        status = {}
+        for row in rows:
+            status.setdefault(row["spec id"], set()).add(row["status"])
+        assert status == {1: {"matched"}, 2: {"error"}, 3: {"error"}, 4: {"matched"}}
+        assert "abc" in next(row["message"] for row in rows if row["spec id"] == 2)
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+import selection_engine as engine
+from benchmarks import run, synthetic
+from flowchart import extract_numbered_steps_from_pdf
+
+
+def test_synthetic_workbooks_load_at_the_requested_size():
+    reactors = engine.load_reactor_data(synthetic.reactor_workbook(300))
+    assert len(reactors) == 300
+    assert reactors["reactor id"].is_unique
+    assert len(engine.load_filter_data(synthetic.filter_workbook(120))) == 120
+    assert len(engine.load_dryer_data(synthetic.dryer_workbook(80))) == 80
+
+
+def test_synthetic_procedure_parses_to_every_step():
+    steps = extract_numbered_steps_from_pdf(synthetic.procedure_pdf(150, lines_per_page=30))
+    assert len(steps) == 150
+    # Step numbers wrap at 100, as in long reports
+    assert steps[0].startswith("1. ") and steps[-1].startswith("50. ")
+
+
+def test_main_writes_json_results(tmp_path):
+    output = tmp_path / "bench.json"
+    only = ["filter_reactors", "export_steps_to_excel"]
+    assert run.main(["--sizes", "100", "--repeats", "1", "--only", *only, "-o", str(output)]) == 0
+    report = json.loads(output.read_text())
+    assert set(report["meta"]) == {"timestamp", "commit", "python", "platform"}
+    assert [r["name"] for r in report["results"]] == only
+    for r in report["results"]:
+        assert r["size"] == 100 and r["repeats"] == 1
+        assert r["median_s"] >= r["min_s"] >= 0 and r["peak_mib"] >= 0
+    assert report["results"][0]["items"] == 100 * run.QUERIES
+
+
+@pytest.mark.parametrize("before, status", [(1e-9, 1), (1e6, 0)])
+def test_compare_flags_slowdowns(tmp_path, before, status):
+    baseline = tmp_path / "baseline.json"
+    output = tmp_path / "bench.json"
+    baseline.write_text(json.dumps({"results": [{"name": "ReactorIndex", "size": 100, "median_s": before}]}))
+    argv = ["--sizes", "100", "--repeats", "1", "--only", "ReactorIndex", "-o", str(output), "--compare", str(baseline)]
+    assert run.main(argv) == status
+    regressions = json.loads(output.read_text())["regressions"]
+    assert len(regressions) == status
+    if regressions:
+        assert regressions[0]["name"] == "ReactorIndex" and regressions[0]["ratio"] > 1.25
+
+
+def test_compare_ignores_new_benchmarks():
+    results = [{"name": "filter_dryers", "size": 10, "median_s": 5.0}]
+    baseline = {"results": [{"name": "filter_dryers", "size": 1000, "median_s": 0.1}]}
+    assert run.compare(results, baseline, 1.25) == []
@@ -0,0 +1,38 @@
+import itertools
+import random
+
+import pytest
+
+from campaign_optimizer import CampaignSearch, _weights
+
+
+def route_cost(domains, assignment, objective):
+    w_transfer, w_headroom = _weights(objective, len(domains))
+    transfers = sum(1 for a, b in zip(assignment, assignment[1:]) if a != b)
+    return w_transfer * transfers + w_headroom * sum(domains[i][e] for i, e in enumerate(assignment))
+
+
+def test_route_returns_to_a_vessel_it_left():
+    best, empty = CampaignSearch([{"R1": 0.1}, {"F1": 0.2}, {"R1": 0.1}]).solve()
+    assert (best, empty) == (["R1", "F1", "R1"], [])
+
+
+def test_stays_in_a_vessel_rather_than_transferring():
+    domains = [{"R1": 0.5, "R2": 0.0}, {"R1": 0.5, "R2": 0.9}, {"R1": 0.5}]
+    best, _ = CampaignSearch(domains).solve()
+    assert best == ["R1", "R1", "R1"]
+
+
+def test_unstaffable_operations_are_reported():
+    assert CampaignSearch([{"R1": 0.1}, {}, {"R1": 0.1}, {}]).solve() == (None, [1, 3])
+
+
+@pytest.mark.parametrize("objective", ["transfers", "utilisation"])
+def test_matches_brute_force(objective):
+    rng = random.Random(1)
+    vessels = [f"E{k}" for k in range(5)]
+    for _ in range(150):
+        domains = [{e: rng.random() for e in rng.sample(vessels, rng.randint(1, 4))} for _ in range(rng.randint(1, 7))]
+        best, _ = CampaignSearch(domains, objective).solve()
+        brute = min(route_cost(domains, a, objective) for a in itertools.product(*domains))
+        assert route_cost(domains, best, objective) == pytest.approx(brute)
@@ -0,0 +1,100 @@
+import io
+import random
+import re
+from xml.etree import ElementTree
+
+import openpyxl
+import pdfplumber
+import pytest
+
+import flowchart
+from reports import procedure_report
+
+
+def reference_steps(page_texts):
+    # Extraction as written before streaming: join every page, then match once
+    full_text = "\n".join(text for text in page_texts if text)
+    match = re.search(r"(?i)\bprocedure\b", full_text)
+    if match:
+        full_text = full_text[match.end():]
+    matches = re.findall(r"(\d{1,2})\.\s(.+?)(?=\n\d{1,2}\.\s|\Z)", full_text, re.DOTALL)
+    return [f"{num}. {step.strip().replace(chr(10), ' ')}" for num, step in matches]
+
+
+def random_pages(rng):
+    lines = ["Familiarization Report", "1. Scope of the report"]
+    if rng.random() < 0.7:
+        lines.append(rng.choice(["Procedure", "PROCEDURE:", "6. Procedure"]))
+    for i in range(1, rng.randint(1, 40)):
+        lines.append(f"{i % 100}. Charge reagent {i} and stir")
+        for _ in range(rng.randint(0, 2)):
+            lines.append(rng.choice(["   Note: keep below 30 C", "continued text 12.5 L", "", "3.5 kg"]))
+    text = "\n".join(lines)
+    # Cut anywhere, including inside a step number or between "1." and its text
+    cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 8))))
+    pages = [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+    return [page.strip("\n") if rng.random() < 0.3 else page for page in pages] + ([""] if rng.random() < 0.2 else [])
+
+
+def test_streamed_steps_match_joined_text():
+    rng = random.Random(5)
+    for _ in range(500):
+        pages = random_pages(rng)
+        assert list(flowchart.iter_numbered_steps(pages)) == reference_steps(pages)
+
+
+def test_step_parser_emits_a_step_once_the_next_one_starts():
+    parser = flowchart.StepParser()
+    assert parser.feed("1. Charge solvent") == []
+    assert parser.feed("2. Heat to 60 C") == ["1. Charge solvent"]
+    assert parser.close() == ["2. Heat to 60 C"]
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_pdf_extraction_matches_reference(workers):
+    data = procedure_report(120, lines_per_page=20)
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        pages = [page.extract_text() for page in pdf.pages]
+    pages_seen = []
+    steps = flowchart.extract_numbered_steps_from_pdf(data, workers=workers, on_page=lambda done, total: pages_seen.append((done, total)))
+    assert len(steps) == 120
+    assert steps == reference_steps(pages)
+    assert pages_seen[-1] == (len(pages), len(pages))
+
+
+STEPS = [
+    "1. Charge toluene (500 L) Note: under nitrogen",
+    "2. Heat to 60 C",
+    "3. Send a sample to QC for <HPLC> & KF",
+    "4. Cool to 20 C",
+    "5. Submit the batch record",
+    "6. Filter",
+    "7. Dry the cake",
+]
+
+
+def test_flowchart_workbook_is_split_across_sheets():
+    workbook = openpyxl.load_workbook(flowchart.create_excel_with_flowchart_only(STEPS, max_steps_per_sheet=3))
+    assert workbook.sheetnames == ["Process Flow", "Process Flow (2)", "Process Flow (3)"]
+    first, last = workbook["Process Flow"], workbook["Process Flow (3)"]
+    assert sorted(str(r) for r in first.merged_cells.ranges) == ["C1:E2", "C4:E5", "C7:E8"]
+    assert first["C1"].value == "1. Charge toluene (500 L)\nNote: under nitrogen"
+    assert [first[f"D{row}"].value for row in (3, 6, 9)] == ["↓", "↓", "↓"]
+    assert last["C1"].value == "7. Dry the cake" and last["D3"].value is None
+    # Send and submit steps are decisions
+    assert first["C7"].font.b and not first["C4"].font.b
+    assert workbook["Process Flow (2)"]["C4"].font.b
+    assert openpyxl.load_workbook(flowchart.create_excel_with_flowchart_only([])).sheetnames == ["Process Flow"]
+
+
+def test_svg_flowchart_has_a_node_per_step():
+    svg = ElementTree.fromstring(flowchart.create_svg_flowchart(STEPS))
+    ns = {"svg": "http://www.w3.org/2000/svg"}
+    assert len(svg.findall("svg:rect", ns)) == 5
+    assert len(svg.findall("svg:polygon", ns)) == 2
+    assert len(svg.findall("svg:line", ns)) == len(STEPS) - 1
+    texts = ["".join(t.itertext()) for t in svg.findall("svg:text", ns)]
+    assert texts[0] == "1. Charge toluene (500 L)Note: under nitrogen"
+    assert "<HPLC> & KF" in texts[2]
+    page = flowchart.create_html_flowchart(STEPS, title="Batch <1>")
+    assert "<title>Batch &lt;1&gt;</title>" in page and flowchart.create_svg_flowchart(STEPS) in page
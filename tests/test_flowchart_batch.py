@@ -0,0 +1,62 @@
+import csv
+import io
+import zipfile
+
+import openpyxl
+import pytest
+
+import flowchart_batch
+from reports import pdf, procedure_report
+
+
+def report_zip(reports):
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w") as archive:
+        archive.writestr("reports/", "")
+        archive.writestr("reports/readme.txt", "not a report")
+        for name, data in reports:
+            archive.writestr(name, data)
+    return output.getvalue()
+
+
+REPORTS = [
+    ("reports/a.pdf", procedure_report(5)),
+    ("reports/broken.pdf", b"%PDF-1.4 truncated"),
+    ("reports/empty.pdf", pdf(["Familiarization Report", "No procedure yet"])),
+    ("other/a.pdf", procedure_report(12, lines_per_page=8)),
+]
+
+
+def test_iter_zip_reports_lists_pdfs_in_archive_order():
+    assert [name for name, _ in flowchart_batch.iter_zip_reports(report_zip(REPORTS))] == [name for name, _ in REPORTS]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_archive_has_a_workbook_per_converted_report(workers):
+    progress = []
+    data, summary = flowchart_batch.convert_to_archive(REPORTS, workers=workers, on_progress=lambda done, total: progress.append((done, total)))
+    assert [(s["report"], s["status"], s["steps"]) for s in summary] == [
+        ("reports/a.pdf", "ok", 5), ("reports/broken.pdf", "failed", 0), ("reports/empty.pdf", "no steps", 0), ("other/a.pdf", "ok", 12),
+    ]
+    assert summary[1]["error"]
+    assert progress[-1] == (4, 4)
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert sorted(archive.namelist()) == ["other/a.xlsx", "reports/a.xlsx", "summary.csv"]
+        rows = list(csv.DictReader(io.StringIO(archive.read("summary.csv").decode())))
+        sheet = openpyxl.load_workbook(io.BytesIO(archive.read("reports/a.xlsx"))).active
+    assert [row["status"] for row in rows] == ["ok", "failed", "no steps", "ok"]
+    assert sheet["C1"].value.startswith("1. Add the batch")
+
+
+def test_single_workbook_has_a_sheet_per_report():
+    data, summary = flowchart_batch.convert_to_workbook(REPORTS, workers=1)
+    workbook = openpyxl.load_workbook(io.BytesIO(data))
+    assert workbook.sheetnames == ["Summary", "a", "a (2)"]
+    assert [row[1] for row in workbook["Summary"].iter_rows(min_row=2, values_only=True)] == ["ok", "failed", "no steps", "ok"]
+    assert workbook["a (2)"]["C34"].value.startswith("12. ")
+
+
+def test_sheet_names_are_valid_and_unique():
+    used = {"summary"}
+    names = [flowchart_batch._sheet_name(report, used) for report in ["x/Summary.pdf", "q[1]:a?.pdf", "L" * 40 + ".pdf", "l" * 40 + ".pdf"]]
+    assert names == ["Summary (2)", "q_1__a_", "L" * 31, "l" * 27 + " (2)"]
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import flowchart_jobs
+from flowchart_jobs import JobQueue
+
+
+def wait_for(job, timeout=5):
+    end = time.time() + timeout
+    while job.active and time.time() < end:
+        time.sleep(0.005)
+    assert not job.active
+
+
+def test_round_robin_across_owners():
+    queue = JobQueue(workers=1)
+    gate = threading.Event()
+    order = []
+    try:
+        blocker = queue.submit("a", "blocker", lambda job: gate.wait(5))
+        while blocker.status == flowchart_jobs.QUEUED:
+            time.sleep(0.005)
+        jobs = [queue.submit(owner, name, lambda job, name=name: order.append(name))
+                for owner, name in [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1"), ("b", "b2")]]
+        assert [queue.queued_ahead(job) for job in jobs] == [0, 2, 4, 1, 3]
+        gate.set()
+        for job in [blocker] + jobs:
+            wait_for(job)
+        assert order == ["a1", "b1", "a2", "b2", "a3"]
+    finally:
+        queue.close()
+
+
+def test_cancel_and_failure():
+    queue = JobQueue(workers=1)
+    started = threading.Event()
+
+    def pages(job):
+        for done in range(1000):
+            started.set()
+            job.progress(done, 1000)
+            time.sleep(0.001)
+
+    try:
+        running = queue.submit("a", "long", pages)
+        started.wait(5)
+        queue.cancel(running.id)
+        wait_for(running)
+        assert running.status == flowchart_jobs.CANCELLED
+        failing = queue.submit("a", "bad", lambda job: 1 / 0)
+        wait_for(failing)
+        assert failing.status == flowchart_jobs.FAILED and "ZeroDivisionError" in failing.error
+        queue.release(failing.id)
+        assert queue.get(failing.id) is None
+    finally:
+        queue.close()
+
+
+def test_reads_while_other_sessions_submit_and_release():
+    queue = JobQueue(workers=1)
+    stop = threading.Event()
+    errors = []
+
+    def churn():
+        try:
+            while not stop.is_set():
+                queue.release(queue.submit("other", "job", lambda job: None).id)
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=churn)
+    thread.start()
+    try:
+        end = time.time() + 0.5
+        while time.time() < end:
+            queue.owner_jobs("me")
+            queue.get(1)
+    finally:
+        stop.set()
+        thread.join()
+        queue.close()
+    assert not errors
+
+
+def test_convert_batch_uses_few_workers(monkeypatch):
+    import flowchart_batch
+    calls = []
+
+    def convert(reports, workers=None, on_progress=None, cache_path=None):
+        calls.append(workers)
+        on_progress(len(reports), len(reports))
+        return b"", []
+
+    monkeypatch.setattr(flowchart_batch, "convert_to_archive", convert)
+    queue = JobQueue(workers=1)
+    try:
+        job = queue.submit("a", "batch", flowchart_jobs.convert_batch, [("a.pdf", b"")])
+        wait_for(job)
+        assert job.status == flowchart_jobs.DONE
+        assert calls == [flowchart_jobs.BATCH_WORKERS] and job.fraction == 1
+    finally:
+        queue.close()
@@ -0,0 +1,86 @@
+import json
+import logging
+import marshal
+
+import pytest
+
+import instrumentation
+from instrumentation import capture_run, metrics_text, profiled, span, span_rows, timed
+
+
+def _metric(text, name, stage):
+    prefix = f'{name}{{stage="{stage}"}} '
+    return next(float(line[len(prefix):]) for line in text.splitlines() if line.startswith(prefix))
+
+
+def test_spans_nest_and_collect_per_run():
+    with capture_run("test run") as spans:
+        with span("test outer", rows=3) as outer:
+            with span("test inner"):
+                pass
+            outer.set(bytes=10)
+    assert [(s.name, s.depth) for s in spans] == [("test run", 0), ("test outer", 1), ("test inner", 2)]
+    rows = span_rows(spans)
+    assert rows[1] == {"stage": "  test outer", "ms": rows[1]["ms"], "rows": 3, "bytes": 10, "status": "ok"}
+    assert rows[2]["stage"] == "    test inner" and rows[2]["ms"] >= 0
+
+    # Outside a run nothing is collected
+    with span("test stray"):
+        pass
+    assert len(spans) == 3
+
+
+def test_metrics_accumulate_rows_bytes_and_errors():
+    @timed("test timed", rows=len)
+    def load(n):
+        return list(range(n))
+
+    assert load(4) == [0, 1, 2, 3]
+    load(6)
+    with pytest.raises(ValueError):
+        with span("test timed", bytes=7):
+            raise ValueError
+    text = metrics_text()
+    assert "# TYPE reactor_stage_seconds summary" in text
+    assert _metric(text, "reactor_stage_seconds_count", "test timed") == 3
+    assert _metric(text, "reactor_stage_rows_total", "test timed") == 10
+    assert _metric(text, "reactor_stage_bytes_total", "test timed") == 7
+    assert _metric(text, "reactor_stage_errors_total", "test timed") == 1
+
+
+def test_stage_labels_are_escaped():
+    with span('test "quoted"\\stage'):
+        pass
+    assert 'stage="test \\"quoted\\"\\\\stage"' in metrics_text()
+
+
+def test_write_metrics_replaces_the_file(tmp_path):
+    path = tmp_path / "metrics.prom"
+    path.write_text("stale")
+    with span("test written"):
+        pass
+    instrumentation.write_metrics(str(path))
+    assert path.read_text() == metrics_text()
+    assert [p.name for p in tmp_path.iterdir()] == ["metrics.prom"]
+
+
+def test_spans_are_logged_as_json(caplog):
+    with caplog.at_level(logging.INFO, logger="reactor.timing"):
+        with span("test logged", rows=2):
+            pass
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record["span"] == "test logged" and record["rows"] == 2 and record["status"] == "ok"
+
+
+def test_cprofile_capture():
+    with profiled("cprofile", limit=5) as report:
+        sum(range(1000))
+    assert "function calls" in report["text"]
+    assert isinstance(marshal.loads(report["stats"]), dict)
+
+
+def test_tracemalloc_capture():
+    with profiled("tracemalloc") as report:
+        data = [bytes(1000) for _ in range(100)]
+    assert report["text"].startswith("current ") and "peak" in report["text"]
+    assert report["stats"] is None and data
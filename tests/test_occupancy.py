@@ -0,0 +1,146 @@
+import contextlib
+import gc
+import random
+import threading
+
+import numpy as np
+import pytest
+
+import selection_engine as engine
+from fleets import random_filters, random_fleet, random_queries, workbook
+from occupancy import BookingConflict, IntervalTree, OccupancyCalendar
+from selection_engine import SelectionError
+
+
+def brute_overlaps(bookings, start, end):
+    return sorted((b for b in bookings if b.start < end and b.end > start), key=lambda b: (b.start, b.end, b.id))
+
+
+def test_interval_tree_matches_brute_force():
+    rng = random.Random(4)
+    calendar = OccupancyCalendar()
+    live = {}
+    for _ in range(3000):
+        if live and rng.random() < 0.35:
+            booking = calendar.cancel(rng.choice(list(live)))
+            del live[booking.id]
+        else:
+            start = rng.randint(0, 200)
+            booking = calendar.book(rng.choice("AB"), start, start + rng.randint(1, 20), allow_conflict=True)
+            live[booking.id] = booking
+        start = rng.randint(-5, 210)
+        end = start + rng.randint(1, 15)
+        for equipment in "AB":
+            expected = brute_overlaps([b for b in live.values() if b.equipment == equipment], start, end)
+            assert calendar.conflicts(equipment, start, end) == expected
+            assert calendar.is_free(equipment, start, end) == (not expected)
+        assert calendar.busy_ids(start, end) == {b.equipment for b in live.values() if b.start < end and b.end > start}
+    for equipment in "AB":
+        assert calendar.schedule(equipment) == sorted((b for b in live.values() if b.equipment == equipment), key=lambda b: (b.start, b.end, b.id))
+
+
+def test_windows_are_half_open():
+    calendar = OccupancyCalendar()
+    calendar.book("R1", 8, 16)
+    assert calendar.is_free("R1", 16, 20)
+    assert calendar.is_free("R1", 0, 8)
+    assert not calendar.is_free("R1", 15, 17)
+    with pytest.raises(BookingConflict):
+        calendar.book("R1", 10, 12)
+    with pytest.raises(SelectionError):
+        calendar.book("R1", 20, 20)
+
+
+def test_next_free_is_the_earliest_free_start():
+    rng = random.Random(9)
+    for _ in range(200):
+        calendar = OccupancyCalendar()
+        for _ in range(rng.randint(0, 8)):
+            start = rng.randint(0, 60)
+            calendar.book("R1", start, start + rng.randint(1, 10), allow_conflict=True)
+        start, duration = rng.randint(0, 60), rng.randint(1, 12)
+        earliest = next(t for t in range(start, 200) if calendar.is_free("R1", t, t + duration))
+        assert calendar.next_free("R1", start, duration) == earliest
+
+
+def test_remove_unknown_booking():
+    tree = IntervalTree()
+    calendar = OccupancyCalendar()
+    booking = calendar.book("R1", 1, 2)
+    with pytest.raises(KeyError):
+        tree.remove(booking)
+
+
+def test_owners_release_their_bookings():
+    calendar = OccupancyCalendar()
+    first, second = calendar.owner(), calendar.owner()
+    calendar.book("R1", 0, 8, owner=first.key)
+    calendar.book("R2", 0, 8, owner=first.key)
+    kept = calendar.book("R1", 8, 16, owner=second.key)
+    assert {b.equipment for b in calendar.release(first.key)} == {"R1", "R2"}
+    assert calendar.schedule("R1") == [kept] and calendar.is_free("R2", 0, 8)
+
+    # A collected owner's bookings go with it
+    calendar.book("R3", 0, 8, owner=second.key)
+    del second
+    gc.collect()
+    assert calendar.busy_ids(0, 100) == set()
+    assert calendar.bookings == {}
+
+
+def test_calendar_is_shared_between_threads():
+    calendar = OccupancyCalendar()
+    owners = [calendar.owner() for _ in range(4)]
+    errors = []
+
+    def planner(owner):
+        try:
+            for hour in range(200):
+                with contextlib.suppress(BookingConflict):
+                    calendar.book(f"R{hour % 5}", hour, hour + 3, owner=owner.key)
+                calendar.busy_ids(hour, hour + 1)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=planner, args=(owner,)) for owner in owners]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    # Without allow_conflict, no two accepted bookings overlap
+    for equipment in [f"R{i}" for i in range(5)]:
+        schedule = calendar.schedule(equipment)
+        assert len(schedule) == 40
+        assert all(a.end <= b.start for a, b in zip(schedule, schedule[1:]))
+    for owner in owners:
+        calendar.release(owner.key)
+    assert calendar.bookings == {}
+
+
+def test_busy_equipment_is_left_out():
+    index = engine.ReactorIndex(engine.load_reactor_data(workbook(random_fleet(200, seed=3))))
+    calendar = OccupancyCalendar()
+    rng = np.random.default_rng(5)
+    for user_input in random_queries(rng, 10):
+        matched = engine.filter_reactors(index, user_input, 100.0, 400.0)
+        if len(matched) < 2:
+            continue
+        for reactor in matched["reactor id"][::2]:
+            calendar.book(reactor, 0, 8, allow_conflict=True)
+        busy = calendar.busy_ids(4, 12)
+        free = engine.filter_reactors(index, user_input, 100.0, 400.0, busy=busy)
+        assert free["reactor id"].tolist() == [r for r in matched["reactor id"] if r not in busy]
+        ranked = engine.rank_reactors(index, user_input, 100.0, 400.0, k=None, busy=busy)
+        assert set(ranked["reactor id"]) == set(free["reactor id"])
+        assert engine.filter_reactors(index, user_input, 100.0, 400.0, busy=calendar.busy_ids(8, 12)).equals(matched)
+        for booking in list(calendar.bookings):
+            calendar.cancel(booking)
+
+    filters = engine.load_filter_data(workbook(random_filters(60)))
+    user_input = {"ph_condition": "neutral", "corrosion_rate": 0, "coupon_materials": [""], "temperature": 25.0,
+                  "mass": 10.0, "bulk_density": 500.0}
+    matched = engine.filter_filters(filters, user_input, ["CENTRIFUGE", "ANFD", "RPF", "NUTSCHE", "VNF"])
+    busy = set(matched[engine.equipment_id_column(matched)].astype(str)[:3])
+    free = engine.filter_filters(filters, user_input, ["CENTRIFUGE", "ANFD", "RPF", "NUTSCHE", "VNF"], busy=busy)
+    assert len(free) == len(matched) - 3 and not busy & set(free[engine.equipment_id_column(free)].astype(str))
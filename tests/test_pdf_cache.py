@@ -0,0 +1,87 @@
+import importlib
+import os
+
+import pytest
+
+import flowchart
+import flowchart_batch
+import pdf_cache
+from reports import procedure_report
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    # REACTOR_PDF_CACHE is read at import, so the module is reloaded around the test
+    monkeypatch.setenv("REACTOR_PDF_CACHE", str(tmp_path / "cache.sqlite3"))
+    importlib.reload(pdf_cache)
+    yield tmp_path
+    monkeypatch.undo()
+    importlib.reload(pdf_cache)
+
+
+def test_cache_path_comes_from_the_environment(cache_dir, monkeypatch):
+    assert pdf_cache.CACHE_PATH == str(cache_dir / "cache.sqlite3")
+    assert pdf_cache.open_cache().path == pdf_cache.CACHE_PATH
+    monkeypatch.setenv("REACTOR_PDF_CACHE", "")
+    importlib.reload(pdf_cache)
+    assert pdf_cache.open_cache() is None
+
+
+def test_repeat_reports_are_served_from_the_cache(cache_dir, monkeypatch):
+    cache = pdf_cache.open_cache()
+    report = procedure_report(6)
+    steps = cache.steps(report)
+    assert len(steps) == 6 and cache.stats == {"hits": 0, "misses": 1, "evicted": 0}
+    workbook = cache.workbook(report, steps)
+
+    def parse(*args):
+        raise AssertionError("parsed again")
+
+    monkeypatch.setattr(flowchart, "extract_numbered_steps_from_pdf", parse)
+    monkeypatch.setattr(flowchart, "create_excel_with_flowchart_only", parse)
+    # Another handle on the same file, as in another process
+    other = pdf_cache.PdfCache(cache.path)
+    assert other.steps(report) == steps
+    assert other.workbook(report, steps) == workbook
+    assert other.stats["hits"] == 2
+    assert other.page_texts(report) is None
+
+
+def test_parser_version_change_invalidates_entries(cache_dir, monkeypatch):
+    report = procedure_report(4)
+    old = pdf_cache.open_cache()
+    old.steps(report)
+    monkeypatch.setattr(flowchart, "PARSER_VERSION", flowchart.PARSER_VERSION + "-next")
+    cache = pdf_cache.open_cache()
+    assert cache.version != old.version
+    assert len(cache.steps(report)) == 4
+    assert cache.stats["misses"] == 1
+    assert cache.size()[0] == 2
+
+
+def test_least_recently_used_entries_are_evicted(cache_dir, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr(pdf_cache.time, "time", lambda: next(clock))
+    cache = pdf_cache.PdfCache(str(cache_dir / "small.sqlite3"), max_bytes=3000)
+    for name in "abc":
+        cache.put(name, "xlsx", os.urandom(1000))
+    cache.get("a", "xlsx")
+    cache.put("d", "xlsx", os.urandom(1000))
+    assert cache.stats["evicted"] == 1
+    assert cache.get("b", "xlsx") is None
+    assert all(cache.get(name, "xlsx") is not None for name in "acd")
+    assert cache.size() == (3, 3000)
+
+    # Larger than the whole cache: not stored at all
+    cache.put("e", "xlsx", os.urandom(4000))
+    assert cache.get("e", "xlsx") is None and cache.size() == (3, 3000)
+
+
+def test_batch_conversion_uses_the_cache(cache_dir):
+    reports = [("a.pdf", procedure_report(5)), ("b.pdf", procedure_report(7))]
+    path = str(cache_dir / "batch.sqlite3")
+    first = flowchart_batch.convert_reports(reports, workers=1, cache_path=path)
+    again = flowchart_batch.convert_reports(reports, workers=1, cache_path=path)
+    assert [r["steps"] for r in again] == [5, 7]
+    assert [r["workbook"] for r in again] == [r["workbook"] for r in first]
+    assert flowchart_batch._cache_for(path).stats["hits"] == 4
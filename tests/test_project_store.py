@@ -0,0 +1,168 @@
+import sqlite3
+import threading
+
+import pytest
+
+import project_store
+from project_store import ProjectStore
+
+
+def operation(n, material="solvent", window=None):
+    return [{"operation": "charge", "material": material, "input_volume": 100.0 * k,
+             "actual_volume": 100.0 * k, "accumulated_volume": 100.0 * k} for k in range(1, n + 1)], f"R-{n}", window
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProjectStore(str(tmp_path / "projects.sqlite3"))
+
+
+def stored_rows(store, project_id):
+    with store._connect() as db:
+        return db.execute("SELECT position, row_hash FROM operations WHERE project_id = ? ORDER BY position", (project_id,)).fetchall()
+
+
+def test_sync_writes_only_changed_operations(store, monkeypatch):
+    pid = store.create("batch 1")
+    selections = [operation(2), operation(3), operation(1)]
+    hashes = store.sync(pid, selections)
+    assert store.load(pid) == selections
+    assert hashes == project_store.operation_hashes(selections)
+
+    statements = []
+    connect = sqlite3.connect
+
+    def traced(*args, **kwargs):
+        db = connect(*args, **kwargs)
+        db.set_trace_callback(statements.append)
+        return db
+
+    monkeypatch.setattr(project_store.sqlite3, "connect", traced)
+    selections[1] = operation(3, material="water")
+    hashes = store.sync(pid, selections, known_hashes=hashes)
+    assert len([s for s in statements if s.startswith("INSERT INTO operations")]) == 1
+    assert store.load(pid) == selections
+    assert [h for _, h in stored_rows(store, pid)] == hashes
+
+    # Unchanged selections do not touch the database at all
+    before = store.projects()[0]["updated"]
+    assert store.sync(pid, selections, known_hashes=hashes) == hashes
+    assert store.projects()[0]["updated"] == before
+
+    # Removed operations are dropped; without known hashes they are read back
+    assert store.sync(pid, selections[:1]) == hashes[:1]
+    assert store.load(pid) == selections[:1]
+    assert store.projects()[0]["operations"] == 1
+
+
+def test_names_are_unique(store):
+    pid = store.create("batch 1")
+    with pytest.raises(ValueError, match="already exists"):
+        store.create("batch 1")
+    assert store.find("batch 1") == pid
+    with pytest.raises(ValueError, match="No project"):
+        store.find("batch 2")
+
+
+def test_workbooks_are_stored_once(store):
+    first, second = store.create("a"), store.create("b")
+    digest = store.save_database(first, "reactors", "site.xlsx", b"workbook")
+    assert store.save_database(second, "reactors", "copy.xlsx", b"workbook") == digest
+    assert store.database(second, "reactors") == ("copy.xlsx", b"workbook")
+    assert store.database_digest(first, "filters") is None
+    with store._connect() as db:
+        assert db.execute("SELECT COUNT(*) FROM blobs").fetchone()[0] == 1
+    store.delete(first)
+    assert store.database(second, "reactors") == ("copy.xlsx", b"workbook")
+    store.delete(second)
+    with store._connect() as db:
+        assert db.execute("SELECT COUNT(*) FROM blobs").fetchone()[0] == 0
+
+
+def test_export_import_round_trip(store, tmp_path):
+    pid = store.create("batch 1")
+    selections = [operation(2), operation(4, window=("2026-10-01T08:00:00", "2026-10-01T16:00:00"))]
+    store.sync(pid, selections)
+    store.save_database(pid, "reactors", "reactors.xlsx", b"reactor workbook")
+    store.save_database(pid, "dryers", "dryers.xlsx", b"dryer workbook")
+    archive = store.export_project(pid)
+
+    other = ProjectStore(str(tmp_path / "other.sqlite3"))
+    copy = other.import_project(archive)
+    assert other.load(copy) == selections
+    assert other.database(copy, "reactors") == ("reactors.xlsx", b"reactor workbook")
+    assert other.database(copy, "dryers") == ("dryers.xlsx", b"dryer workbook")
+    assert other.database(copy, "filters") is None
+    assert other.export_project(copy) == archive
+
+    with pytest.raises(ValueError, match="already exists"):
+        other.import_project(archive)
+    renamed = other.import_project(archive, name="batch 1 (copy)")
+    assert other.load(renamed) == selections
+
+
+def test_cli_export_and_import(store, tmp_path):
+    pid = store.create("batch 1")
+    store.sync(pid, [operation(3)])
+    archive = tmp_path / "batch.zip"
+    target = tmp_path / "target.sqlite3"
+    assert project_store.main(["--db", store.path, "export", "batch 1", "-o", str(archive)]) == 0
+    assert project_store.main(["--db", str(target), "import", str(archive)]) == 0
+    assert project_store.main(["--db", str(target), "import", str(archive)]) == 1
+    imported = ProjectStore(str(target))
+    assert imported.load(imported.find("batch 1")) == [operation(3)]
+
+
+def test_readers_run_alongside_a_writer(store):
+    with store._connect() as db:
+        assert db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    pid = store.create("batch 1")
+    store.sync(pid, [operation(1)])
+
+    # A reader sees the last committed state while a write transaction is open
+    writer = sqlite3.connect(store.path)
+    writer.execute("BEGIN IMMEDIATE")
+    writer.execute("DELETE FROM operations")
+    assert store.load(pid) == [operation(1)]
+    writer.rollback()
+    writer.close()
+
+    errors = []
+
+    def save(name):
+        try:
+            own = store.create(name)
+            for n in range(1, 21):
+                store.sync(own, [operation(k) for k in range(1, n + 1)])
+                store.load(pid)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save, args=(f"session {i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert sorted(p["operations"] for p in store.projects()) == [1, 20, 20, 20, 20]
+
+
+def test_booking_windows_are_saved(store):
+    pid = store.create("batch 1")
+    hashes = store.sync(pid, [operation(2)])
+    window = ("2026-10-01T08:00:00", "2026-10-01T16:00:00")
+    # Booking a window changes the operation's row
+    assert store.sync(pid, [operation(2, window=window)], known_hashes=hashes) != hashes
+    assert store.load(pid) == [operation(2, window=window)]
+
+
+def test_stores_without_booking_column_are_upgraded(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    db = sqlite3.connect(path)
+    db.executescript(project_store.SCHEMA.replace("    booking TEXT,\n", ""))
+    db.execute("INSERT INTO projects (name, created, updated) VALUES ('old', 0, 0)")
+    db.execute("INSERT INTO operations (project_id, position, row_hash, selection, steps) VALUES (1, 0, 'x', 'R-1', '[]')")
+    db.commit()
+    db.close()
+    store = ProjectStore(path)
+    assert store.load(1) == [([], "R-1", None)]
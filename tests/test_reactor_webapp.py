@@ -0,0 +1,176 @@
+import io
+from functools import partial
+
+import openpyxl
+import pandas as pd
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import occupancy
+import project_store
+import reactor_webapp as app
+import site_catalog
+from fleets import workbook
+
+REACTORS = {
+    "Vessel ID": ["R-1", "R-2", "R-3"],
+    "Min Sensing Volume": [10, 50, 100],
+    "Min Stirring Volume": [20, 60, 150],
+    "Capacity": [1000, 4000, 10000],
+    "MOC": ["GLR", "SSR/HAR", "All glass"],
+    "Utilities": ["CT, HW", "LPS", "CHB, CT"],
+    "Agitator": ["Anchor", "PBT", "Propellor"],
+}
+
+
+def test_read_upload_bytes(tmp_path):
+    data = workbook(REACTORS)
+    path = tmp_path / "reactors.xlsx"
+    path.write_bytes(data)
+    stream = io.BufferedReader(io.BytesIO(data))
+    assert app.read_upload_bytes(str(path)) == data
+    assert app.read_upload_bytes(io.BytesIO(data)) == data
+    assert app.read_upload_bytes(stream) == data
+    assert stream.tell() == 0
+    assert app.content_hash(data) == app.content_hash(bytes(data))
+
+
+def codes(df, column):
+    # The code sets packed into a compact frame's bitset column
+    vocab = df.attrs["codes"][column]
+    return [{c for i, c in enumerate(vocab) if int(bits) >> i & 1} for bits in df[column]]
+
+
+def test_equal_uploads_are_parsed_once(monkeypatch):
+    app._build_reactor_index.clear()
+    app.st.session_state.clear()
+    reads = []
+    read_excel = pd.read_excel
+    monkeypatch.setattr(pd, "read_excel", lambda *a, **k: reads.append(1) or read_excel(*a, **k))
+    data = workbook(REACTORS)
+    first = app.load_reactor_index(io.BytesIO(data))
+    second = app.load_reactor_index(io.BytesIO(data))
+    assert len(reads) == 1
+    assert first is second
+    assert codes(first.df, "materials") == [{"GLR"}, {"SSR", "HAR"}, {"GLR"}]
+    assert codes(first.df, "thermal options") == [{"CT", "HW"}, {"LPS"}, {"CHB", "CT"}]
+
+    edited = dict(REACTORS, Capacity=[1000, 4000, 6300])
+    patched = app.load_reactor_index(io.BytesIO(workbook(edited)))
+    assert patched.df["max volume"].tolist() == [1000, 4000, 6300]
+    assert len(reads) == 2
+    assert app.st.session_state.reactor_changes["modified"] == ["R-3"]
+
+
+def steps(*volumes, material="solvent"):
+    total = 0
+    log = []
+    for i, volume in enumerate(volumes, start=1):
+        total += volume
+        log.append({"step": i, "operation": "charge" if i == 1 else "addition", "material": material,
+                    "input_volume": volume, "actual_volume": volume, "accumulated_volume": total})
+    return log
+
+
+def test_steps_export_merges_each_unit_operation():
+    selections = [(steps(100, 50, 25), "R-1"), (steps(40), "Vessel with a long name"), ([], "R-9"), (steps(10, 20, material="reagent 12"), "R-2")]
+    sheet = openpyxl.load_workbook(app.export_steps_to_excel(selections)).active
+    assert sorted(str(r) for r in sheet.merged_cells.ranges) == ["A4:A6", "A8:A9"]
+    assert [c.value for c in sheet[3]] == app.EXPORT_COLUMNS
+    assert [tuple(row) for row in sheet.iter_rows(min_row=4, values_only=True)] == [
+        (1, "charge", "solvent", 100, 100, "R-1"),
+        (None, "addition", "solvent", 50, 150, "R-1"),
+        (None, "addition", "solvent", 25, 175, "R-1"),
+        (2, "charge", "solvent", 40, 40, "Vessel with a long name"),
+        (4, "charge", "reagent 12", 10, 10, "R-2"),
+        (None, "addition", "reagent 12", 20, 30, "R-2"),
+    ]
+    assert sheet["A4"].alignment.vertical == "center" and sheet["A8"].alignment.horizontal == "center"
+    # Each column fits its longest entry, header included
+    widths = [sheet.column_dimensions[letter].width for letter in "ABCDEF"]
+    assert widths == pytest.approx([len("Unit Operation") + 2, len("Operation") + 2, len("reagent 12") + 2,
+                                    len("Volume Added (L)") + 2, len("Accumulated Volume (L)") + 2, len("Vessel with a long name") + 2], abs=0.75)
+
+
+@pytest.fixture
+def app_test(tmp_path, monkeypatch):
+    monkeypatch.setattr(project_store, "ProjectStore", partial(project_store.ProjectStore, str(tmp_path / "projects.sqlite3")))
+    app.st.cache_resource.clear()
+    at = AppTest.from_file(app.__file__, default_timeout=60)
+    yield at
+    app.st.cache_resource.clear()
+
+
+WINDOW = ("2026-01-01T00:00:00", "2026-01-01T08:00:00")
+
+
+def selections(count):
+    # Unit operations 1..count on R-1..R-count; the even ones are booked
+    return [([dict(s, unit_op=i) for s in steps(10.0 * i)], f"R-{i}", None if i % 2 else WINDOW) for i in range(1, count + 1)]
+
+
+def test_sidebar_pages_and_removal_keep_state_in_step(app_test, monkeypatch):
+    calendars = []
+    calendar_class = occupancy.OccupancyCalendar
+    monkeypatch.setattr(occupancy, "OccupancyCalendar", lambda: calendars.append(calendar_class()) or calendars[-1])
+    app_test.session_state["selections"] = selections(25)
+    app_test.run()
+    assert not app_test.exception
+    # The last page, with steps 21 to 25
+    step_labels = lambda: [e.label for e in app_test.sidebar.expander if e.label.startswith("Step ")]
+    assert step_labels() == [f"Step {i}: R-{i}" for i in range(21, 26)]
+    assert app_test.sidebar.number_input(key="sidebar_page").value == 3
+    assert len(app_test.session_state["selection_summaries"]) == 25
+
+    app_test.sidebar.number_input(key="sidebar_page").set_value(1).run()
+    assert step_labels()[:2] == ["Step 1: R-1", "Step 2: R-2"]
+    app_test.sidebar.button(key="remove_1").click().run()
+    assert not app_test.exception
+    state = app_test.session_state
+    assert [s[1] for s in state["selections"]][:3] == ["R-1", "R-3", "R-4"]
+    assert len(state["selection_summaries"]) == len(state["booking_ids"]) == 24
+    assert state["selection_summaries"][1] == app._selection_summary(*state["selections"][1])
+    # Every selection with a window is still booked, the removed one is not
+    [calendar] = calendars
+    assert sum(b is not None for b in state["booking_ids"]) == 11
+    assert all(calendar.conflicts(f"R-{i}", *app._window_times(WINDOW)) for i in range(4, 26, 2))
+    assert not calendar.conflicts("R-2", *app._window_times(WINDOW))
+
+
+def test_removing_a_step_moves_the_shown_result(app_test):
+    app_test.session_state["selections"] = selections(3)
+    result = {"heading": "Best reactors", "matches": None, "site_matches": None, "note": None, "warnings": []}
+    app_test.session_state["unit_op_result"] = dict(result, index=2)
+    app_test.run()
+    app_test.sidebar.button(key="remove_0").click().run()
+    assert app_test.session_state["unit_op_result"]["index"] == 1
+    app_test.sidebar.button(key="remove_1").click().run()
+    assert "unit_op_result" not in app_test.session_state
+    assert [s[1] for s in app_test.session_state["selections"]] == ["R-2"]
+
+
+def test_site_matches_are_queried_once():
+    catalog = site_catalog.SiteCatalog()
+    calls = []
+    assert app.query_site_matches(catalog, "reactors", lambda: calls.append(1)) is None
+    catalog.register("North", reactors=workbook(REACTORS))
+    catalog.refresh()
+    user_input = {"process_type": "reaction", "ph_condition": "neutral", "corrosion_rate": 0, "coupon_materials": [],
+                  "temperature": 60.0, "reaction_nature": "none", "reaction_subtype": None}
+    sites, merged = app.query_site_matches(catalog, "reactors", lambda: calls.append(1) or catalog.rank_reactors(user_input, 100.0, 500.0))
+    assert calls == [1] and sites == 1
+    assert list(merged.columns) == ["site"] + app.REACTOR_COLUMNS
+    assert len(merged) and set(merged["site"]) == {"North"}
+
+
+def test_choosing_other_equipment_rebooks_it():
+    app.st.cache_resource.clear()
+    app.st.session_state.clear()
+    app.st.session_state.selections = selections(2)
+    calendar = app.get_bookings()
+    app.replace_selection(1, "R-9")
+    state = app.st.session_state
+    assert state.selections[1][1] == "R-9"
+    assert "**Selected Equipment:** R-9" in state.selection_summaries[1]
+    assert calendar.conflicts("R-9", *app._window_times(WINDOW)) and not calendar.conflicts("R-2", *app._window_times(WINDOW))
+    app.st.cache_resource.clear()
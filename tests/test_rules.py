@@ -0,0 +1,90 @@
+import json
+import os
+
+import pytest
+
+import rules
+
+
+def reference_thermal(temp):
+    if 10 <= temp <= 20:
+        return ["CHB"]
+    elif 20 < temp <= 35:
+        return ["CT"]
+    elif 20 < temp <= 90:
+        return ["HW"]
+    return ["LPS", "HOT OIL", "EJECTION CONDENSATE"]
+
+
+def reference_filter_types(prop, val, unit=None):
+    if prop == "specific cake resistance (m/kg)":
+        if 1e7 <= val < 1e8:
+            return ["CENTRIFUGE", "NUTSCHE"]
+        elif 1e8 <= val < 1e10:
+            return ["CENTRIFUGE", "ANFD", "RPF", "VNF"]
+        elif val >= 1e10:
+            return ["CENTRIFUGE", "NUTSCHE"]
+    elif prop == "rate of cake buildup":
+        if 0.1 <= val <= 10:
+            return {"cm/sec": ["CENTRIFUGE", "NUTSCHE"], "cm/min": ["CENTRIFUGE", "ANFD", "RPF"], "cm/hr": ["ANFD"]}[unit]
+    elif prop == "settling rate":
+        if val > 5:
+            return ["CENTRIFUGE", "NUTSCHE"]
+        elif 0.1 <= val <= 5:
+            return ["ANFD", "RPF"]
+        elif val < 0.1:
+            return ["ANFD"]
+    return []
+
+
+# Every band edge, and values just either side of it
+EDGES = [0.0, 0.1, 5, 10, 20, 35, 90, 1e7, 1e8, 1e10]
+VALUES = sorted({v + d for v in EDGES for d in (-1e-9, 0.0, 1e-9) if v + d >= 0} | {0.05, 3.0, 15.0, 50.0, 150.0, 1e9, 1e12})
+
+
+@pytest.fixture(scope="module")
+def compiled():
+    return rules.load_rules()
+
+
+def test_thermal_bands(compiled):
+    for temp in VALUES:
+        assert compiled.thermal_utilities(temp) == reference_thermal(temp), temp
+
+
+def test_filter_type_bands(compiled):
+    for val in VALUES:
+        for prop, unit in [("specific cake resistance (m/kg)", None), ("settling rate", None),
+                           ("rate of cake buildup", "cm/sec"), ("rate of cake buildup", "cm/min"), ("rate of cake buildup", "cm/hr")]:
+            assert compiled.filter_types_for(prop, val, unit) == reference_filter_types(prop, val, unit), (prop, unit, val)
+
+
+def test_materials_and_limits(compiled):
+    assert compiled.allowed_materials("reactor", {"ph_condition": "acidic"}) == {"GLR", "HAR"}
+    assert compiled.allowed_materials("filter", {"ph_condition": "acidic"}) == {"HALAR", "HAR"}
+    assert compiled.allowed_materials("dryer", {"ph_condition": "basic"}) == {"SSR", "HAR", "HALAR"}
+    coupon = {"ph_condition": "coupon", "corrosion_rate": 0.05, "coupon_materials": [" ssr "]}
+    assert compiled.allowed_materials("reactor", coupon) == {"SSR"}
+    assert compiled.allowed_materials("reactor", dict(coupon, corrosion_rate=0.1)) is None
+    assert compiled.volume_limit("reactor", "distillation") == 0.7
+    assert compiled.volume_limit("reactor", "extraction/workup") == 0.95
+    assert compiled.volume_limit("filter") == compiled.volume_limit("dryer") == 0.9
+
+
+def test_agitator_preferences(compiled):
+    assert compiled.preferred_agitators("none") == []
+    assert compiled.preferred_agitators("homogeneous", "biphasic") == ["PROPELLOR", "PBT", "RCI", "ANCHOR", "CBRT"]
+    assert compiled.preferred_agitators("heterogeneous", "gas-liquid") == ["RUSTON", "DISC"]
+    assert compiled.preferred_agitators("heterogeneous", None) == []
+
+
+def test_get_rules_reloads_an_edited_table(tmp_path):
+    with open(rules.RULES_PATH) as f:
+        table = json.load(f)
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(table))
+    assert rules.get_rules(str(path)).volume_limit("filter") == 0.9
+    table["volume_limits"]["filter"] = 0.8
+    path.write_text(json.dumps(table))
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+    assert rules.get_rules(str(path)).volume_limit("filter") == 0.8
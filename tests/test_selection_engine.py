@@ -0,0 +1,229 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import selection_engine as engine
+from benchmarks import synthetic
+from instrumentation import capture_run
+from fleets import (random_dryers, random_filters, random_fleet, random_queries, reference_filter_reactors,
+                    reference_reactors, workbook)
+
+
+@pytest.fixture(scope="module")
+def fleet():
+    columns = random_fleet(400, seed=7)
+    return reference_reactors(columns), engine.ReactorIndex(engine.load_reactor_data(workbook(columns)))
+
+
+def test_filter_reactors_matches_reference(fleet):
+    reference, index = fleet
+    rng = np.random.default_rng(11)
+    for user_input in random_queries(rng, 150):
+        first = float(np.round(rng.uniform(5, 600), 1))
+        total = first * float(np.round(rng.uniform(1, 12), 1))
+        want = reference_filter_reactors(reference, user_input, first, total)
+        got = engine.filter_reactors(index, user_input, first, total)
+        assert got["reactor id"].tolist() == want["reactor id"].tolist()
+        assert got["Preference Match"].tolist() == want["Preference Match"].tolist()
+
+
+def test_filter_reactors_at_the_fill_limit():
+    # Totals exactly at capacity x limit, with capacities that are not round numbers
+    rng = np.random.default_rng(3)
+    rows = 300
+    columns = dict(random_fleet(rows, seed=3), **{
+        "Capacity": np.round(rng.uniform(50, 200000, rows), 3).tolist(),
+        "Min Sensing Volume": [0.0] * rows,
+        "Min Stirring Volume": [0.0] * rows,
+    })
+    reference = reference_reactors(columns)
+    index = engine.ReactorIndex(engine.load_reactor_data(workbook(columns)))
+    user_input = next(random_queries(rng, 1))
+    for process_type, limit in [("reaction", 0.7), ("extraction/workup", 0.95)]:
+        user_input = dict(user_input, process_type=process_type)
+        for capacity in columns["Capacity"][:100]:
+            total = capacity * limit
+            want = reference_filter_reactors(reference, user_input, 1.0, total)
+            got = engine.filter_reactors(index, user_input, 1.0, total)
+            assert got["reactor id"].tolist() == want["reactor id"].tolist()
+
+
+def test_coupon_material(fleet):
+    reference, index = fleet
+    user_input = dict(next(random_queries(np.random.default_rng(0), 1)), ph_condition="coupon", corrosion_rate=0.05, coupon_materials=["hast "])
+    want = reference_filter_reactors(reference, user_input, 100.0, 500.0)
+    got = engine.filter_reactors(index, user_input, 100.0, 500.0)
+    assert len(got) and got["reactor id"].tolist() == want["reactor id"].tolist()
+
+
+def test_coupon_corrosion_rate_too_high(fleet):
+    _, index = fleet
+    user_input = dict(next(random_queries(np.random.default_rng(0), 1)), ph_condition="coupon", corrosion_rate=0.5, coupon_materials=["SSR"])
+    with pytest.raises(engine.SelectionError):
+        engine.filter_reactors(index, user_input, 100.0, 500.0)
+
+
+def test_filter_and_dryer_volume_limits():
+    filters = engine.load_filter_data(workbook(random_filters(200)))
+    dryers = engine.load_dryer_data(workbook(random_dryers(200)))
+    user_input = {"ph_condition": "basic", "corrosion_rate": 0, "coupon_materials": [""], "mass": 90.0, "bulk_density": 500.0, "volume": 450.0}
+    matched = engine.filter_filters(filters, user_input, ["CENTRIFUGE", "NUTSCHE"])
+    volume = engine.filter_volume_litres(90.0, 500.0)
+    expected = filters[filters["moc"].isin(["SSR", "HAR", "HALAR"]) & (filters["cake capacity"] * 0.9 >= volume)
+                       & filters["filter type"].astype(str).str.upper().str.contains("CENTRIFUGE|NUTSCHE")]
+    assert len(matched) and matched["filter id"].tolist() == expected["filter id"].tolist()
+    matched = engine.filter_dryers(dryers, user_input)
+    expected = dryers[dryers["moc"].isin(["SSR", "HAR", "HALAR"]) & (dryers["capacity"] * 0.9 >= 450.0)]
+    assert len(matched) and matched["equipment id"].tolist() == expected["equipment id"].tolist()
+
+
+def test_missing_reactor_column():
+    columns = random_fleet(5)
+    del columns["Utilities"]
+    with pytest.raises(engine.SelectionError, match="utilities"):
+        engine.load_reactor_data(workbook(columns))
+
+
+def test_compact_schema():
+    df = engine.load_reactor_data(workbook(random_fleet(50, seed=4)))
+    assert df["materials"].dtype == np.uint64 and df["thermal options"].dtype == np.uint64
+    assert isinstance(df["agitator"].dtype, pd.CategoricalDtype)
+    assert all(df[c].dtype == np.float64 for c in engine.REACTOR_VOLUME_COLUMNS)
+    assert "GLR" in df.attrs["codes"]["materials"] and "ALL GLASS" not in df.attrs["codes"]["materials"]
+    filters = engine.load_filter_data(workbook(random_filters(50)))
+    assert isinstance(filters["moc"].dtype, pd.CategoricalDtype)
+    assert filters["cake capacity"].dtype == np.float64
+
+def test_top_k_matches_a_full_stable_sort():
+    rng = np.random.default_rng(2)
+    for _ in range(200):
+        scores = rng.choice([0.1, 0.5, 0.9, np.nan, 1.0], rng.integers(0, 30)) if rng.random() < 0.5 else rng.random(rng.integers(0, 30))
+        full = np.argsort(-np.nan_to_num(scores, nan=-np.inf), kind="stable")
+        for k in [None, 0, 1, 3, len(scores), len(scores) + 2]:
+            assert engine.top_k(scores, k).tolist() == full[:None if k is None else k].tolist()
+
+
+def test_rank_reactors_is_the_best_k_of_filter_reactors(fleet):
+    _, index = fleet
+    rng = np.random.default_rng(4)
+    for user_input in random_queries(rng, 40):
+        matched = engine.filter_reactors(index, user_input, 300.0, 900.0)
+        ranked = engine.rank_reactors(index, user_input, 300.0, 900.0, k=5)
+        assert len(ranked) == min(5, len(matched))
+        assert set(ranked["reactor id"]) <= set(matched["reactor id"])
+        assert ranked["Score"].is_monotonic_decreasing
+        everything = engine.rank_reactors(index, user_input, 300.0, 900.0, k=None)
+        assert ranked["reactor id"].tolist() == everything["reactor id"].tolist()[:5]
+
+
+def csv_bytes(columns):
+    return pd.DataFrame(columns).to_csv(index=False).encode()
+
+
+def parquet_bytes(columns):
+    output = io.BytesIO()
+    pd.DataFrame(columns).to_parquet(output, index=False)
+    return output.getvalue()
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(engine, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    return tmp_path / "snapshots"
+
+
+def snapshot_state(source):
+    with capture_run() as spans:
+        df = engine.read_table(source, engine.REACTOR_COLUMNS, engine.REACTOR_RENAME)
+    return df, next(s for s in spans if s.name == "read_table").attrs.get("snapshot")
+
+
+def test_every_table_format_loads_the_same_frame(snapshot_dir):
+    columns = dict(random_fleet(60, seed=2), Notes=["spare"] * 60)
+    frames = [engine.load_reactor_data(encode(columns)) for encode in (workbook, csv_bytes, parquet_bytes)]
+    for df in frames[1:]:
+        pd.testing.assert_frame_equal(df, frames[0])
+    assert frames[0]["reactor id"].tolist() == columns["Vessel ID"]
+    for encode in (workbook, csv_bytes, parquet_bytes):
+        df = engine.read_table(encode(columns), engine.REACTOR_COLUMNS, engine.REACTOR_RENAME)
+        assert list(df.columns) == engine.REACTOR_COLUMNS
+
+
+def test_snapshot_hit_and_miss(snapshot_dir):
+    data = workbook(random_fleet(40, seed=6))
+    first, state = snapshot_state(data)
+    assert state == "written"
+    assert len(list(snapshot_dir.glob("*.parquet"))) == 1
+    again, state = snapshot_state(data)
+    assert state == "hit"
+    pd.testing.assert_frame_equal(again, first)
+
+    # A snapshot evicted by another process is parsed again, not an error
+    for path in snapshot_dir.glob("*.parquet"):
+        path.unlink()
+    again, state = snapshot_state(data)
+    assert state == "written"
+    pd.testing.assert_frame_equal(again, first)
+
+    # CSV and Parquet are never snapshotted
+    assert snapshot_state(csv_bytes(random_fleet(40, seed=6)))[1] is None
+    assert len(list(snapshot_dir.glob("*.parquet"))) == 1
+
+
+def test_snapshots_are_evicted_oldest_first(snapshot_dir, monkeypatch):
+    monkeypatch.setattr(engine, "MAX_SNAPSHOTS", 2)
+    fleets = [workbook(random_fleet(10, seed=seed)) for seed in range(3)]
+    for data in fleets:
+        snapshot_state(data)
+    assert len(list(snapshot_dir.glob("*.parquet"))) == 2
+    assert snapshot_state(fleets[0])[1] == "written"
+    assert snapshot_state(fleets[2])[1] == "hit"
+
+
+def test_missing_columns_are_reported_before_reading_rows(snapshot_dir):
+    columns = random_fleet(20, seed=1)
+    del columns["Agitator"], columns["MOC"]
+    for encode in (workbook, csv_bytes, parquet_bytes):
+        with pytest.raises(engine.SelectionError, match="moc, agitator"):
+            engine.load_reactor_data(encode(columns))
+
+
+def test_patched_index_matches_a_full_rebuild():
+    rng = np.random.default_rng(5)
+    table = engine.read_reactor_table(csv_bytes(synthetic.reactor_columns(600, seed=5)))
+    previous = engine.build_reactor_index(table)
+    queries = list(random_queries(rng, 30))
+    for trial in range(6):
+        edited = table.copy()
+        rows = rng.choice(len(edited), 8, replace=False)
+        edited.loc[rows[:3], "max volume"] = rng.choice([250.0, 630.0, 6300.0], 3)
+        edited.loc[rows[3:5], "moc"] = ["HAST", "GLR/SSR"] if trial % 2 else ["SSR", "TITANIUM"]
+        edited.loc[rows[5], "agitator"] = f"Turbine {trial}"
+        edited.loc[rows[6], "utilities"] = f"CT, UTILITY {trial}"
+        edited.loc[rows[7], "min sensing"] = 1.0
+        edited = edited.drop(index=rng.choice(edited.index, 3, replace=False))
+        added = edited.sample(4, random_state=trial).assign(**{"reactor id": [f"NEW-{trial}-{i}" for i in range(4)]})
+        edited = pd.concat([edited, added], ignore_index=True)
+        if trial == 3:
+            edited = edited.sample(frac=1, random_state=1).reset_index(drop=True)
+
+        patched = engine.build_reactor_index(edited, previous)
+        full = engine.build_reactor_index(edited)
+        assert patched is not previous
+        for name in ["min_sensing", "min_stirring", "max_volume", "sensing_sorted", "stirring_sorted", "volume_sorted"]:
+            assert np.array_equal(getattr(patched, name), getattr(full, name)), name
+        for user_input in queries:
+            first = float(rng.uniform(5, 600))
+            total = first * float(rng.uniform(1, 12))
+            a = engine.rank_reactors(patched, user_input, first, total, k=None)
+            b = engine.rank_reactors(full, user_input, first, total, k=None)
+            assert a[["reactor id", "Preference Match", "Score"]].equals(b[["reactor id", "Preference Match", "Score"]])
+
+        changes = engine.reactor_changes(previous, patched)
+        assert sorted(changes["added"]) == sorted(added["reactor id"])
+        assert len(changes["removed"]) == 3
+        previous, table = patched, edited
+
+    assert engine.build_reactor_index(table.copy(), previous) is previous
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import os
+
+import batch_select
+import selection_service
+from benchmarks import synthetic
+from selection_service import SelectionService
+
+SPEC = {"unit_op_type": "reaction", "ph_condition": "neutral", "temperature": 30, "step_volumes": "100;400"}
+
+
+async def post(port, spec):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(spec).encode()
+    writer.write(f"POST /select HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+    await writer.drain()
+    head, _, data = (await asyncio.wait_for(reader.read(), 60)).partition(b"\r\n\r\n")
+    writer.close()
+    return int(head.split()[1]), json.loads(data)
+
+
+async def run_service(service, client):
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    server = asyncio.create_task(selection_service.serve(service, port=0, ready=ready.set_result))
+    try:
+        _, port = await ready
+        return await client(port)
+    finally:
+        server.cancel()
+        await asyncio.gather(server, return_exceptions=True)
+
+
+def test_batch_matches_select_for_spec(tmp_path):
+    path = tmp_path / "reactors.xlsx"
+    path.write_bytes(synthetic.reactor_workbook(200))
+    service = SelectionService(reactors=str(path), workers=0)
+    service.start_pool()
+    specs = [dict(SPEC, id=1), dict(SPEC, id=2), dict(SPEC, id=3, temperature=120), dict(SPEC, id=4, step_volumes="x")]
+    try:
+        results = asyncio.run(service.handle_select(json.dumps(specs).encode()))
+    finally:
+        service.close()
+    databases = batch_select.load_databases(str(path))
+    assert [r["id"] for r in results] == [1, 2, 3, 4]
+    for spec, result in zip(specs[:3], results):
+        assert result["matches"] == batch_select.select_for_spec(spec, databases)
+    assert results[0]["status"] == "matched"
+    assert results[3]["status"] == "error"
+    # The second query differs from the first only in its id
+    assert service.stats["requests"] == 4 and service.stats["coalesced"] == 1
+
+
+def test_unexpected_error_is_a_json_500():
+    async def fail(method, path, body):
+        raise RuntimeError("disk full")
+
+    service = SelectionService(workers=0)
+    service.route = fail
+    status, payload = asyncio.run(run_service(service, lambda port: post(port, SPEC)))
+    assert status == 500
+    assert payload == {"error": "RuntimeError: disk full"}
+
+
+def test_pool_is_restarted_after_a_worker_dies(tmp_path):
+    path = tmp_path / "reactors.xlsx"
+    path.write_bytes(synthetic.reactor_workbook(50))
+    service = SelectionService(reactors=str(path), workers=1)
+
+    async def client(port):
+        first = await post(port, SPEC)
+        # The worker exits before it reaches the request queued behind it
+        service.pool.submit(os._exit, 1)
+        broken = await post(port, dict(SPEC, temperature=60))
+        again = await post(port, dict(SPEC, temperature=60))
+        return first, broken, again
+
+    first, broken, again = asyncio.run(run_service(service, client))
+    assert first[0] == 200
+    assert broken[0] == 500 and broken[1]["error"].startswith("BrokenProcessPool")
+    assert again[0] == 200 and again[1]["status"] in ("matched", "no match")
+    assert service.stats["restarts"] == 1
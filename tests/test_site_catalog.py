@@ -0,0 +1,124 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import selection_engine as engine
+import site_catalog
+from fleets import random_dryers, random_fleet, random_queries, workbook
+from site_catalog import SiteCatalog
+
+SITES = {"north": 1, "south": 2, "east": 3}
+
+
+@pytest.fixture
+def site_files(tmp_path):
+    paths = {}
+    for site, seed in SITES.items():
+        paths[site] = tmp_path / f"{site}.xlsx"
+        paths[site].write_bytes(workbook(random_fleet(150, seed=seed)))
+    return paths
+
+
+def catalog_for(site_files, workers=1):
+    catalog = SiteCatalog(workers)
+    for site, path in site_files.items():
+        catalog.register(site, reactors=str(path))
+    return catalog
+
+
+def test_cross_site_ranking_is_the_best_of_every_site(site_files):
+    catalog = catalog_for(site_files)
+    indexes = {site: engine.ReactorIndex(engine.load_reactor_data(str(path))) for site, path in site_files.items()}
+    rng = np.random.default_rng(8)
+    try:
+        for user_input in random_queries(rng, 20):
+            ranked = catalog.rank_reactors(user_input, 200.0, 900.0, k=5)
+            per_site = pd.concat([
+                engine.rank_reactors(index, user_input, 200.0, 900.0, k=5).assign(site=site)
+                for site, index in indexes.items()
+            ], ignore_index=True)
+            want = per_site.iloc[engine.top_k(per_site["Score"].to_numpy(), 5)]
+            assert list(zip(ranked["site"], ranked["reactor id"])) == list(zip(want["site"], want["reactor id"]))
+            assert ranked["Score"].is_monotonic_decreasing
+
+            matched = catalog.filter_reactors(user_input, 200.0, 900.0)
+            assert set(matched["site"]) <= set(SITES)
+            assert len(matched) == sum(len(engine.filter_reactors(index, user_input, 200.0, 900.0)) for index in indexes.values())
+    finally:
+        catalog.close()
+
+
+def test_refresh_reindexes_only_changed_shards(site_files):
+    catalog = catalog_for(site_files, workers=2)
+    assert sorted(catalog.refresh()) == sorted((site, "reactors") for site in SITES)
+    assert catalog.refresh() == []
+
+    # Touched but unchanged: hashed again, not re-indexed
+    os.utime(site_files["north"], ns=(0, 0))
+    assert catalog.refresh() == []
+
+    site_files["south"].write_bytes(workbook(random_fleet(80, seed=9)))
+    assert catalog.refresh() == [("south", "reactors")]
+    assert catalog.stats["reindexed"] == 4
+
+    # Re-uploaded bytes with the same content are not re-indexed either
+    catalog.register("east", reactors=site_files["east"].read_bytes())
+    catalog.register("west", dryers=workbook(random_dryers(40)))
+    assert catalog.refresh() == [("west", "dryers")]
+    assert catalog.sites() == ["north", "south", "east", "west"]
+    assert catalog.sites("dryers") == ["west"]
+
+    catalog.remove("west")
+    with pytest.raises(engine.SelectionError, match="No dryer database"):
+        catalog.rank_dryers({"ph_condition": "basic", "corrosion_rate": 0, "coupon_materials": [""], "temperature": 25.0, "volume": 100.0})
+
+
+def test_a_broken_site_is_named(site_files):
+    catalog = catalog_for(site_files)
+    site_files["east"].write_bytes(workbook({"Vessel ID": ["R-1"], "Capacity": [100]}))
+    with pytest.raises(engine.SelectionError, match="^east reactors: "):
+        catalog.refresh()
+
+
+def test_sessions_share_one_catalog(site_files):
+    catalog = catalog_for(site_files)
+    user_input = next(random_queries(np.random.default_rng(1), 1))
+    expected = catalog.rank_reactors(user_input, 200.0, 900.0)
+    results, errors = [], []
+
+    def session(i):
+        try:
+            catalog.register(f"site {i}", reactors=str(site_files["north"]))
+            results.append(catalog.rank_reactors(user_input, 200.0, 900.0))
+            catalog.remove(f"site {i}")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    catalog.close()
+    assert errors == [] and len(results) == 4
+    assert catalog.sites() == list(SITES)
+    assert catalog.rank_reactors(user_input, 200.0, 900.0).equals(expected)
+
+
+def test_run_catalog_reports_malformed_specs(site_files):
+    catalog = catalog_for(site_files)
+    specs = [
+        {"id": 1, "unit_op_type": "reaction", "ph_condition": "neutral", "temperature": 30, "step_volumes": "100;300"},
+        {"id": 2, "unit_op_type": "reaction", "step_volumes": "100;x"},
+        {"id": 3, "unit_op_type": "drying", "volume": 10},
+    ]
+    rows = site_catalog.run_catalog(catalog, specs)
+    catalog.close()
+    status = {}
+    for row in rows:
+        status.setdefault(row["spec id"], set()).add(row["status"])
+    assert status == {1: {"matched"}, 2: {"error"}, 3: {"error"}}
+    assert {row["site"] for row in rows if row["spec id"] == 1} <= set(SITES)
@@ -0,0 +1,20 @@
+import subprocess
+import sys
+
+from benchmarks import startup
+
+
+def test_first_render_loads_no_deferred_module():
+    result = startup.probe()
+    assert result["exceptions"] == 0
+    assert result["loaded"] == []
+
+
+def test_modules_import_without_optional_dependencies():
+    code = (
+        "import sys, batch_select, flowchart, flowchart_batch, selection_engine, sweeps\n"
+        f"print([m for m in {startup.DEFERRED_MODULES!r} if m in sys.modules])"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=startup.ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
@@ -0,0 +1,65 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import selection_engine as engine
+import sweeps
+from benchmarks import synthetic
+from fleets import random_fleet, workbook
+from selection_engine import SelectionError
+
+
+@pytest.fixture(scope="module")
+def index():
+    return engine.ReactorIndex(engine.load_reactor_data(workbook(random_fleet(300, seed=5))))
+
+
+def user_input(ph, temperature):
+    return {
+        "process_type": "reaction", "ph_condition": ph, "corrosion_rate": 0, "coupon_materials": [""],
+        "temperature": temperature, "reaction_nature": "none", "reaction_subtype": None,
+    }
+
+
+@pytest.mark.parametrize("first_step_vol", [None, 150.0])
+def test_feasible_matches_filter_reactors(index, first_step_vol):
+    temperatures = np.linspace(-20, 160, 10)
+    volumes = np.linspace(50, 12000, 25)
+    result = sweeps.sweep_reactors(index, "reaction", first_step_vol, temperatures, volumes)
+    assert result.feasible.shape == (300, len(result.ph_conditions), 10, 25)
+    rng = np.random.default_rng(0)
+    for _ in range(40):
+        p, t, v = rng.integers(len(result.ph_conditions)), rng.integers(10), rng.integers(25)
+        first = volumes[v] if first_step_vol is None else first_step_vol
+        matched = engine.filter_reactors(index, user_input(result.ph_conditions[p], temperatures[t]), first, volumes[v])
+        assert set(result.reactor_ids[result.feasible[:, p, t, v]]) == set(matched["reactor id"].astype(str))
+    assert result.counts()["feasible reactors"].tolist() == result.feasible.sum(axis=0).ravel().tolist()
+
+
+def test_grid_limits(index):
+    with pytest.raises(SelectionError, match="conditions requested"):
+        sweeps.sweep_reactors(index, "reaction", None, np.arange(100), np.arange(200), ["basic"])
+    # Within MAX_CONDITIONS, but too many cells for a fleet this size
+    large = engine.ReactorIndex(engine.load_reactor_data(synthetic.reactor_workbook(4000)))
+    volumes = np.arange(sweeps.MAX_CELLS // 4000 + 1)
+    assert len(volumes) <= sweeps.MAX_CONDITIONS
+    with pytest.raises(SelectionError, match="too large"):
+        sweeps.sweep_reactors(large, "reaction", None, [25.0], volumes, ["basic"])
+
+
+def test_csv_export_parses_back(index):
+    result = sweeps.sweep_reactors(index, "reaction", None, [25.0, 90.0], [100.0, 2500.0, 9000.0], ["basic", "acidic"])
+    df = pd.read_csv(io.BytesIO(result.to_csv()))
+    assert list(df.columns) == ["reactor id"] + result.condition_labels()
+    assert df["reactor id"].tolist() == result.reactor_ids.tolist()
+    assert (df.iloc[:, 1:].to_numpy() == result.matrix()).all()
+
+
+def test_excel_export_sheets(index):
+    result = sweeps.sweep_reactors(index, "reaction", None, [25.0], [100.0, 2500.0], ["neutral"])
+    sheets = pd.read_excel(io.BytesIO(result.to_excel()), sheet_name=None)
+    assert list(sheets) == ["Counts", "Vessels", "Feasibility"]
+    assert sheets["Counts"]["feasible reactors"].tolist() == result.feasible.sum(axis=0).ravel().tolist()
+    assert (sheets["Feasibility"].iloc[:, 1:].to_numpy() == result.matrix()).all()